@@ -1,2 +1,8 @@
-from . import agent
-from . import utils
\ No newline at end of file
+import importlib
+
+
+def __getattr__(name):
+    # the agent loads on first access, so importing the package (e.g. from a tool) doesn't build it
+    if name == "agent":
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
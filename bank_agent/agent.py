@@ -1,12 +1,20 @@
 # flake8: noqa: E501
-from google.adk.agents import Agent
-from google.adk.sessions import State
+import functools
+import os
 
-from google.adk.tools import ToolContext
 # import logfire
 
 
-from .utils import Customer, Account, INSTRUCTION
+from bank_core.aio import IDEMPOTENT_TOOLS, READ_TAGS, WRITE_TAGS, async_tools
+from bank_core.backends import account_store, history_store, is_private, open_accounts, open_demo_accounts
+from bank_core.idempotency import IdempotencyIndex
+from bank_core.loans import LoanScorer
+from bank_core.memo import ToolMemo
+from bank_core.metrics import agent_tracker, enable_opentelemetry, instrument, start_http_server
+from bank_core.repository import customers
+from bank_core.scheduling import open_calendar
+from bank_core.storage import CachedCustomerStore
+from bank_core.utils import INSTRUCTION
 
 # import warnings
 # Ignore all warnings
@@ -22,115 +30,56 @@ MODEL_GEMINI_2_0_FLASH = "gemini-2.0-flash"
 MODEL_GEMINI_2_5 = "gemini-2.5-flash-preview-04-17"
 AGENT_MODEL = MODEL_GEMINI_2_0_FLASH  # LiteLlm(f"gemini/{MODEL_GEMINI_2_0_FLASH}")
 
-acc_bg47 = Account(account_number="BG47CHAS6016", balance=100)
-acc_bg68 = Account(account_number="BG68RZBB1337", balance=100_000)
-
-customer_accounts = {"BG47CHAS6016": acc_bg47, "BG68RZBB1337": acc_bg68}
-other_accounts = {}
-
-
-def get_current_customer(tool_context: ToolContext) -> dict:
-    """This function retrieves the active customer information
-
-    Returns:
-        result (dict): A dictionary representation of the current customer's data.
-    """
-
-    # hack to setup context state
-    if tool_context.state.get(f"{State.USER_PREFIX}current_user_id") is None:
-        tool_context.state[f"{State.USER_PREFIX}current_user_id"] = '123'
-
-    user_id = tool_context.state.get(f"{State.USER_PREFIX}current_user_id", )  # "user:current_user_id"
-    if user_id is None:
-        raise ValueError("Can't find customer")
-
-    return Customer.get_customer(user_id).model_dump()
-
-
-def get_customer_accounts(customer_id: str, tool_context: ToolContext) -> dict:
-    """This function retrieves the accounts of a specific customer.
-
-    Args:
-        customer_id (str): The ID of the customer whose accounts are to be retrieved.
-
-    Returns:
-        result (dict): A dictionary containing the customer's accounts.
-    """
-
-    active_user_id = tool_context.state.get(f"{State.USER_PREFIX}current_user_id")
-    if active_user_id == customer_id:
-        return {'status': 'success', 'accounts': Customer.get_customer(customer_id).customer_accounts}
+# per-tool latency metrics: Prometheus text on BANK_AGENT_METRICS_PORT, OTLP if OTEL_EXPORTER_OTLP_ENDPOINT is set;
+# the endpoint listens on localhost unless BANK_AGENT_METRICS_HOST says otherwise
+if os.getenv("BANK_AGENT_METRICS_PORT"):
+    start_http_server(int(os.environ["BANK_AGENT_METRICS_PORT"]), os.getenv("BANK_AGENT_METRICS_HOST", "127.0.0.1"))
+if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+    enable_opentelemetry(os.environ["OTEL_EXPORTER_OTLP_ENDPOINT"])
+
+# balances live in the backend picked by BANK_AGENT_BACKEND / BANK_AGENT_DATA_DIR / BANK_AGENT_SHARDS (see bank_core/backends.py)
+ledger = open_accounts()
+history = history_store(ledger)  # statements and spending; None for the memory and sqlite backends
+rates = ledger.rates  # exchange rates of BANK_AGENT_RATES_FILE, reloaded when it changes
+accounts = account_store(ledger)
+
+customer_accounts = open_demo_accounts(ledger, customers)
+loan_scorer = LoanScorer(ledger)
+calendar = open_calendar()  # representatives' appointment slots, one per process, in BANK_AGENT_DATA_DIR if set
+
+# repeated reads within a session are served from the memo until a transfer or
+# a customer record change touches what they returned. The memo only sees this
+# agent's transfers, so it is off when anything else can change the balances.
+tool_memo = ToolMemo()
+memo_enabled = is_private(ledger)
+
+
+def _on_customer_change(customer_id):
+    if customer_id is None:
+        tool_memo.clear()
     else:
-        raise ValueError("Wrong customer ABORT")
+        tool_memo.invalidate([f"customer:{customer_id}"])
 
 
-def get_account_balance(account_number: str):
-    """Retrieve the balance of a specific account.
+customers.subscribe(_on_customer_change)
 
-    Args:
-        account_number: The account number for which the balance is to be retrieved.
 
-    Returns:
-        dict: A dictionary containing the account balance and currency.
-    """
-    print(f"Getting account balance for: {account_number}")
-    if account_number in customer_accounts:
-        moneyz = customer_accounts[account_number].balance
-    return {'result': moneyz, 'currency': 'EUR'}
+def memoize(tool):
+    if not memo_enabled:
+        return tool
+    if tool.__name__ in READ_TAGS:
+        return tool_memo.memoized(READ_TAGS[tool.__name__])(tool)
+    if tool.__name__ in WRITE_TAGS:
+        return tool_memo.invalidates(WRITE_TAGS[tool.__name__])(tool)
+    return tool
 
 
-def transfer_money(account_number_from: str, account_number_to: str, amount: float, currency: str):
-    """
-    Transfers money from one account to another.
+# a retried or duplicated transfer call returns the first call's result instead of moving money twice
+idempotency = IdempotencyIndex()
 
-    Args:
-        account_number_from: The account number to transfer money from.
-        account_number_to: The account number to transfer money to.
-        amount: The amount of money to transfer.
-        currency: The currency of the transfer.
 
-    Returns:
-        dict: A dictionary indicating the success or failure of the transfer.
-    """
-    # add account to other_accounts if not in customer_accounts
-    if account_number_to not in customer_accounts and account_number_to not in other_accounts:
-        other_accounts[account_number_to] = Account(account_number=account_number_to, balance=0)
-
-    # still a function
-    if amount > get_account_balance(account_number=account_number_from)['result']:
-        return {"error": "Not enough balance in the account"}
-    elif account_number_from not in customer_accounts:
-        return {"error": "Account not found"}
-
-    else:
-        account_from = customer_accounts[account_number_from]
-        account_to = customer_accounts.get(account_number_to) or other_accounts.get(account_number_to)
-
-        if (
-            account_from.withdraw(amount) and
-            account_to.deposit(amount)
-        ):
-            print(f"from: {account_number_from}, To: {account_number_to} - {amount} {currency}")
-            return {"success": "Transfer completed"}
-        else:
-            return {"error": "Transfer failed"}
-
-
-def apply_for_loan(loan_amount: float, loan_term: int) -> str:
-    """
-    Applies for a loan with the specified amount and term.
-
-    Args:
-        loan_amount (float): The amount of the loan.
-        loan_term (int): The term of the loan in months.
-
-    Returns:
-        str: A message indicating the result of the application.
-    """
-    if loan_amount > sum([c.balance for c in customer_accounts.values()]):
-        return "Loan not approved!"
-    else:
-        return f"Loan application for {loan_amount} over {loan_term} months has been approved."
+def deduplicate(tool):
+    return idempotency.idempotent(tool) if tool.__name__ in IDEMPOTENT_TOOLS else tool
 
 
 def say_goodbye() -> str:
@@ -143,24 +92,80 @@ def handle_angry_customer() -> str:
     return "I am sorry to hear that you are angry. BUT FUCK YOU TOO"
 
 
-goodbye_agent = Agent(
-    # Can use the same or a different model
-    model=AGENT_MODEL,
-    name="goodbye_agent",
-    instruction="You are the Goodbye Agent. Your ONLY task is to provide a polite goodbye message and show the custmer active offers."
-                "Use the 'say_goodbye' tool when the user indicates they are leaving or ending the conversation."
-                "(e.g., using words like 'bye', 'goodbye', 'thanks bye', 'see you')."
-                "Use the 'handle_angry_customer' tool when the user indicates they are angry or upset.",
-    description="Handles simple farewells and goodbyes using the 'say_goodbye' tool and provides customer with current active offers."
-                "Also handles angry customers!",  # Crucial for delegation
-    tools=[say_goodbye, handle_angry_customer],
-)
-
-root_agent = Agent(
-    name="bank_agent",
-    model=AGENT_MODEL,  # Can be a string for Gemini or a LiteLlm object
-    description="Provides help with customer service and bank products.",
-    instruction=INSTRUCTION,
-    tools=[get_current_customer, get_customer_accounts, get_account_balance, transfer_money, apply_for_loan],
-    sub_agents=[goodbye_agent]
-)
+@functools.cache
+def build_agents():
+    """
+    Builds the agent graph. ADK itself is imported here, on first access to
+    `root_agent`, so importing this module (e.g. for the tools or the ledger)
+    stays cheap.
+
+    Returns:
+        tuple: The root agent and the goodbye agent.
+    """
+    from google.adk.agents import Agent
+
+    from bank_core import llm_cache
+    from bank_core.context import ContextBudget, HistoryCompactor
+    from bank_core.router import ANGRY, GOODBYE, FastPathRouter, Intent
+
+    # BANK_AGENT_LLM_CACHE records model responses on disk and replays identical requests
+    response_cache = llm_cache.from_env()
+    cache_before = [response_cache.before_model] if response_cache is not None else []
+    cache_after = [response_cache.after_model] if response_cache is not None else []
+    cache_error = [response_cache.on_model_error] if response_cache is not None else []
+    # older tool results are summarized, and the oldest turns dropped, to keep requests and sessions bounded
+    compactor = HistoryCompactor(
+        max_history_tokens=int(os.getenv("BANK_AGENT_MAX_HISTORY_TOKENS", "8192")),
+        max_session_turns=int(os.getenv("BANK_AGENT_MAX_SESSION_TURNS", "50")),
+    )
+
+    goodbye_agent = Agent(
+        # Can use the same or a different model
+        model=AGENT_MODEL,
+        name="goodbye_agent",
+        instruction="You are the Goodbye Agent. Your ONLY task is to provide a polite goodbye message and show the custmer active offers."
+                    "Use the 'say_goodbye' tool when the user indicates they are leaving or ending the conversation."
+                    "(e.g., using words like 'bye', 'goodbye', 'thanks bye', 'see you')."
+                    "Use the 'handle_angry_customer' tool when the user indicates they are angry or upset.",
+        description="Handles simple farewells and goodbyes using the 'say_goodbye' tool and provides customer with current active offers."
+                    "Also handles angry customers!",  # Crucial for delegation
+        tools=[instrument(say_goodbye), instrument(handle_angry_customer)],
+        before_agent_callback=agent_tracker.before_agent,
+        after_agent_callback=agent_tracker.after_agent,
+        before_model_callback=[compactor, *cache_before],
+        after_model_callback=cache_after,
+        on_model_error_callback=cache_error,
+    )
+
+    root_agent = Agent(
+        name="bank_agent",
+        model=AGENT_MODEL,  # Can be a string for Gemini or a LiteLlm object
+        description="Provides help with customer service and bank products.",
+        instruction=INSTRUCTION,
+        # async tools keep the event loop free while storage calls wait
+        tools=[instrument(deduplicate(memoize(t))) for t in async_tools(accounts, CachedCustomerStore(customers), customer_accounts, loan_scorer=loan_scorer, history=history, calendar=calendar, rates=rates)],
+        sub_agents=[goodbye_agent],
+        before_agent_callback=agent_tracker.before_agent,
+        after_agent_callback=agent_tracker.after_agent,
+        before_model_callback=[
+            # farewells and outbursts get the goodbye agent's replies without a model call
+            FastPathRouter([Intent("goodbye", GOODBYE, say_goodbye), Intent("angry", ANGRY, handle_angry_customer)]),
+            compactor,
+            # keeps INSTRUCTION as a stable, cacheable prompt prefix and records request token estimates
+            ContextBudget(INSTRUCTION, max_input_tokens=int(os.getenv("BANK_AGENT_MAX_INPUT_TOKENS", "0")) or None),
+            *cache_before,
+        ],
+        after_model_callback=cache_after,
+        on_model_error_callback=cache_error,
+    )
+
+    return root_agent, goodbye_agent
+
+
+def __getattr__(name):
+    # ADK reads `root_agent` when it loads the agent; the graph is built then, once
+    if name == "root_agent":
+        return build_agents()[0]
+    if name == "goodbye_agent":
+        return build_agents()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,16 @@
 # flake8: noqa: E501
-from contextlib import AsyncExitStack
+import functools
+import os
 
-from google.adk.agents import Agent
-from google.adk.sessions import State
-from google.adk.tools import ToolContext
-from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset, SseServerParams
-from .utils import Customer, Account, INSTRUCTION
+from bank_core.aio import IDEMPOTENT_TOOLS, async_tools
+from bank_core.backends import account_store, history_store, open_accounts, open_demo_accounts
+from bank_core.idempotency import IdempotencyIndex
+from bank_core.repository import customers
+from bank_core.scheduling import open_calendar
+from bank_core.storage import CachedCustomerStore
+from bank_core.utils import INSTRUCTION
+
+from .toolsets import toolsets
 
 # import logfire
 
@@ -20,98 +25,45 @@ from .utils import Customer, Account, INSTRUCTION
 MODEL_GEMINI_2_0_FLASH = "gemini-2.0-flash"
 MODEL_GEMINI_2_5 = "gemini-2.5-flash-preview-04-17"
 AGENT_MODEL = MODEL_GEMINI_2_0_FLASH  # LiteLlm(f"gemini/{MODEL_GEMINI_2_0_FLASH}")
+GOODBYE_SERVER_URL = "http://localhost:8080/mcp"
 
-acc_bg47 = Account(account_number="BG47CHAS6016", balance=100)
-acc_bg68 = Account(account_number="BG68RZBB1337", balance=100_000)
-
-current_accounts = {"BG47CHAS6016": acc_bg47, "BG68RZBB1337": acc_bg68}
-
+# set BANK_AGENT_BACKEND / BANK_AGENT_SHARDS to share balances with other workers and with bank_agent (see bank_core/backends.py)
+ledger = open_accounts()
+history = history_store(ledger)  # statements and spending; None for the memory and sqlite backends
+rates = ledger.rates  # exchange rates of BANK_AGENT_RATES_FILE, reloaded when it changes
+accounts = account_store(ledger)
 
-def get_current_customer(tool_context: ToolContext) -> dict:
-    """This function retrieves the active customer information
-
-    Returns:
-        result (dict): A dictionary representation of the current customer's data.
-    """
+current_accounts = open_demo_accounts(ledger, customers)
+calendar = open_calendar()  # representatives' appointment slots, one per process, in BANK_AGENT_DATA_DIR if set
 
-    # hack to setup context state
-    if tool_context.state.get(f"{State.USER_PREFIX}current_user_id") is None:
-        tool_context.state[f"{State.USER_PREFIX}current_user_id"] = '123'
 
-    user_id = tool_context.state.get(f"{State.USER_PREFIX}current_user_id", )  # "user:current_user_id"
-    if user_id is None:
-        raise ValueError("Can't find customer")
+# a retried or duplicated transfer call returns the first call's result instead of moving money twice
+idempotency = IdempotencyIndex()
 
-    return Customer.get_customer(user_id).model_dump()
 
-
-def get_customer_accounts(customer_id: str, tool_context: ToolContext) -> dict:
-    """This function retrieves the accounts of a specific customer.
-
-    Args:
-        customer_id (str): The ID of the customer whose accounts are to be retrieved.
-
-    Returns:
-        result (dict): A dictionary containing the customer's accounts.
+@functools.cache
+def build_agents():
     """
-
-    active_user_id = tool_context.state.get(f"{State.USER_PREFIX}current_user_id")
-    if active_user_id == customer_id:
-        return {'status': 'success', 'accounts': Customer.get_customer(customer_id).customer_accounts}
-    else:
-        raise ValueError("Wrong customer ABORT")
-
-
-def get_account_balance(account_number: str):
-    """Retrieve the balance of a specific account.
-
-    Args:
-        account_number: The account number for which the balance is to be retrieved.
-
-    Returns:
-        dict: A dictionary containing the account balance and currency.
-    """
-    print(f"Getting account balance for: {account_number}")
-    if account_number in current_accounts:
-        moneyz = current_accounts[account_number].balance
-    return {'result': moneyz, 'currency': 'EUR'}
-
-
-def transfer_money(account_number_from: str, account_number_to: str, amount: float, currency: str):
-    """
-    Transfers money from one account to another.
-
-    Args:
-        account_number_from: The account number to transfer money from.
-        account_number_to: The account number to transfer money to.
-        amount: The amount of money to transfer.
-        currency: The currency of the transfer.
+    Builds the agent graph once per process. The goodbye MCP server is not
+    contacted here: its toolset connects on the first model request that needs it.
 
     Returns:
-        dict: A dictionary indicating the success or failure of the transfer.
+        tuple: The root agent and the goodbye agent.
     """
-    # still a function
-    if amount > get_account_balance(account_number=account_number_from)['result']:
-        return {"error": "Not enough balance in the account"}
-    else:
-
-        if (
-            current_accounts[account_number_from].withdraw(amount) and
-            current_accounts[account_number_to].deposit(amount)
-        ):
-            print(f"from: {account_number_from}, To: {account_number_to} - {amount} {currency}")
-            return {"success": "Transfer completed"}
-        else:
-            return {"error": "Transfer failed"}
-
-
-async def create_agent():
-    common_exit_stack = AsyncExitStack()
-    remote_tools, _ = await MCPToolset.from_server(
-        connection_params=SseServerParams(
-            url="http://localhost:8080/sse"
-        ),
-        async_exit_stack=common_exit_stack
+    from google.adk.agents import Agent
+
+    from bank_core import llm_cache
+    from bank_core.context import HistoryCompactor
+
+    # BANK_AGENT_LLM_CACHE records model responses on disk and replays identical requests
+    response_cache = llm_cache.from_env()
+    cache_before = [response_cache.before_model] if response_cache is not None else []
+    cache_after = [response_cache.after_model] if response_cache is not None else []
+    cache_error = [response_cache.on_model_error] if response_cache is not None else []
+    # older tool results are summarized, and the oldest turns dropped, to keep requests and sessions bounded
+    compactor = HistoryCompactor(
+        max_history_tokens=int(os.getenv("BANK_AGENT_MAX_HISTORY_TOKENS", "8192")),
+        max_session_turns=int(os.getenv("BANK_AGENT_MAX_SESSION_TURNS", "50")),
     )
 
     goodbye_agent = Agent(
@@ -122,7 +74,11 @@ async def create_agent():
                     "Use the 'say_goodbye' tool when the user indicates they are leaving or ending the conversation "
                     "(e.g., using words like 'bye', 'goodbye', 'thanks bye', 'see you').",
         description="Handles simple farewells and goodbyes using the 'say_goodbye' tool and provides customer with current active offers.",  # Crucial for delegation
-        tools=[*remote_tools],
+        # one shared connection per process, opened on first use (see toolsets.py)
+        tools=[toolsets.get(GOODBYE_SERVER_URL)],
+        before_model_callback=[compactor, *cache_before],
+        after_model_callback=cache_after,
+        on_model_error_callback=cache_error,
     )
 
     root_agent = Agent(
@@ -130,11 +86,24 @@ async def create_agent():
         model=AGENT_MODEL,  # Can be a string for Gemini or a LiteLlm object
         description="Provides help with customer service and bank products.",
         instruction=INSTRUCTION,
-        tools=[get_current_customer, get_customer_accounts, get_account_balance, transfer_money],
-        sub_agents=[goodbye_agent]
+        # async tools keep the event loop free while storage calls wait
+        tools=[
+            idempotency.idempotent(t) if t.__name__ in IDEMPOTENT_TOOLS else t
+            for t in async_tools(accounts, CachedCustomerStore(customers), current_accounts, open_unknown_accounts=False, history=history, calendar=calendar, rates=rates)
+        ],
+        sub_agents=[goodbye_agent],
+        before_model_callback=[compactor, *cache_before],
+        after_model_callback=cache_after,
+        on_model_error_callback=cache_error,
     )
 
-    return root_agent, common_exit_stack
+    return root_agent, goodbye_agent
 
 
-root_agent = create_agent()
+def __getattr__(name):
+    # ADK reads `root_agent` when it loads the agent; the graph is built then, once
+    if name == "root_agent":
+        return build_agents()[0]
+    if name == "goodbye_agent":
+        return build_agents()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,40 @@
+# flake8: noqa: E501
+TOOL_LIST_TTL = 300.0  # seconds the remote tool schemas are reused before they are listed again
+
+
+class ToolsetRegistry:
+    """
+    Process-wide registry of MCP toolsets, one per server URL.
+
+    A toolset doesn't connect when it is created: ADK asks it for its tools on the
+    first model request that needs them, which opens the session and lists the
+    remote tool schemas. Later requests reuse both, so every agent built on the
+    same URL shares one connection. URLs ending in /sse use SSE, all others
+    streamable HTTP.
+    """
+
+    def __init__(self):
+        self._toolsets: dict[str, object] = {}
+
+    def get(self, url: str):
+        """
+        Returns the toolset of an MCP server, created on first use.
+        """
+        toolset = self._toolsets.get(url)
+        if toolset is None:
+            # the MCP client stack is only imported once a server is actually needed
+            from google.adk.tools.mcp_tool.mcp_toolset import McpToolset, SseConnectionParams, StreamableHTTPConnectionParams
+
+            params = SseConnectionParams(url=url) if url.rstrip("/").endswith("/sse") else StreamableHTTPConnectionParams(url=url)
+            toolset = self._toolsets[url] = McpToolset(connection_params=params, tool_list_cache_ttl_seconds=TOOL_LIST_TTL)
+        return toolset
+
+    async def close_all(self) -> None:
+        """
+        Closes every connection; the toolsets reconnect if they are used again.
+        """
+        for toolset in list(self._toolsets.values()):
+            await toolset.close()
+
+
+toolsets = ToolsetRegistry()
@@ -0,0 +1,5 @@
+"""
+Banking core shared by `bank_agent` and `bank_agent_mcp`: account backends,
+customer repository, the tool implementations and the machinery around them
+(memoization, idempotency, metrics, persistence, sharding).
+"""
@@ -0,0 +1,463 @@
+# flake8: noqa: E501
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Container, Optional
+
+from .currency import BASE_CURRENCY, CURRENCIES, RateTable, convert_minor, currency_id
+from .history import parse_range
+from .ledger import to_minor
+from .loans import LoanApplication, LoanScorer
+from .scheduling import MAX_QUERY_DAYS, SLOT_MINUTES, SLOT_TIMES, SlotCalendar, parse_slot, slot_start
+from .storage import AccountStore, CustomerStore, HistoryStore
+from .utils import USER_PREFIX
+
+if TYPE_CHECKING:
+    from google.adk.tools import ToolContext
+
+
+def async_tools(
+    accounts: AccountStore,
+    customers: CustomerStore,
+    customer_accounts: Container[str],
+    loan_scorer: Optional[LoanScorer] = None,
+    open_unknown_accounts: bool = True,
+    history: Optional[HistoryStore] = None,
+    calendar: Optional[SlotCalendar] = None,
+    rates: Optional[RateTable] = None,
+) -> list[Callable]:
+    """
+    Builds the banking tools on top of async stores. Both agents use these, so
+    every agent offers the model the same tool declarations.
+
+    Args:
+        accounts: Store with the account balances.
+        customers: Store with the customer records.
+        customer_accounts: Account numbers the customer may transfer money from.
+        loan_scorer: Scorer for `apply_for_loan`; the tool is left out if not given.
+        open_unknown_accounts: Whether transfers to unknown accounts open them.
+        history: Transaction history for the statement and spending tools; they are left out if not given.
+        calendar: Representatives' slot calendar for the appointment tools; they are left out if not given.
+        rates: Exchange rates for transfers in another currency than the sender's account and for the
+            portfolio and conversion tools; without them only same-currency transfers work and those tools are left out.
+
+    Returns:
+        list: The tool functions, ready to pass to an `Agent`.
+    """
+
+    async def get_current_customer(tool_context: "ToolContext") -> dict:
+        """This function retrieves the active customer information
+
+        Returns:
+            result (dict): A dictionary representation of the current customer's data.
+        """
+
+        # hack to setup context state
+        if tool_context.state.get(f"{USER_PREFIX}current_user_id") is None:
+            tool_context.state[f"{USER_PREFIX}current_user_id"] = '123'
+
+        user_id = tool_context.state.get(f"{USER_PREFIX}current_user_id", )  # "user:current_user_id"
+        profile = await customers.profile(user_id) if user_id is not None else None
+        if profile is None:
+            raise ValueError("Can't find customer")
+
+        return profile.compact
+
+    async def get_customer_accounts(customer_id: str, tool_context: "ToolContext") -> dict:
+        """This function retrieves the accounts of a specific customer.
+
+        Args:
+            customer_id (str): The ID of the customer whose accounts are to be retrieved.
+
+        Returns:
+            result (dict): A dictionary containing the customer's accounts.
+        """
+
+        active_user_id = tool_context.state.get(f"{USER_PREFIX}current_user_id")
+        customer = await customers.get(customer_id) if active_user_id == customer_id else None
+        if customer is not None:
+            return {'status': 'success', 'accounts': customer.customer_accounts}
+        else:
+            raise ValueError("Wrong customer ABORT")
+
+    async def get_account_balance(account_number: str):
+        """Retrieve the balance of a specific account.
+
+        Args:
+            account_number: The account number for which the balance is to be retrieved.
+
+        Returns:
+            dict: A dictionary containing the account balance and currency.
+        """
+        if account_number not in customer_accounts:
+            return {"error": "Account not found"}
+        [(balance, currency)] = await accounts.balances([account_number])
+        return {'result': balance, 'currency': currency}
+
+    async def _ensure_destination(account_number_to: str) -> bool:
+        if await accounts.contains(account_number_to):
+            return True
+        if open_unknown_accounts:
+            await accounts.open(account_number_to)
+            return True
+        return False
+
+    def _amount(value) -> Optional[float]:
+        # a positive, finite amount from the model's arguments, or None
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            return None
+        try:
+            amount = float(value)
+        except ValueError:
+            return None
+        return amount if 0 < amount < float("inf") else None
+
+    def _short_accounts(batch: list[tuple[int, str, str, float]], balances: dict[str, tuple[float, str]]) -> set[str]:
+        # the senders the netted batch would overdraw, checked before anything is applied;
+        # the backend checks again when it applies the batch
+        deltas: dict[str, int] = {}
+        for _, account_number_from, account_number_to, debit in batch:
+            minor = to_minor(debit)
+            deltas[account_number_from] = deltas.get(account_number_from, 0) - minor
+            if account_number_to in balances:
+                try:
+                    credit = convert_minor(minor, currency_id(balances[account_number_from][1]), currency_id(balances[account_number_to][1]), rates)
+                except ValueError:
+                    continue  # the backend rejects it when it applies the batch
+                deltas[account_number_to] = deltas.get(account_number_to, 0) + credit
+        return {n for n, delta in deltas.items() if to_minor(balances[n][0]) + delta < 0}
+
+    def _debit(amount: float, currency: str, account_currency: str) -> float:
+        # the amount in the sender's currency, which is what the backends move;
+        # ValueError for unknown currencies and missing rates
+        currency_id(currency)
+        if currency.strip().upper() == account_currency:
+            return amount
+        if rates is None:
+            raise ValueError(f"Transfers in {currency} are not supported for {account_currency} accounts")
+        return rates.matrix.convert(amount, currency, account_currency)
+
+    async def transfer_money(account_number_from: str, account_number_to: str, amount: float, currency: str):
+        """
+        Transfers money from one account to another.
+
+        Args:
+            account_number_from: The account number to transfer money from.
+            account_number_to: The account number to transfer money to.
+            amount: The amount of money to transfer.
+            currency: The currency of the amount (ISO code, e.g. 'EUR'); converted if the account is in another currency.
+
+        Returns:
+            dict: A dictionary indicating the success or failure of the transfer.
+        """
+        if account_number_from not in customer_accounts:
+            return {"error": "Account not found"}
+        if _amount(amount) is None:
+            return {"error": "Transfer amount must be a positive number"}
+        if not isinstance(currency, str):
+            return {"error": f"Unsupported currency: {currency}"}
+
+        account_currency = await accounts.currency(account_number_from)
+        try:
+            debit = _debit(_amount(amount), currency, account_currency)
+        except ValueError as e:
+            return {"error": str(e)}
+        if not await _ensure_destination(account_number_to):
+            return {"error": "Account not found"}
+
+        if not await accounts.transfer(account_number_from, account_number_to, debit):
+            return {"error": "Not enough balance in the account"}
+        if debit != _amount(amount):
+            return {"success": "Transfer completed", "debited": debit, "debited_currency": account_currency}
+        return {"success": "Transfer completed"}
+
+    async def transfer_many(transfers: list[dict], all_or_nothing: bool = True) -> dict:
+        """
+        Transfers money for a whole batch of transfers in one call, e.g. payroll.
+
+        Args:
+            transfers: The transfers to make. Each one is a dictionary with 'account_number_from',
+                'account_number_to', 'amount' and 'currency'.
+            all_or_nothing: If True no transfer is made unless all of them can be made.
+
+        Returns:
+            dict: A dictionary with the overall outcome and a result for every transfer.
+        """
+        if not isinstance(transfers, list):
+            return {"error": "Transfers must be a list"}
+
+        # validate the whole batch before any account is touched
+        errors: list[Optional[str]] = []
+        for t in transfers:
+            if not isinstance(t, dict):
+                errors.append("Invalid transfer")
+            elif t.get("account_number_from") not in customer_accounts or not isinstance(t.get("account_number_to"), str) or not t["account_number_to"]:
+                errors.append("Account not found")
+            elif _amount(t.get("amount")) is None:
+                errors.append("Transfer amount must be a positive number")
+            elif t.get("currency") is not None and not isinstance(t["currency"], str):
+                errors.append(f"Unsupported currency: {t['currency']}")
+            else:
+                errors.append(None)
+        if any(errors) and all_or_nothing:
+            return {"error": "Some transfers failed", "results": [{"error": e or "Batch rejected"} for e in errors]}
+
+        valid = [t for t, error in zip(transfers, errors) if error is None]
+        sources = list({t["account_number_from"]: None for t in valid})
+        balances = dict(zip(sources, await accounts.balances(sources))) if sources else {}
+        destinations = list({t["account_number_to"]: None for t in valid})
+        missing = {n for n in destinations if not await accounts.contains(n)}
+
+        batch = []
+        for i, t in enumerate(transfers):
+            if errors[i] is not None:
+                continue
+            if t["account_number_to"] in missing and not open_unknown_accounts:
+                errors[i] = "Account not found"
+                continue
+            account_currency = balances[t["account_number_from"]][1]
+            try:
+                # transfers whose currency can't be converted fail like unknown accounts do
+                debit = _debit(_amount(t["amount"]), t.get("currency") or account_currency, account_currency)
+            except ValueError as e:
+                errors[i] = str(e)
+                continue
+            batch.append((i, t["account_number_from"], t["account_number_to"], debit))
+
+        if all_or_nothing:
+            if any(errors):
+                return {"error": "Some transfers failed", "results": [{"error": e or "Batch rejected"} for e in errors]}
+            short = _short_accounts(batch, balances)
+            if short:
+                return {"error": "Some transfers failed", "results": [
+                    {"error": "Not enough balance in the account" if t["account_number_from"] in short else "Batch rejected"} for t in transfers
+                ]}
+
+        for n in missing:
+            if open_unknown_accounts and any(b[2] == n for b in batch):
+                await accounts.open(n)
+        outcomes = iter(await accounts.transfer_many([b[1:] for b in batch], atomic=all_or_nothing))
+
+        results = []
+        for error in errors:
+            error = error or next(outcomes)
+            results.append({"error": error} if error else {"success": "Transfer completed"})
+
+        if all("success" in r for r in results):
+            return {"success": "All transfers completed", "results": results}
+        return {"error": "Some transfers failed", "results": results}
+
+    async def apply_for_loan(loan_amount: float, loan_term: int, tool_context: "ToolContext"):
+        """
+        Applies for a loan with the specified amount and term.
+
+        Args:
+            loan_amount (float): The amount of the loan.
+            loan_term (int): The term of the loan in months.
+
+        Returns:
+            str: A message indicating the result of the application, or a dict with an error for an invalid amount or term.
+        """
+        # the model may send the term as a float such as 36.0
+        if not isinstance(loan_term, (int, float)) or not float(loan_term).is_integer() or loan_term <= 0:
+            return {"error": "The loan term must be a whole, positive number of months"}
+        if not isinstance(loan_amount, (int, float)) or not loan_amount > 0:
+            return {"error": "The loan amount must be positive"}
+        loan_term = int(loan_term)
+        customer_id = tool_context.state.get(f"{USER_PREFIX}current_user_id")
+        decision = await loan_scorer.aevaluate(LoanApplication(customer_id, loan_amount, loan_term), accounts)
+        if not decision.approved:
+            return "Loan not approved!"
+        else:
+            return f"Loan application for {loan_amount} over {loan_term} months has been approved."
+
+    async def get_account_statement(account_number: str, start_date: str = "", end_date: str = "", page_size: int = 20, page_token: str = "") -> dict:
+        """
+        Lists the transactions of an account, newest first, one page at a time.
+
+        Args:
+            account_number: The account number.
+            start_date: Only transactions on or after this date (YYYY-MM-DD), or '' for no limit.
+            end_date: Only transactions up to and including this date (YYYY-MM-DD), or '' for no limit.
+            page_size: The maximum number of transactions to return, at most 100.
+            page_token: The 'next_page_token' of the previous page, or '' for the first page.
+
+        Returns:
+            dict: The transactions and, if there are more, a 'next_page_token'.
+        """
+        if account_number not in customer_accounts:
+            return {"error": "Account not found"}
+        try:
+            start, end = parse_range(start_date, end_date)
+            cursor = int(page_token) if page_token else None
+        except ValueError:
+            return {"error": "Invalid date or page token"}
+
+        transactions, cursor = await history.statement(account_number, start, end, limit=max(1, min(page_size, 100)), cursor=cursor)
+        result = {"transactions": transactions, "currency": await accounts.currency(account_number)}
+        if cursor is not None:
+            result["next_page_token"] = str(cursor)
+        return result
+
+    async def get_spending(account_number: str, start_date: str = "", end_date: str = "", period: str = "month") -> dict:
+        """
+        Sums the money spent from an account, i.e. withdrawals and outgoing transfers, per period.
+
+        Args:
+            account_number: The account number.
+            start_date: Only spending on or after this date (YYYY-MM-DD), or '' for no limit.
+            end_date: Only spending up to and including this date (YYYY-MM-DD), or '' for no limit.
+            period: How to group the spending: 'day', 'month' or 'year'.
+
+        Returns:
+            dict: The spending per period and in total.
+        """
+        if account_number not in customer_accounts:
+            return {"error": "Account not found"}
+        if period not in ("day", "month", "year"):
+            return {"error": "Period must be 'day', 'month' or 'year'"}
+        try:
+            start, end = parse_range(start_date, end_date)
+        except ValueError:
+            return {"error": "Invalid date"}
+
+        spending = await history.spending(account_number, start, end, period)
+        return {"spending": spending, "total": round(sum(spending.values()), 2), "currency": await accounts.currency(account_number)}
+
+    async def get_total_balance(tool_context: "ToolContext", currency: str = BASE_CURRENCY) -> dict:
+        """
+        Shows all accounts of the current customer with their balances, converted into one currency, and their total.
+
+        Args:
+            currency: The currency to show the balances and the total in (ISO code, e.g. 'EUR').
+
+        Returns:
+            dict: Every account's balance in its own currency and converted, the total, and the date of the exchange rates.
+        """
+        customer_id = tool_context.state.get(f"{USER_PREFIX}current_user_id")
+        customer = await customers.get(customer_id) if customer_id is not None else None
+        if customer is None:
+            return {"error": "No active customer"}
+        numbers = [n for n in customer.customer_accounts if n in customer_accounts]
+        balances = await accounts.balances(numbers)
+
+        matrix = rates.matrix  # one matrix for the whole answer, even if the rates are refreshed meanwhile
+        try:
+            converted = matrix.convert_many([b for b, _ in balances], [c for _, c in balances], currency)
+        except ValueError as e:
+            return {"error": str(e)}
+        return {
+            "accounts": [
+                {"account_number": n, "balance": b, "currency": c, "converted": v}
+                for n, (b, c), v in zip(numbers, balances, converted)
+            ],
+            "total": round(sum(converted), 2),
+            "currency": CURRENCIES[currency_id(currency)],
+            "rates_as_of": matrix.as_of,
+        }
+
+    async def convert_currency(amount: float, from_currency: str, to_currency: str) -> dict:
+        """
+        Converts an amount between currencies at the bank's current exchange rates.
+
+        Args:
+            amount: The amount to convert.
+            from_currency: The currency of the amount (ISO code, e.g. 'USD').
+            to_currency: The currency to convert into (ISO code, e.g. 'EUR').
+
+        Returns:
+            dict: The converted amount, the rate and the date of the rate.
+        """
+        matrix = rates.matrix
+        try:
+            return {"result": matrix.convert(amount, from_currency, to_currency), "rate": matrix.rate(from_currency, to_currency), "rates_as_of": matrix.as_of}
+        except ValueError as e:
+            return {"error": str(e), "supported_currencies": list(CURRENCIES)}
+
+    async def get_available_slots(start_date: str, end_date: str = "", branch: str = "", representative_id: str = "") -> dict:
+        """
+        Lists the free appointment slots with a bank representative, in person at a branch.
+
+        Args:
+            start_date: The first day to look at (YYYY-MM-DD).
+            end_date: The last day to look at (YYYY-MM-DD), or '' for a week from the start date.
+            branch: Only slots at this branch, or '' for any branch.
+            representative_id: Only slots with this representative, or '' for anyone.
+
+        Returns:
+            dict: The free slot start times per day and the slot length.
+        """
+        try:
+            start = date.fromisoformat(start_date)
+            end = date.fromisoformat(end_date) if end_date else start + timedelta(days=6)
+        except ValueError:
+            return {"error": "Invalid date"}
+        end = min(end, start + timedelta(days=MAX_QUERY_DAYS - 1))
+        try:
+            mask = calendar.mask(branch, representative_id)
+        except KeyError:
+            return {"error": "Unknown branch or representative", "branches": calendar.branches}
+
+        result = {"slots": calendar.free_slots(start, end, mask, not_before=datetime.now()), "duration_minutes": SLOT_MINUTES}
+        if not branch:
+            result["branches"] = calendar.branches
+        return result
+
+    async def book_appointment(appointment_date: str, appointment_time: str, service: str, tool_context: "ToolContext", branch: str = "", representative_id: str = "") -> dict:
+        """
+        Books an in-person appointment with a bank representative.
+
+        Args:
+            appointment_date: The day of the appointment (YYYY-MM-DD).
+            appointment_time: The start time of a free slot (HH:MM).
+            service: What the customer wants to discuss, e.g. 'mortgage' or 'investment advice'.
+            branch: The branch, or '' for any branch.
+            representative_id: The representative, or '' for anyone free.
+
+        Returns:
+            dict: The confirmed appointment, or an error if the slot is not available.
+        """
+        customer_id = tool_context.state.get(f"{USER_PREFIX}current_user_id")
+        if customer_id is None:
+            return {"error": "No active customer"}
+        try:
+            day, slot = parse_slot(appointment_date, appointment_time)
+            mask = calendar.mask(branch, representative_id)
+        except ValueError:
+            return {"error": f"Invalid date or time, slots start at {', '.join(SLOT_TIMES)}"}
+        except KeyError:
+            return {"error": "Unknown branch or representative", "branches": calendar.branches}
+        if slot_start(day, slot) < datetime.now():
+            return {"error": "The slot is in the past"}
+
+        appointment = calendar.book(customer_id, day, slot, service, mask)
+        if appointment is None:
+            return {"error": "The slot is not available"}
+        return {"success": "Appointment booked", "appointment": appointment.compact}
+
+    tools = [get_current_customer, get_customer_accounts, get_account_balance, transfer_money, transfer_many]
+    if loan_scorer is not None:
+        tools.append(apply_for_loan)
+    if history is not None:
+        tools += [get_account_statement, get_spending]
+    if calendar is not None:
+        tools += [get_available_slots, book_appointment]
+    if rates is not None:
+        tools += [get_total_balance, convert_currency]
+    return tools
+
+
+# the data each tool reads or writes, as memo tags (see memo.py)
+READ_TAGS = {
+    "get_current_customer": lambda args, ctx: [f"customer:{ctx.state.get(f'{USER_PREFIX}current_user_id')}"],
+    "get_customer_accounts": lambda args, ctx: [f"customer:{args['customer_id']}"],
+    "get_account_balance": lambda args, ctx: [f"account:{args['account_number']}"],
+    "get_account_statement": lambda args, ctx: [f"account:{args['account_number']}"],
+    "get_spending": lambda args, ctx: [f"account:{args['account_number']}"],
+    # not get_available_slots: it hides the slots already past, so its answer changes with the time of the call
+}
+WRITE_TAGS = {
+    "transfer_money": lambda args, ctx: [f"account:{args['account_number_from']}", f"account:{args['account_number_to']}"],
+    "transfer_many": lambda args, ctx: [f"account:{t.get(k)}" for t in args["transfers"] for k in ("account_number_from", "account_number_to")],
+}
+
+# tools that move money or take a slot; a retried call must not do it twice (see idempotency.py)
+IDEMPOTENT_TOOLS = {"transfer_money", "transfer_many", "book_appointment"}
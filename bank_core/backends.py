@@ -0,0 +1,402 @@
+# flake8: noqa: E501
+"""
+Account storage backends behind the banking tools.
+
+All of them have the blocking interface of `Ledger`, so the tools, the loan
+scorer and the benchmarks run unchanged on any of them:
+
+    ledger   `Ledger`, flat arrays of minor-unit balances (default)
+    memory   `InMemoryAccounts`, a dict of `Account` models
+    sqlite   `SQLiteAccounts`, one table, shareable between processes
+    sharded  `ShardedLedger`, ledgers in shard processes (see sharding.py)
+
+The ledger backends also keep a transaction history; see `history_store`.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional, Protocol
+
+from . import currency as fx
+from .currency import BASE_CURRENCY, RateTable, currency_id, total_in
+from .history import TransactionHistory
+from .ledger import Ledger, to_major, to_minor
+from .repository import DEMO_ACCOUNTS, CustomerRepository
+from .storage import AccountStore, HistoryStore, LedgerStore, LocalHistoryStore, ThreadPoolStore
+from .utils import Account
+
+# ledgers opened on a data directory, shared by every caller in the process: the
+# directory is locked to its first opener (see persistence.lock_directory)
+_persistent_ledgers: dict[Path, Ledger] = {}
+_persistent_ledgers_lock = threading.Lock()
+
+
+class AccountBackend(Protocol):
+    """
+    Blocking account storage used by the tools.
+    """
+
+    def __contains__(self, account_number: str) -> bool: ...
+
+    def open(self, account_number: str, balance: float = 0.0, currency: str = BASE_CURRENCY) -> object:
+        """Opens a new account, or returns the existing one."""
+
+    def assign(self, account_number: str, customer_id: str) -> None:
+        """Makes a customer the owner of an account, for `customer_total`."""
+
+    def balance(self, account_number: str) -> float: ...
+
+    def currency(self, account_number: str) -> str: ...
+
+    def balances(self, account_numbers: Iterable[str]) -> list[tuple[float, str]]:
+        """Returns the balance and currency of each account."""
+
+    def customer_balances(self, customer_id: str) -> dict[str, float]:
+        """Returns a customer's balances summed per currency."""
+
+    def customer_total(self, customer_id: str, currency: str = BASE_CURRENCY) -> float: ...
+
+    def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool:
+        """Moves money between existing accounts, in the sender's currency; False if the balance is short."""
+
+    def transfer_many(self, transfers: Iterable[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]:
+        """Applies a batch of transfers; one entry per transfer, None on success or an error message."""
+
+
+def _plan(transfers: list[tuple[str, str, float]], balances: dict[str, int], currencies: dict[str, int], rates: Optional[RateTable], atomic: bool) -> tuple[list[Optional[str]], dict[str, int]]:
+    # the validation and netting of Ledger.transfer_many, over account numbers;
+    # `balances` and `currencies` hold the minor-unit balances and currency ids
+    # of the existing involved accounts
+    errors: list[Optional[str]] = []
+    credits: list[int] = []
+    for account_number_from, account_number_to, amount in transfers:
+        minor = credit = to_minor(amount)
+        if account_number_from not in balances or account_number_to not in balances:
+            errors.append("Account not found")
+        elif minor <= 0:
+            errors.append("Transfer amount must be positive")
+        elif currencies[account_number_from] != currencies[account_number_to]:
+            try:
+                credit = fx.convert_minor(minor, currencies[account_number_from], currencies[account_number_to], rates)
+                errors.append(None)
+            except ValueError as e:
+                errors.append(str(e))
+        else:
+            errors.append(None)
+        credits.append(credit)
+    if atomic and any(errors):
+        return [e or "Batch rejected" for e in errors], {}
+
+    deltas: dict[str, int] = {}
+    for i, (account_number_from, account_number_to, amount) in enumerate(transfers):
+        if errors[i] is not None:
+            continue
+        minor = to_minor(amount)
+        if not atomic and balances[account_number_from] + deltas.get(account_number_from, 0) < minor:
+            errors[i] = "Not enough balance in the account"
+            continue
+        deltas[account_number_from] = deltas.get(account_number_from, 0) - minor
+        deltas[account_number_to] = deltas.get(account_number_to, 0) + credits[i]
+
+    if atomic:
+        short = {n for n, delta in deltas.items() if balances[n] + delta < 0}
+        if short:
+            return ["Not enough balance in the account" if t[0] in short else "Batch rejected" for t in transfers], {}
+    return errors, deltas
+
+
+class InMemoryAccounts:
+    """
+    Accounts as `Account` models in a dict under one lock: the original
+    representation, kept as the baseline the other backends are measured against.
+    """
+
+    def __init__(self, rates: Optional[RateTable] = None):
+        self._accounts: dict[str, Account] = {}
+        self._owners: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.rates = rates
+
+    def __contains__(self, account_number: str) -> bool:
+        return account_number in self._accounts
+
+    def contains(self, account_number: str) -> bool:
+        return account_number in self._accounts
+
+    def open(self, account_number: str, balance: float = 0.0, currency: str = BASE_CURRENCY) -> Account:
+        currency = fx.CURRENCIES[currency_id(currency)]
+        with self._lock:
+            account = self._accounts.get(account_number)
+            if account is None:
+                account = self._accounts[account_number] = Account(account_number=account_number, balance=balance, currency=currency)
+            return account
+
+    def assign(self, account_number: str, customer_id: str) -> None:
+        with self._lock:
+            self._accounts[account_number]  # KeyError for unknown accounts, like Ledger.assign
+            self._owners[account_number] = customer_id
+
+    def balance(self, account_number: str) -> float:
+        return self._accounts[account_number].balance
+
+    def currency(self, account_number: str) -> str:
+        return self._accounts[account_number].currency
+
+    def balances(self, account_numbers: Iterable[str]) -> list[tuple[float, str]]:
+        return [(a.balance, a.currency) for a in map(self._accounts.__getitem__, account_numbers)]
+
+    def customer_balances(self, customer_id: str) -> dict[str, float]:
+        totals: dict[str, int] = {}
+        with self._lock:
+            for n, a in self._accounts.items():
+                if self._owners.get(n) == customer_id:
+                    totals[a.currency] = totals.get(a.currency, 0) + to_minor(a.balance)
+        return {code: to_major(minor) for code, minor in totals.items() if minor}
+
+    def customer_total(self, customer_id: str, currency: str = BASE_CURRENCY) -> float:
+        return total_in(self.customer_balances(customer_id), currency, self.rates)
+
+    def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool:
+        minor = to_minor(amount)
+        if minor <= 0:
+            raise ValueError("Transfer amount must be positive")
+        with self._lock:
+            account_from, account_to = self._accounts[account_number_from], self._accounts[account_number_to]
+            credit = fx.convert_minor(minor, currency_id(account_from.currency), currency_id(account_to.currency), self.rates)
+            if not account_from.withdraw(amount):
+                return False
+            account_to.deposit(to_major(credit))
+            return True
+
+    def transfer_many(self, transfers: Iterable[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]:
+        transfers = list(transfers)
+        with self._lock:
+            involved = {n: self._accounts[n] for t in transfers for n in t[:2] if n in self._accounts}
+            balances = {n: to_minor(a.balance) for n, a in involved.items()}
+            currencies = {n: currency_id(a.currency) for n, a in involved.items()}
+            errors, deltas = _plan(transfers, balances, currencies, self.rates, atomic)
+            for account_number, delta in deltas.items():
+                self._accounts[account_number].balance = to_major(balances[account_number] + delta)
+        return errors
+
+
+class SQLiteAccounts:
+    """
+    Accounts in one SQLite table with integer minor-unit balances.
+
+    Every mutation is a single `BEGIN IMMEDIATE` transaction, so several worker
+    processes can share one database file and still never overdraw an account.
+    Currencies are stored as ids (see currency.py).
+    """
+
+    def __init__(self, path: str = ":memory:", rates: Optional[RateTable] = None):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._lock = threading.Lock()
+        self.rates = rates
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS accounts (account_number TEXT PRIMARY KEY, balance INTEGER NOT NULL CHECK (balance >= 0), owner TEXT, currency INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS accounts_owner ON accounts (owner);
+            """)
+            # databases from before currencies: every account is in EUR
+            if "currency" not in {row[1] for row in self._conn.execute("PRAGMA table_info(accounts)")}:
+                self._conn.execute("ALTER TABLE accounts ADD COLUMN currency INTEGER NOT NULL DEFAULT 0")
+
+    def __contains__(self, account_number: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM accounts WHERE account_number = ?", (account_number,)).fetchone() is not None
+
+    def contains(self, account_number: str) -> bool:
+        return account_number in self
+
+    def open(self, account_number: str, balance: float = 0.0, currency: str = BASE_CURRENCY) -> None:
+        minor = to_minor(balance)
+        if minor < 0:
+            raise ValueError("Balance must not be negative")
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO accounts (account_number, balance, currency) VALUES (?, ?, ?)", (account_number, minor, currency_id(currency)))
+
+    def assign(self, account_number: str, customer_id: str) -> None:
+        with self._lock:
+            if self._conn.execute("UPDATE accounts SET owner = ? WHERE account_number = ?", (customer_id, account_number)).rowcount == 0:
+                raise KeyError(account_number)
+
+    def balance(self, account_number: str) -> float:
+        with self._lock:
+            row = self._conn.execute("SELECT balance FROM accounts WHERE account_number = ?", (account_number,)).fetchone()
+        if row is None:
+            raise KeyError(account_number)
+        return to_major(row[0])
+
+    def currency(self, account_number: str) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT currency FROM accounts WHERE account_number = ?", (account_number,)).fetchone()
+        if row is None:
+            raise KeyError(account_number)
+        return fx.CURRENCIES[row[0]]
+
+    def balances(self, account_numbers: Iterable[str]) -> list[tuple[float, str]]:
+        account_numbers = list(account_numbers)
+        placeholders = ",".join("?" * len(account_numbers))
+        with self._lock:
+            rows = {n: (b, c) for n, b, c in self._conn.execute(f"SELECT account_number, balance, currency FROM accounts WHERE account_number IN ({placeholders})", account_numbers)} if account_numbers else {}
+        return [(to_major(rows[n][0]), fx.CURRENCIES[rows[n][1]]) for n in account_numbers]
+
+    def customer_balances(self, customer_id: str) -> dict[str, float]:
+        with self._lock:
+            rows = self._conn.execute("SELECT currency, SUM(balance) FROM accounts WHERE owner = ? GROUP BY currency", (customer_id,)).fetchall()
+        return {fx.CURRENCIES[c]: to_major(minor) for c, minor in rows if minor}
+
+    def customer_total(self, customer_id: str, currency: str = BASE_CURRENCY) -> float:
+        return total_in(self.customer_balances(customer_id), currency, self.rates)
+
+    def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool:
+        minor = to_minor(amount)
+        if minor <= 0:
+            raise ValueError("Transfer amount must be positive")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                currencies = dict(self._conn.execute("SELECT account_number, currency FROM accounts WHERE account_number IN (?, ?)", (account_number_from, account_number_to)))
+                for account_number in (account_number_from, account_number_to):
+                    if account_number not in currencies:
+                        self._conn.execute("ROLLBACK")
+                        raise KeyError(account_number)
+                try:
+                    credit = fx.convert_minor(minor, currencies[account_number_from], currencies[account_number_to], self.rates)
+                except ValueError:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                if self._conn.execute("UPDATE accounts SET balance = balance - ? WHERE account_number = ? AND balance >= ?", (minor, account_number_from, minor)).rowcount == 0:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                self._conn.execute("UPDATE accounts SET balance = balance + ? WHERE account_number = ?", (credit, account_number_to))
+                self._conn.execute("COMMIT")
+                return True
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def transfer_many(self, transfers: Iterable[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]:
+        transfers = list(transfers)
+        involved = list({n for t in transfers for n in t[:2] if n is not None})
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" * len(involved))
+                rows = self._conn.execute(f"SELECT account_number, balance, currency FROM accounts WHERE account_number IN ({placeholders})", involved).fetchall() if involved else []
+                balances = {n: b for n, b, _ in rows}
+                currencies = {n: c for n, _, c in rows}
+                errors, deltas = _plan(transfers, balances, currencies, self.rates, atomic)
+                self._conn.executemany("UPDATE accounts SET balance = balance + ? WHERE account_number = ?", [(d, n) for n, d in deltas.items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return errors
+
+
+def open_accounts(kind: Optional[str] = None, data_dir: Optional[str] = None, shards: Optional[str] = None) -> AccountBackend:
+    """
+    Opens an account backend; the arguments default to the environment.
+
+    Args:
+        kind: "ledger", "memory", "sqlite" or "sharded" (BANK_AGENT_BACKEND, default "ledger",
+            or "sharded" when BANK_AGENT_SHARDS is set).
+        data_dir: Where a ledger keeps its write-ahead log, or where accounts.db goes for
+            SQLite (BANK_AGENT_DATA_DIR). Without it balances live in memory. A ledger
+            directory is opened once per process, later calls get the same ledger, and
+            `persistence.DataDirLocked` is raised if another process has it open.
+        shards: Comma-separated host:port of the shards (BANK_AGENT_SHARDS). Connecting
+            needs the shards' key in BANK_AGENT_SHARD_KEY.
+
+    Returns:
+        The backend, with the exchange rates of `currency.from_env()` attached as
+        `rates`. A ledger also gets a `TransactionHistory` attached as `history`, a
+        sharded backend reads it from the shards.
+    """
+    shards = shards or os.getenv("BANK_AGENT_SHARDS")
+    kind = kind or os.getenv("BANK_AGENT_BACKEND") or ("sharded" if shards else "ledger")
+    data_dir = data_dir or os.getenv("BANK_AGENT_DATA_DIR")
+
+    rates = fx.from_env()
+
+    if kind == "sharded":
+        from .sharding import ShardedLedger, authkey_from_env
+        return ShardedLedger.connect(shards, authkey_from_env(), rates=rates)
+    if kind == "memory":
+        return InMemoryAccounts(rates)
+    if kind == "sqlite":
+        if data_dir:
+            Path(data_dir).mkdir(parents=True, exist_ok=True)
+        return SQLiteAccounts(str(Path(data_dir) / "accounts.db") if data_dir else ":memory:", rates)
+    if kind != "ledger":
+        raise ValueError(f"Unknown account backend: {kind}")
+
+    if not data_dir:
+        ledger = Ledger()
+        ledger.history = TransactionHistory()
+        ledger.rates = rates
+        return ledger
+
+    directory = Path(data_dir).resolve()
+    with _persistent_ledgers_lock:
+        ledger = _persistent_ledgers.get(directory)
+        if ledger is None:
+            from .persistence import LedgerPersistence
+            persistence = LedgerPersistence(str(directory))
+            ledger = persistence.open()  # with its history, restored from the data directory
+            atexit.register(persistence.close)
+            ledger.rates = rates
+            _persistent_ledgers[directory] = ledger
+    return ledger
+
+
+def is_private(backend: AccountBackend) -> bool:
+    """
+    Tells whether balances change only through this backend object: an in-memory
+    ledger or `InMemoryAccounts`. A ledger on a data directory is shared by every
+    agent in the process, SQLite and the shards by other processes too.
+    """
+    if isinstance(backend, Ledger):
+        return backend.journal is None
+    return isinstance(backend, InMemoryAccounts)
+
+
+def account_store(backend: AccountBackend) -> AccountStore:
+    """
+    Wraps a backend for the async tools: a ledger answers on the event loop, the
+    others block on I/O or a lock and run on the thread pool.
+    """
+    return LedgerStore(backend) if isinstance(backend, Ledger) else ThreadPoolStore(backend)
+
+
+def history_store(backend: AccountBackend) -> Optional[HistoryStore]:
+    """
+    Wraps a backend's transaction history for the statement and spending tools:
+    a ledger's answers on the event loop, the shards' runs on the thread pool.
+
+    Returns:
+        The store, or None if the backend keeps no history.
+    """
+    history = getattr(backend, "history", None)
+    if history is None:
+        return None
+    return LocalHistoryStore(history) if isinstance(history, TransactionHistory) else ThreadPoolStore(history)
+
+
+def open_demo_accounts(backend: AccountBackend, customers: CustomerRepository) -> dict[str, object]:
+    """
+    Opens the demo accounts (no-op for existing ones) and assigns them to their customers.
+
+    Returns:
+        dict: Account number -> the backend's account object.
+    """
+    accounts = {n: backend.open(n, balance=balance, currency=currency) for n, (balance, currency) in DEMO_ACCOUNTS.items()}
+    for account_number in accounts:
+        backend.assign(account_number, customers.by_account(account_number).customer_id)
+    return accounts
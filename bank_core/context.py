@@ -0,0 +1,223 @@
+# flake8: noqa: E501
+import json
+import logging
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough average for English text and JSON with Gemini tokenizers
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+metrics.describe("bank_llm_request_tokens", "Estimated input tokens per model request, by request part.")
+metrics.describe("bank_llm_history_compacted_total", "Tool results summarized and messages dropped from model requests.")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a text without calling the model's tokenizer.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def system_text(llm_request: LlmRequest) -> str:
+    """
+    Returns the system instruction of a model request as plain text.
+    """
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if instruction is None:
+        return ""
+    if isinstance(instruction, str):
+        return instruction
+    return "".join(part.text or "" for part in instruction.parts or [])
+
+
+def content_tokens(content: types.Content) -> int:
+    """
+    Estimates the tokens of one message of the conversation history.
+    """
+    tokens = 0
+    for part in content.parts or []:
+        if part.text:
+            tokens += estimate_tokens(part.text)
+        elif part.function_call:
+            tokens += estimate_tokens(json.dumps(part.function_call.args or {}, default=str))
+        elif part.function_response:
+            tokens += estimate_tokens(json.dumps(part.function_response.response or {}, default=str))
+    return tokens
+
+
+def request_tokens(llm_request: LlmRequest) -> dict[str, int]:
+    """
+    Estimates the input tokens of a model request, split into the system
+    instruction, the conversation history and the tool declarations.
+    """
+    history = sum(content_tokens(content) for content in llm_request.contents)
+
+    tools = 0
+    for tool in (llm_request.config.tools or []) if llm_request.config else []:
+        for declaration in getattr(tool, "function_declarations", None) or []:
+            tools += estimate_tokens(declaration.model_dump_json(exclude_none=True))
+
+    return {"system": estimate_tokens(system_text(llm_request)), "history": history, "tools": tools}
+
+
+class ContextBudget:
+    """
+    ADK before-model callback that measures every request and keeps the static
+    instruction at the start of the system prompt.
+
+    Model-side context caching only reuses an identical prefix, so anything dynamic
+    (like a global instruction with the customer profile) is moved behind the
+    static part. Requests over `max_input_tokens` are logged.
+    """
+
+    def __init__(self, static_prefix: str, max_input_tokens: Optional[int] = None):
+        self.static_prefix = static_prefix
+        self.max_input_tokens = max_input_tokens
+
+    def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        self._stabilize(llm_request)
+
+        counts = request_tokens(llm_request)
+        for part, tokens in counts.items():
+            metrics.observe("bank_llm_request_tokens", {"agent": callback_context.agent_name, "part": part}, tokens, TOKEN_BUCKETS)
+
+        total = sum(counts.values())
+        if self.max_input_tokens is not None and total > self.max_input_tokens:
+            logger.warning("Request of %s is about %d tokens, over the budget of %d: %s", callback_context.agent_name, total, self.max_input_tokens, counts)
+        return None
+
+    def _stabilize(self, llm_request: LlmRequest) -> None:
+        instruction = llm_request.config.system_instruction if llm_request.config else None
+        if not isinstance(instruction, str) or instruction.startswith(self.static_prefix):
+            return
+        head, found, tail = instruction.partition(self.static_prefix)
+        if found:
+            llm_request.config.system_instruction = self.static_prefix + tail + head
+
+
+def summarize_result(response: dict, max_value_chars: int = 80) -> dict:
+    """
+    Shrinks a tool result to its top-level outcome: short values stay, long
+    strings are cut, and nested lists and objects are replaced by their size.
+    """
+    summary = {}
+    for key, value in response.items():
+        if isinstance(value, (list, tuple)):
+            summary[key] = f"[{len(value)} items omitted]"
+        elif isinstance(value, dict):
+            summary[key] = f"{{{len(value)} fields omitted}}"
+        elif isinstance(value, str) and len(value) > max_value_chars:
+            summary[key] = value[:max_value_chars] + "..."
+        else:
+            summary[key] = value
+    return summary
+
+
+def _is_user_turn(content: types.Content) -> bool:
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+class HistoryCompactor:
+    """
+    ADK before-model callback that bounds the conversation history sent to the model.
+
+    The last `keep_turns` user turns go out unchanged. In older turns, tool results
+    longer than `max_result_chars` are replaced by `summarize_result`, and if the
+    history is still over `max_history_tokens` the oldest turns are dropped whole,
+    so every remaining function call keeps its response.
+
+    The stored session is compacted as well (see `compact_session`), so memory per
+    session stays bounded regardless of conversation length. Session state needs no
+    compaction: the tools only keep the current customer id there.
+    """
+
+    def __init__(self, max_history_tokens: int = 8192, keep_turns: int = 2, max_result_chars: int = 400, max_session_turns: int = 50):
+        self.max_history_tokens = max_history_tokens
+        self.keep_turns = keep_turns
+        self.max_result_chars = max_result_chars
+        self.max_session_turns = max(max_session_turns, keep_turns)
+
+    def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        forgotten = self.compact_session(callback_context.session)
+        if forgotten:
+            metrics.inc("bank_llm_history_compacted_total", {"agent": callback_context.agent_name, "action": "forgotten"}, forgotten)
+
+        contents = llm_request.contents
+        starts = [i for i, content in enumerate(contents) if _is_user_turn(content)]
+        if len(starts) <= self.keep_turns:
+            return None
+        recent = starts[-self.keep_turns] if self.keep_turns else len(contents)
+
+        old = [self._compact(content) for content in contents[:recent]]
+        summarized = sum(a is not b for a, b in zip(old, contents))
+        tokens = [content_tokens(content) for content in old]
+        total = sum(tokens) + sum(content_tokens(content) for content in contents[recent:])
+
+        # drop whole turns, oldest first, up to the next user turn
+        drop = 0
+        boundaries = [i for i in starts if 0 < i < recent] + [recent]
+        for boundary in boundaries:
+            if total <= self.max_history_tokens:
+                break
+            total -= sum(tokens[drop:boundary])
+            drop = boundary
+
+        if summarized:
+            metrics.inc("bank_llm_history_compacted_total", {"agent": callback_context.agent_name, "action": "summarized"}, summarized)
+        if drop:
+            metrics.inc("bank_llm_history_compacted_total", {"agent": callback_context.agent_name, "action": "dropped"}, drop)
+        llm_request.contents = old[drop:] + contents[recent:]
+        return None
+
+    def compact_session(self, session) -> int:
+        """
+        Compacts the stored events of a session in place.
+
+        Tool results before the last `keep_turns` user turns are summarized like in
+        requests, and events older than the last `max_session_turns` user turns lose
+        their content, which the model never sees again. Events are only replaced,
+        never removed: session services share the event objects with their storage,
+        but not the event list.
+
+        Args:
+            session: The ADK session whose events are compacted.
+
+        Returns:
+            int: The number of events whose content was dropped.
+        """
+        events = session.events
+        starts = [i for i, event in enumerate(events) if event.content is not None and _is_user_turn(event.content)]
+        if len(starts) <= self.keep_turns:
+            return 0
+        recent = starts[-self.keep_turns] if self.keep_turns else len(events)
+        forget = starts[-self.max_session_turns] if len(starts) > self.max_session_turns else 0
+
+        forgotten = 0
+        for i in range(recent):
+            event = events[i]
+            if event.content is None:
+                continue
+            if i < forget:
+                event.content = None
+                forgotten += 1
+            else:
+                event.content = self._compact(event.content)
+        return forgotten
+
+    def _compact(self, content: types.Content) -> types.Content:
+        parts = []
+        for part in content.parts or []:
+            response = part.function_response
+            if response is not None and len(json.dumps(response.response or {}, default=str)) > self.max_result_chars:
+                part = part.model_copy(update={"function_response": response.model_copy(update={"response": summarize_result(response.response)})})
+            parts.append(part)
+        if all(a is b for a, b in zip(parts, content.parts or [])):
+            return content
+        return content.model_copy(update={"parts": parts})
@@ -0,0 +1,222 @@
+# flake8: noqa: E501
+"""
+Currencies and exchange rates.
+
+Rates come from a local JSON file with the rates of every currency against one
+base currency:
+
+    {"base": "EUR", "as_of": "2026-10-16", "rates": {"USD": 1.0812, "GBP": 0.8634}}
+
+`RateTable` expands it into the full cross-rate matrix once per load and swaps
+the whole matrix in with one assignment, so a conversion is a multiplication by
+one precomputed array element and never sees a half-refreshed table. Whoever
+updates the file should replace it atomically, e.g. with `write_rates`.
+"""
+import json
+import logging
+import math
+import operator
+import os
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+# ISO codes by currency id. The ids are stored in the ledger, its journal and its
+# snapshots: append new currencies, never reorder or remove them.
+CURRENCIES = ("EUR", "USD", "GBP", "CHF", "JPY", "BGN", "RON", "PLN", "CZK", "HUF", "SEK", "NOK", "DKK", "CAD", "AUD")
+CURRENCY_IDS = {code: i for i, code in enumerate(CURRENCIES)}
+BASE_CURRENCY = "EUR"
+
+DEFAULT_RATES_FILE = Path(__file__).with_name("rates.json")
+
+
+def currency_id(code: str) -> int:
+    """
+    Returns the id of an ISO currency code.
+
+    Raises:
+        ValueError: If the currency is not supported.
+    """
+    try:
+        return CURRENCY_IDS[code.strip().upper()]
+    except KeyError:
+        raise ValueError(f"Unsupported currency: {code}") from None
+
+
+class RateMatrix:
+    """
+    Immutable cross rates between all `CURRENCIES`: `rates[i * n + j]` is the price
+    of one unit of currency `i` in currency `j`, NaN where a rate is unknown.
+    """
+    __slots__ = ("rates", "as_of")
+
+    def __init__(self, rates: array, as_of: str = ""):
+        if len(rates) != len(CURRENCIES) ** 2:
+            raise ValueError("A rate matrix needs one rate per pair of currencies")
+        self.rates = rates
+        self.as_of = as_of
+
+    @classmethod
+    def from_base(cls, base: str, rates: dict[str, float], as_of: str = "") -> "RateMatrix":
+        """
+        Builds the cross rates from the rates of every currency against `base`
+        (units of the currency per unit of `base`).
+        """
+        per_base = [math.nan] * len(CURRENCIES)
+        per_base[currency_id(base)] = 1.0
+        for code, rate in rates.items():
+            if not rate > 0:
+                raise ValueError(f"Invalid rate for {code}: {rate}")
+            per_base[currency_id(code)] = float(rate)
+        return cls(array("d", (to / of for of in per_base for to in per_base)), as_of)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "RateMatrix":
+        with open(path) as f:
+            data = json.load(f)
+        return cls.from_base(data["base"], data["rates"], data.get("as_of", ""))
+
+    def _rate(self, from_id: int, to_id: int) -> float:
+        rate = self.rates[from_id * len(CURRENCIES) + to_id]
+        if rate != rate:
+            raise ValueError(f"No exchange rate from {CURRENCIES[from_id]} to {CURRENCIES[to_id]}")
+        return rate
+
+    def rate(self, from_currency: str, to_currency: str) -> float:
+        return self._rate(currency_id(from_currency), currency_id(to_currency))
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        """
+        Converts an amount, rounded to cents.
+        """
+        return round(amount * self.rate(from_currency, to_currency), 2)
+
+    def convert_minor(self, minor: int, from_id: int, to_id: int) -> int:
+        """
+        Converts integer minor units between currency ids.
+        """
+        return minor if from_id == to_id else round(minor * self._rate(from_id, to_id))
+
+    def convert_many(self, amounts: Sequence[float], currencies: Sequence[str], to_currency: str) -> list[float]:
+        """
+        Converts many amounts, each in its own currency, into one currency.
+
+        The rates into the target currency are one column of the matrix, so the
+        whole batch is two `map`s over flat arrays instead of a lookup per amount.
+        """
+        column = self.rates[currency_id(to_currency)::len(CURRENCIES)]
+        rates = list(map(column.__getitem__, map(currency_id, currencies)))
+        if any(rate != rate for rate in rates):
+            missing = sorted({c for c, rate in zip(currencies, rates) if rate != rate})
+            raise ValueError(f"No exchange rate from {', '.join(missing)} to {to_currency}")
+        return [round(value, 2) for value in map(operator.mul, amounts, rates)]
+
+
+class RateTable:
+    """
+    The current `RateMatrix` of a rates file, reloaded when the file changes.
+
+    Readers take `matrix` once per operation and keep using that object, so a
+    refresh never changes rates in the middle of a conversion. A file that fails
+    to load is logged and the previous rates stay in place.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_RATES_FILE):
+        self.path = Path(path)
+        self._stamp = self._file_stamp()
+        self.matrix = RateMatrix.load(self.path)
+        self._lock = threading.Lock()
+
+    def _file_stamp(self) -> tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self) -> bool:
+        """
+        Reloads the rates if the file changed.
+
+        Returns:
+            bool: Whether new rates were swapped in.
+        """
+        with self._lock:
+            try:
+                stamp = self._file_stamp()
+                if stamp == self._stamp:
+                    return False
+                matrix = RateMatrix.load(self.path)
+            except (OSError, ValueError, KeyError):
+                logger.exception("Keeping the previous exchange rates, %s failed to load", self.path)
+                return False
+            self._stamp = stamp
+            self.matrix = matrix
+            return True
+
+    def start(self, interval: float = 60.0) -> None:
+        """
+        Checks the file for new rates every `interval` seconds on a daemon thread.
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                self.refresh()
+
+        threading.Thread(target=run, name="exchange-rates", daemon=True).start()
+
+
+def convert_minor(minor: int, from_id: int, to_id: int, rates: Optional[RateTable]) -> int:
+    """
+    Converts minor units between currency ids; a no-op within one currency.
+
+    Raises:
+        ValueError: If the currencies differ and there are no rates between them.
+    """
+    if from_id == to_id:
+        return minor
+    if rates is None:
+        raise ValueError(f"No exchange rate from {CURRENCIES[from_id]} to {CURRENCIES[to_id]}")
+    return rates.matrix.convert_minor(minor, from_id, to_id)
+
+
+def total_in(balances: dict[str, float], currency: str, rates: Optional[RateTable]) -> float:
+    """
+    Sums per-currency balances in one currency.
+
+    Raises:
+        ValueError: If a balance needs converting and there are no rates for it.
+    """
+    foreign = {code: amount for code, amount in balances.items() if code != currency and amount}
+    own = balances.get(currency, 0.0)
+    if not foreign:
+        return own
+    if rates is None:
+        raise ValueError(f"No exchange rate from {', '.join(sorted(foreign))} to {currency}")
+    return round(own + sum(rates.matrix.convert_many(list(foreign.values()), list(foreign), currency)), 2)
+
+
+def write_rates(path: Union[str, Path], base: str, rates: dict[str, float], as_of: str = "") -> None:
+    """
+    Writes a rates file atomically, so a `RateTable` never reads half of it.
+    """
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"base": base, "as_of": as_of, "rates": rates}, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def from_env() -> RateTable:
+    """
+    The rates of BANK_AGENT_RATES_FILE (default: the bundled demo rates), checked
+    for changes every BANK_AGENT_RATES_REFRESH seconds (default 60, 0 to never).
+    """
+    rates = RateTable(os.getenv("BANK_AGENT_RATES_FILE") or DEFAULT_RATES_FILE)
+    interval = float(os.getenv("BANK_AGENT_RATES_REFRESH", "60"))
+    if interval > 0:
+        rates.start(interval)
+    return rates
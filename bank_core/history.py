@@ -0,0 +1,227 @@
+# flake8: noqa: E501
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Optional
+
+from .ledger import ADJUST, DEPOSIT, OPEN, TRANSFER, WITHDRAW, Journal, to_major
+
+ENTRY = 64  # journal record type of one history entry (see persistence.py)
+
+KIND_NAMES = {OPEN: "opening balance", DEPOSIT: "deposit", WITHDRAW: "withdrawal", TRANSFER: "transfer", ADJUST: "adjustment"}
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m", "year": "%Y"}
+
+
+class _AccountIndex:
+    """
+    Time index of one account: entry times in ascending order and their rows.
+    """
+    __slots__ = ("times", "rows")
+
+    def __init__(self):
+        self.times = array("d")
+        self.rows = array("l")
+
+
+class TransactionHistory:
+    """
+    Append-only transaction history in columnar form.
+
+    Every entry is one row across flat arrays (time, account, amount, counterparty,
+    kind), so a million entries cost a few tens of MB instead of a million objects.
+    A transfer is two rows, a debit on the sender and a credit on the receiver.
+
+    Each account keeps its own time index, so a statement page or a spend total for
+    a date range is a binary search plus a walk over that account's matching rows.
+    Times are strictly increasing, which keeps every index sorted by appending.
+
+    If a `journal` is attached, every entry is appended to it as an `ENTRY` record
+    and `record` returns the record's sequence number; `redo` loads those records
+    back. `snapshot` and `restore` copy the columns out and back in.
+    """
+
+    def __init__(self, journal: Optional[Journal] = None):
+        self._ids: dict[str, int] = {}
+        self._numbers: list[str] = []
+        self._indexes: list[_AccountIndex] = []
+        self._times = array("d")
+        self._accounts = array("i")
+        self._amounts = array("q")
+        self._counterparties = array("i")
+        self._kinds = array("b")
+        self._last = 0.0
+        self._lock = Lock()
+        self.journal = journal
+
+    @classmethod
+    def restore(cls, numbers: list[str], times: array, accounts: array, amounts: array, counterparties: array, kinds: array, **kwargs) -> "TransactionHistory":
+        """
+        Builds a history from the columns of `snapshot` and re-creates the time indexes.
+        """
+        history = cls(**kwargs)
+        history._numbers = numbers
+        history._ids = {n: account_id for account_id, n in enumerate(numbers)}
+        history._indexes = [_AccountIndex() for _ in numbers]
+        history._times, history._accounts, history._amounts, history._counterparties, history._kinds = times, accounts, amounts, counterparties, kinds
+        for row, (at, account_id) in enumerate(zip(times, accounts)):
+            index = history._indexes[account_id]
+            index.times.append(at)
+            index.rows.append(row)
+        history._last = times[-1] if times else 0.0
+        return history
+
+    def snapshot(self, rows: Optional[int] = None) -> tuple[list[str], array, array, array, array, array]:
+        """
+        Copies the first `rows` entries (all by default), e.g. as many as there were
+        when the ledger was frozen.
+
+        Returns:
+            tuple: Account numbers and the time, account id, amount, counterparty id and kind columns.
+        """
+        with self._lock:
+            rows = len(self._times) if rows is None else rows
+            return list(self._numbers), self._times[:rows], self._accounts[:rows], self._amounts[:rows], self._counterparties[:rows], self._kinds[:rows]
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def record(self, account_number: str, minor: int, kind: int, counterparty: Optional[str] = None) -> Optional[int]:
+        """
+        Appends one entry; `minor` is negative for money leaving the account.
+
+        Returns:
+            int: The journal sequence number of the entry, or None without a journal.
+        """
+        with self._lock:
+            return self._append(self._tick(), account_number, minor, kind, counterparty)
+
+    def record_transfer(self, account_number_from: str, account_number_to: str, minor: int, minor_to: Optional[int] = None) -> Optional[int]:
+        """
+        Appends both sides of a transfer; `minor_to` is the amount credited when
+        the receiver's currency differs from the sender's. Returns the journal
+        sequence number of the second entry, like `record`.
+        """
+        with self._lock:
+            self._append(self._tick(), account_number_from, -minor, TRANSFER, account_number_to)
+            return self._append(self._tick(), account_number_to, minor if minor_to is None else minor_to, TRANSFER, account_number_from)
+
+    def redo(self, at: float, account_number: str, minor: int, kind: int, counterparty: Optional[str]) -> None:
+        """
+        Re-appends a journaled entry with its original time, without journaling it again. Used on recovery.
+        """
+        with self._lock:
+            self._last = max(self._last, at)
+            self._append(at, account_number, minor, kind, counterparty, journal=False)
+
+    def _tick(self) -> float:
+        now = time.time()
+        self._last = now if now > self._last else self._last + 1e-6
+        return self._last
+
+    def _id(self, account_number: str) -> int:
+        account_id = self._ids.get(account_number)
+        if account_id is None:
+            account_id = self._ids[account_number] = len(self._numbers)
+            self._numbers.append(account_number)
+            self._indexes.append(_AccountIndex())
+        return account_id
+
+    def _append(self, at: float, account_number: str, minor: int, kind: int, counterparty: Optional[str], journal: bool = True) -> Optional[int]:
+        seq = None
+        if journal and self.journal is not None:
+            seq = self.journal.append(ENTRY, (at, account_number, minor, kind, counterparty))
+        account_id = self._id(account_number)
+        row = len(self._times)
+        self._times.append(at)
+        self._accounts.append(account_id)
+        self._amounts.append(minor)
+        self._counterparties.append(self._id(counterparty) if counterparty is not None else -1)
+        self._kinds.append(kind)
+        index = self._indexes[account_id]
+        index.times.append(at)
+        index.rows.append(row)
+        return seq
+
+    def _range(self, account_number: str, start: Optional[float], end: Optional[float]) -> tuple[Optional[_AccountIndex], int, int]:
+        # positions [lo, hi) of the account's entries with start <= time < end
+        with self._lock:
+            account_id = self._ids.get(account_number)
+            if account_id is None:
+                return None, 0, 0
+            index = self._indexes[account_id]
+            lo = bisect_left(index.times, start) if start is not None else 0
+            hi = bisect_left(index.times, end) if end is not None else len(index.times)
+        return index, lo, hi
+
+    def statement(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 20, cursor: Optional[int] = None) -> tuple[list[dict], Optional[int]]:
+        """
+        Returns one page of an account's entries, newest first.
+
+        Args:
+            account_number: The account.
+            start: Earliest entry time (inclusive), as a Unix timestamp.
+            end: Latest entry time (exclusive), as a Unix timestamp.
+            limit: Maximum number of entries on the page.
+            cursor: The cursor returned with the previous page.
+
+        Returns:
+            tuple: The entries and the cursor of the next page, or None on the last page.
+        """
+        index, lo, hi = self._range(account_number, start, end)
+        if index is None:
+            return [], None
+        if cursor is not None:
+            hi = min(hi, cursor)
+        first = max(lo, hi - limit)
+        entries = [self._entry(index.rows[position]) for position in range(hi - 1, first - 1, -1)]
+        return entries, (first if first > lo else None)
+
+    def spending(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, period: str = "month") -> dict[str, float]:
+        """
+        Sums the money that left an account in a time range, per day, month or year (UTC).
+        """
+        fmt = PERIOD_FORMATS[period]
+        index, lo, hi = self._range(account_number, start, end)
+        if index is None:
+            return {}
+        totals: dict[str, int] = {}
+        times, amounts = self._times, self._amounts
+        for row in index.rows[lo:hi]:
+            minor = amounts[row]
+            if minor < 0:
+                label = datetime.fromtimestamp(times[row], timezone.utc).strftime(fmt)
+                totals[label] = totals.get(label, 0) - minor
+        return {label: to_major(minor) for label, minor in totals.items()}
+
+    def _entry(self, row: int) -> dict:
+        counterparty = self._counterparties[row]
+        entry = {
+            "time": datetime.fromtimestamp(self._times[row], timezone.utc).isoformat(timespec="seconds"),
+            "type": KIND_NAMES[self._kinds[row]],
+            "amount": to_major(self._amounts[row]),
+        }
+        if counterparty >= 0:
+            entry["counterparty"] = self._numbers[counterparty]
+        return entry
+
+
+def parse_range(start_date: str, end_date: str) -> tuple[Optional[float], Optional[float]]:
+    """
+    Converts ISO dates or date-times (UTC unless they have an offset) to a [start, end)
+    range of Unix timestamps. An end date without a time includes that whole day; an
+    empty string leaves that side open.
+    """
+    start = _timestamp(start_date) if start_date else None
+    end = _timestamp(end_date) if end_date else None
+    if end is not None and len(end_date) == 10:
+        end += 24 * 3600
+    return start, end
+
+
+def _timestamp(value: str) -> float:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
@@ -0,0 +1,132 @@
+# flake8: noqa: E501
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable
+
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from google.adk.tools import ToolContext
+
+metrics.describe("bank_tool_deduplicated_total", "Tool calls answered from the idempotency index instead of running again.")
+
+KEY_DOC = """
+
+        A repeated call with the same optional idempotency_key returns the first call's result
+        instead of running again."""
+
+
+class IdempotencyIndex:
+    """
+    Bounded index of recent operation keys and their results.
+
+    The first call for a key runs the operation; calls with the same key while it
+    runs wait for it, and later ones get its result back. Keys are kept for `ttl`
+    seconds and the oldest are evicted beyond `max_keys`. A call that raises is
+    forgotten, so it can be retried.
+    """
+
+    def __init__(self, max_keys: int = 100_000, ttl: float = 24 * 3600.0):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, asyncio.Future]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def run(self, key: str, operation: Callable):
+        """
+        Runs `operation()` once per key and returns its result, or the result of the first run.
+
+        Returns:
+            tuple: The result and whether it was replayed from the index.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                future = asyncio.get_running_loop().create_future()
+                self._entries[key] = (now + self.ttl, future)
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+
+        if entry is not None:
+            return await asyncio.shield(entry[1]), True
+
+        try:
+            result = await operation()
+        except BaseException as e:
+            with self._lock:
+                if self._entries.get(key, (None, None))[1] is future:
+                    del self._entries[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # nobody may be waiting; don't log it as never retrieved
+            raise
+        future.set_result(result)
+        return result, False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _expire(self, now: float) -> None:
+        # all keys share the ttl, so the oldest entries expire first
+        while self._entries:
+            expires, _ = next(iter(self._entries.values()))
+            if expires > now:
+                break
+            self._entries.popitem(last=False)
+
+    def idempotent(self, tool: Callable) -> Callable:
+        """
+        Decorates a mutating tool to take an optional `idempotency_key` and run once per key.
+
+        Without a key the call is identified by the session, the invocation and its
+        arguments, so a model retrying the same transfer within one turn gets the
+        first result back. Supplied keys are scoped to the session.
+        """
+        name = tool.__name__
+        signature = inspect.signature(tool)
+        takes_context = "tool_context" in signature.parameters
+
+        @functools.wraps(tool)
+        async def wrapper(*args, tool_context: "ToolContext", idempotency_key: str = "", **kwargs):
+            bound = signature.bind_partial(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {k: v for k, v in bound.arguments.items() if k != "tool_context"}
+
+            session_id = tool_context.session.id
+            if idempotency_key:
+                key = f"{session_id}:{name}:{idempotency_key}"
+            else:
+                payload = json.dumps(arguments, sort_keys=True, default=str)
+                key = f"{session_id}:{tool_context.invocation_id}:{name}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+            async def operation():
+                result = tool(**arguments, tool_context=tool_context) if takes_context else tool(**arguments)
+                return await result if inspect.isawaitable(result) else result
+
+            result, replayed = await self.run(key, operation)
+            if replayed:
+                metrics.inc("bank_tool_deduplicated_total", {"tool": name})
+            return result
+
+        parameters = [p for p in signature.parameters.values() if p.name != "tool_context"]
+        wrapper.__signature__ = signature.replace(parameters=[
+            *parameters,
+            inspect.Parameter("tool_context", inspect.Parameter.KEYWORD_ONLY, annotation="ToolContext"),
+            inspect.Parameter("idempotency_key", inspect.Parameter.KEYWORD_ONLY, default="", annotation=str),
+        ])
+        wrapper.__doc__ = (tool.__doc__ or "").rstrip() + KEY_DOC
+        return wrapper
@@ -0,0 +1,178 @@
+# flake8: noqa: E501
+"""
+Content-addressed cache of model responses on disk.
+
+A request is keyed by the SHA-256 of everything that decides the answer: the
+model, the system instruction, the conversation, the tool declarations and the
+generation settings. Replaying a recorded run therefore needs neither network
+nor API key, and gives the same answers every time:
+
+    BANK_AGENT_LLM_CACHE=./llm-cache adk web                    # record (and reuse)
+    BANK_AGENT_LLM_CACHE=./llm-cache BANK_AGENT_LLM_CACHE_OFFLINE=1 adk web   # replay only
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+
+from .context import system_text
+from .metrics import metrics
+
+metrics.describe("bank_llm_cache_requests_total", "Model requests looked up in the response cache, by result (hit or miss).")
+
+# generation settings that can change the answer; the rest of the config is keyed separately or not at all
+_CONFIG_EXCLUDE = {"system_instruction", "tools", "http_options", "labels"}
+
+
+class CacheMiss(LookupError):
+    """
+    Raised for a request without a cached response when the cache is offline.
+    """
+
+
+def request_key(llm_request: LlmRequest) -> str:
+    """
+    Returns the cache key of a model request.
+
+    Function call ids are left out: ADK makes up new ones every run, and they
+    don't change what the model answers.
+    """
+    contents = [content.model_dump(mode="json", exclude_none=True) for content in llm_request.contents]
+    for content in contents:
+        for part in content.get("parts", []):
+            for field in ("function_call", "function_response"):
+                if field in part:
+                    part[field].pop("id", None)
+
+    config = llm_request.config
+    declarations = [
+        declaration.model_dump(mode="json", exclude_none=True)
+        for tool in ((config.tools or []) if config else [])
+        for declaration in getattr(tool, "function_declarations", None) or []
+    ]
+    payload = {
+        "model": llm_request.model,
+        "system": system_text(llm_request),
+        "contents": contents,
+        "tools": declarations,
+        "config": config.model_dump(mode="json", exclude_none=True, exclude=_CONFIG_EXCLUDE) if config else {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    ADK model callbacks that serve repeated requests from disk.
+
+    `before_model` answers a request from the cache, which skips the model call;
+    on a miss it remembers the key, and `after_model` stores the final response
+    under it. Entries are one JSON file each, written atomically, so concurrent
+    workers can share a directory. Past `max_entries` the least recently used
+    entries of this process's index are deleted.
+
+    `on_model_error` forgets the key of a failed model call. Turns cancelled while
+    the model runs get no callback, so at most `max_pending` keys are remembered,
+    oldest dropped first.
+    """
+
+    def __init__(self, directory: str, max_entries: int = 10_000, offline: bool = False, max_pending: int = 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.offline = offline
+        self.max_pending = max_pending
+        self._pending: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # least recently used first, from the modification times that `get` refreshes
+        files = sorted(self.directory.glob("*/*.json"), key=lambda f: f.stat().st_mtime)
+        self._index: OrderedDict[str, None] = OrderedDict((f.stem, None) for f in files)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[LlmResponse]:
+        path = self._path(key)
+        try:
+            response = LlmResponse.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        with self._lock:
+            self._index[key] = None
+            self._index.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: LlmResponse) -> None:
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(response.model_dump_json(exclude_none=True))
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._index[key] = None
+            self._index.move_to_end(key)
+            evicted = [self._index.popitem(last=False)[0] for _ in range(len(self._index) - self.max_entries)]
+        for old in evicted:
+            self._path(old).unlink(missing_ok=True)
+
+    def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        key = request_key(llm_request)
+        response = self.get(key)
+        metrics.inc("bank_llm_cache_requests_total", {"agent": callback_context.agent_name, "result": "miss" if response is None else "hit"})
+        if response is not None:
+            return response
+        if self.offline:
+            raise CacheMiss(f"No cached response for the request of {callback_context.agent_name} ({key})")
+        with self._lock:
+            self._pending[(callback_context.invocation_id, callback_context.agent_name)] = key
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+        return None
+
+    def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        if llm_response.partial:
+            return None
+        with self._lock:
+            key = self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if key is None or llm_response.error_code or llm_response.content is None:
+            return None
+
+        stored = llm_response.model_copy(deep=True)
+        for part in stored.content.parts or []:
+            if part.function_call:
+                part.function_call.id = None  # ADK gives replayed calls fresh ids
+        self.put(key, stored)
+        return None
+
+    def on_model_error(self, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception) -> Optional[LlmResponse]:
+        with self._lock:
+            self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        return None
+
+
+def from_env() -> Optional[ResponseCache]:
+    """
+    The cache configured by BANK_AGENT_LLM_CACHE (directory), BANK_AGENT_LLM_CACHE_SIZE
+    (entries) and BANK_AGENT_LLM_CACHE_OFFLINE, or None if it isn't set.
+    """
+    directory = os.getenv("BANK_AGENT_LLM_CACHE")
+    if not directory:
+        return None
+    return ResponseCache(
+        directory,
+        max_entries=int(os.getenv("BANK_AGENT_LLM_CACHE_SIZE", "10000")),
+        offline=os.getenv("BANK_AGENT_LLM_CACHE_OFFLINE", "") not in ("", "0"),
+    )
@@ -0,0 +1,93 @@
+# flake8: noqa: E501
+from array import array
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterable, NamedTuple, Optional, Sequence
+
+from .backends import AccountBackend
+
+if TYPE_CHECKING:
+    from .storage import AccountStore
+
+
+@dataclass(frozen=True)
+class LoanApplication:
+    customer_id: str
+    loan_amount: float
+    loan_term: int
+
+
+class LoanBatch(NamedTuple):
+    """
+    Column view of many loan applications, as seen by scoring rules.
+    """
+    amounts: array
+    terms: array
+    totals: array
+
+
+class LoanDecision(NamedTuple):
+    approved: bool
+    reason: Optional[str] = None
+
+
+# a rule scores a whole batch at once and returns one verdict per application
+LoanRule = Callable[[LoanBatch], Sequence[bool]]
+
+
+def balance_covers_amount(batch: LoanBatch) -> list[bool]:
+    """
+    The customer's total balance must cover the loan amount.
+    """
+    return [amount <= total for amount, total in zip(batch.amounts, batch.totals)]
+
+
+DEFAULT_RULES: tuple[LoanRule, ...] = (balance_covers_amount,)
+
+
+class LoanScorer:
+    """
+    Pluggable loan scoring pipeline.
+
+    Applications are turned into columns once, with each customer's total balance
+    read from the account backend's running totals, and every rule scores the whole batch in
+    a single pass. An application is approved if all rules approve it; otherwise
+    the reason is the name of the first rule that rejected it.
+
+    Async callers use `aevaluate`, which reads the totals through an `AccountStore`
+    so a backend that blocks (SQLite, shards) never runs on the event loop.
+    """
+
+    def __init__(self, ledger: AccountBackend, rules: Iterable[LoanRule] = DEFAULT_RULES):
+        self.ledger = ledger
+        self.rules = tuple(rules)
+
+    def evaluate(self, application: LoanApplication) -> LoanDecision:
+        return self.evaluate_many([application])[0]
+
+    def evaluate_many(self, applications: Sequence[LoanApplication]) -> list[LoanDecision]:
+        totals = {c: self.ledger.customer_total(c) for c in {a.customer_id for a in applications}}
+        return self.score(applications, totals)
+
+    async def aevaluate(self, application: LoanApplication, accounts: "AccountStore") -> LoanDecision:
+        return (await self.aevaluate_many([application], accounts))[0]
+
+    async def aevaluate_many(self, applications: Sequence[LoanApplication], accounts: "AccountStore") -> list[LoanDecision]:
+        totals = {c: await accounts.customer_total(c) for c in {a.customer_id for a in applications}}
+        return self.score(applications, totals)
+
+    def score(self, applications: Sequence[LoanApplication], totals: dict[str, float]) -> list[LoanDecision]:
+        """
+        Runs the rules over applications, given each customer's total balance.
+        """
+        batch = LoanBatch(
+            amounts=array("d", (a.loan_amount for a in applications)),
+            terms=array("l", (int(a.loan_term) for a in applications)),
+            totals=array("d", (totals[a.customer_id] for a in applications)),
+        )
+
+        decisions = [LoanDecision(True)] * len(applications)
+        for rule in self.rules:
+            for i, ok in enumerate(rule(batch)):
+                if not ok and decisions[i].approved:
+                    decisions[i] = LoanDecision(False, rule.__name__)
+        return decisions
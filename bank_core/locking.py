@@ -0,0 +1,174 @@
+# flake8: noqa: E501
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock
+from typing import Sequence
+
+ACQUIRE_TIMEOUT = 0.05  # seconds a lock-wait thread blocks before handing its thread back
+LOCK_WAIT_THREADS = 8
+
+
+class AccountLocks:
+    """
+    Fine-grained per-account locking.
+
+    Account numbers are hashed onto a fixed set of lock stripes, so memory does not
+    grow with the number of accounts. Locks for several accounts are always taken in
+    ascending stripe order, which rules out deadlocks between transfers going in
+    opposite directions.
+
+    The same locks guard sync and async callers: `hold` blocks the calling thread,
+    `ahold` waits for a contended lock on a small executor of its own, in bounded
+    slices, so the event loop keeps running and lock waits never take threads from
+    the default or tool executors. Never await while holding the locks, a sync
+    caller on the loop thread would block on them.
+    """
+
+    def __init__(self, stripes: int = 1024):
+        self._locks = [Lock() for _ in range(stripes)]
+        self._stripes = stripes
+
+    def _ordered(self, account_numbers: tuple[str, ...]) -> Sequence[Lock]:
+        # the hot paths lock one or two accounts: skip the set and sort for those
+        stripes = self._stripes
+        if len(account_numbers) == 1:
+            return (self._locks[hash(account_numbers[0]) % stripes],)
+        if len(account_numbers) == 2:
+            first, second = hash(account_numbers[0]) % stripes, hash(account_numbers[1]) % stripes
+            if first == second:
+                return (self._locks[first],)
+            return (self._locks[first], self._locks[second]) if first < second else (self._locks[second], self._locks[first])
+        return [self._locks[i] for i in sorted({hash(n) % stripes for n in account_numbers})]
+
+    @property
+    def stripes(self) -> list[Lock]:
+        """
+        The stripe locks, indexed by `stripe()`.
+        """
+        return self._locks
+
+    def stripe(self, account_number: str) -> int:
+        """
+        Returns the index of an account's stripe. Callers that cache it and lock
+        several stripes themselves must take them in ascending index order.
+        """
+        return hash(account_number) % self._stripes
+
+    def lock(self, account_number: str) -> Lock:
+        """
+        Returns the lock of one account, for `with` on single-account paths.
+        """
+        return self._locks[hash(account_number) % self._stripes]
+
+    def hold(self, *account_numbers: str):
+        """
+        Locks the given accounts for the duration of the `with` block.
+        """
+        locks = self._ordered(account_numbers)
+        # a single stripe lock is its own context manager
+        if len(locks) == 1:
+            return locks[0]
+        return _HeldPair(*locks) if len(locks) == 2 else _Held(locks)
+
+    @contextmanager
+    def hold_all(self):
+        """
+        Locks every account, e.g. to take a consistent snapshot.
+        """
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+    def ahold(self, *account_numbers: str):
+        """
+        Locks the given accounts for the duration of the `async with` block.
+        """
+        return _AsyncHeld(self._ordered(account_numbers))
+
+
+class _Held:
+    # several stripe locks as one context manager, taken in the given order
+    __slots__ = ("_locks",)
+
+    def __init__(self, locks):
+        self._locks = locks
+
+    def __enter__(self) -> None:
+        for lock in self._locks:
+            lock.acquire()
+
+    def __exit__(self, *exc_info) -> None:
+        for lock in reversed(self._locks):
+            lock.release()
+
+
+class _HeldPair:
+    # `_Held` unrolled for the two accounts of a transfer
+    __slots__ = ("_first", "_second")
+
+    def __init__(self, first: Lock, second: Lock):
+        self._first = first
+        self._second = second
+
+    def __enter__(self) -> None:
+        self._first.acquire()
+        self._second.acquire()
+
+    def __exit__(self, *exc_info) -> None:
+        self._second.release()
+        self._first.release()
+
+
+class _AsyncHeld:
+    # the same for `async with`: uncontended locks are taken without leaving the loop
+    __slots__ = ("_locks", "_acquired")
+
+    def __init__(self, locks):
+        self._locks = locks
+        self._acquired = 0
+
+    async def __aenter__(self) -> None:
+        try:
+            for lock in self._locks:
+                if not lock.acquire(blocking=False):
+                    await _acquire_in_thread(lock)
+                self._acquired += 1
+        except BaseException:
+            await self.__aexit__()
+            raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        for lock in reversed(self._locks[:self._acquired]):
+            lock.release()
+        self._acquired = 0
+
+
+@functools.cache
+def _lock_waiters() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=LOCK_WAIT_THREADS, thread_name_prefix="account-locks")
+
+
+def _release_if_acquired(lock: Lock, waiter: asyncio.Future) -> None:
+    if not waiter.cancelled() and waiter.exception() is None and waiter.result():
+        lock.release()
+
+
+async def _acquire_in_thread(lock: Lock) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        # a bounded wait: the thread is back in the pool within ACQUIRE_TIMEOUT, so
+        # more waiters than threads queue up instead of starving each other
+        waiter = loop.run_in_executor(_lock_waiters(), lock.acquire, True, ACQUIRE_TIMEOUT)
+        try:
+            if await asyncio.shield(waiter):
+                return
+        except asyncio.CancelledError:
+            # the thread may still get the lock, hand it straight back
+            waiter.add_done_callback(functools.partial(_release_if_acquired, lock))
+            raise
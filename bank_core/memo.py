@@ -0,0 +1,166 @@
+# flake8: noqa: E501
+import functools
+import inspect
+import json
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Iterable
+
+if TYPE_CHECKING:
+    from google.adk.tools import ToolContext
+
+# tags of the data a tool result depends on, from the call arguments and the tool context
+TagsFn = Callable[[dict, "ToolContext"], Iterable[str]]
+
+
+class ToolMemo:
+    """
+    Session-scoped memoization of read-only tool results.
+
+    Each cached result records the tags it depends on, e.g. "account:BG47CHAS6016",
+    and the clock value from before the call that produced it. `invalidate` stamps
+    tags with the current clock, from any session, and a cached result is served
+    only while none of its tags was stamped after it was produced. Checking a hit
+    never touches storage.
+
+    At most `max_tags` stamps are kept. Past that, the older half is forgotten and
+    results produced before the oldest forgotten stamp count as stale.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, max_entries: int = 64, max_tags: int = 100_000):
+        self.max_sessions = max_sessions
+        self.max_entries = max_entries
+        self.max_tags = max_tags
+        self._sessions: OrderedDict[str, OrderedDict] = OrderedDict()
+        self._invalidated: dict[str, int] = {}
+        self._floor = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, key: str):
+        """
+        Returns the cached result for a call, or raises KeyError.
+        """
+        with self._lock:
+            entries = self._sessions.get(session_id)
+            if entries is None:
+                raise KeyError(key)
+            value, tags, stamp = entries[key]
+            if stamp < self._floor or any(self._invalidated.get(tag, 0) > stamp for tag in tags):
+                del entries[key]
+                raise KeyError(key)
+            entries.move_to_end(key)
+            self._sessions.move_to_end(session_id)
+            return value
+
+    def stamp(self) -> int:
+        """
+        Returns the current clock value, to pass to `put` for a result computed from now on.
+        """
+        return self._clock
+
+    def put(self, session_id: str, key: str, value, tags: Iterable[str], stamp: int) -> None:
+        with self._lock:
+            if stamp < self._floor:
+                return
+            entries = self._sessions.get(session_id)
+            if entries is None:
+                entries = self._sessions[session_id] = OrderedDict()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            entries[key] = (value, tuple(tags), stamp)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """
+        Marks every cached result depending on one of the tags as stale, in all sessions.
+        """
+        with self._lock:
+            self._clock += 1
+            for tag in tags:
+                self._invalidated[tag] = self._clock
+            if len(self._invalidated) > self.max_tags:
+                self._prune()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._invalidated.clear()
+            self._floor = self._clock
+
+    def _prune(self) -> None:
+        # keeps the newest half of the stamps; a result produced at or after the
+        # new floor can't depend on a forgotten one, and older results are stale.
+        # The caller holds the lock
+        stamps = sorted(self._invalidated.values())
+        self._floor = stamps[len(stamps) - max(self.max_tags // 2, 1)]
+        self._invalidated = {tag: stamp for tag, stamp in self._invalidated.items() if stamp >= self._floor}
+
+    def memoized(self, tags: TagsFn) -> Callable[[Callable], Callable]:
+        """
+        Decorates a read-only tool to serve repeated calls within a session from the memo.
+        """
+        def decorator(tool: Callable) -> Callable:
+            name = tool.__name__
+
+            def key_of(arguments: dict) -> str:
+                return name + json.dumps(arguments, sort_keys=True, default=str)
+
+            async def call(arguments: dict, tool_context: "ToolContext"):
+                session_id = tool_context.session.id
+                key = key_of(arguments)
+                try:
+                    return self.get(session_id, key)
+                except KeyError:
+                    pass
+                stamp = self.stamp()
+                result = await _call(tool, arguments, tool_context)
+                self.put(session_id, key, result, tags(arguments, tool_context), stamp)
+                return result
+
+            return _with_tool_context(tool, call)
+        return decorator
+
+    def invalidates(self, tags: TagsFn) -> Callable[[Callable], Callable]:
+        """
+        Decorates a mutating tool to invalidate the tags it touches after every call.
+        """
+        def decorator(tool: Callable) -> Callable:
+            async def call(arguments: dict, tool_context: "ToolContext"):
+                try:
+                    return await _call(tool, arguments, tool_context)
+                finally:
+                    self.invalidate(tags(arguments, tool_context))
+
+            return _with_tool_context(tool, call)
+        return decorator
+
+
+async def _call(tool: Callable, arguments: dict, tool_context: "ToolContext"):
+    if "tool_context" in inspect.signature(tool).parameters:
+        arguments = {**arguments, "tool_context": tool_context}
+    result = tool(**arguments)
+    return await result if inspect.isawaitable(result) else result
+
+
+def _with_tool_context(tool: Callable, call: Callable) -> Callable:
+    # the wrapper is async and always receives the tool context; ADK reads the
+    # declared parameters from __signature__, which hides tool_context from the model
+    signature = inspect.signature(tool)
+
+    @functools.wraps(tool)
+    async def wrapper(*args, tool_context: "ToolContext", **kwargs):
+        bound = signature.bind_partial(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {k: v for k, v in bound.arguments.items() if k != "tool_context"}
+        return await call(arguments, tool_context)
+
+    declared = signature
+    if "tool_context" not in signature.parameters:
+        declared = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("tool_context", inspect.Parameter.KEYWORD_ONLY, annotation="ToolContext"),
+        ])
+    wrapper.__signature__ = declared
+    return wrapper
@@ -0,0 +1,259 @@
+# flake8: noqa: E501
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, rendered the Prometheus way (cumulative buckets).
+    """
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms keyed by metric name and labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._help: dict[str, str] = {}
+        self._sinks: list[Callable[[str, str, float, dict], None]] = []
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: dict, value: float = 1.0) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        for sink in self._sinks:
+            sink("counter", name, value, labels)
+
+    def observe(self, name: str, labels: dict, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+        for sink in self._sinks:
+            sink("histogram", name, value, labels)
+
+    def add_sink(self, sink: Callable[[str, str, float, dict], None]) -> None:
+        """
+        Forwards every observation to `sink(kind, name, value, labels)` as well.
+        """
+        self._sinks.append(sink)
+
+    def render(self) -> str:
+        """
+        Renders all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, h.buckets, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        typed = set()
+        for (name, labels), value in counters:
+            lines += self._type_lines(name, "counter", typed)
+            lines.append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), buckets, counts, total, count in histograms:
+            lines += self._type_lines(name, "histogram", typed)
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def _type_lines(self, name: str, kind: str, typed: set) -> list[str]:
+        if name in typed:
+            return []
+        typed.add(name)
+        lines = [f"# HELP {name} {self._help[name]}"] if name in self._help else []
+        return lines + [f"# TYPE {name} {kind}"]
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = MetricsRegistry()
+metrics.describe("bank_tool_duration_seconds", "Wall time of tool calls.")
+metrics.describe("bank_tool_calls_total", "Tool calls.")
+metrics.describe("bank_tool_errors_total", "Tool calls that raised.")
+metrics.describe("bank_tool_args_bytes", "JSON size of tool call arguments.")
+metrics.describe("bank_agent_duration_seconds", "Wall time of agent runs, including sub-agents.")
+metrics.describe("bank_agent_hops_total", "Control transfers between agents within one invocation.")
+
+
+def _args_size(args: tuple, kwargs: dict) -> int:
+    values = [a for a in args if not _is_tool_context(a)] + [v for k, v in kwargs.items() if k != "tool_context"]
+    return len(json.dumps(values, default=str))
+
+
+def _is_tool_context(value) -> bool:
+    return type(value).__name__ == "ToolContext"
+
+
+def instrument(tool: Callable) -> Callable:
+    """
+    Wraps a sync or async tool function to record its wall time, call and error
+    counts and argument size. The wrapper keeps the tool's name, docstring and
+    signature, so ADK declares it exactly like the original.
+    """
+    name = tool.__name__
+
+    def record(start: float, args: tuple, kwargs: dict, failed: bool) -> None:
+        labels = {"tool": name}
+        metrics.observe("bank_tool_duration_seconds", labels, time.perf_counter() - start)
+        metrics.observe("bank_tool_args_bytes", labels, _args_size(args, kwargs), SIZE_BUCKETS)
+        metrics.inc("bank_tool_calls_total", labels)
+        if failed:
+            metrics.inc("bank_tool_errors_total", labels)
+
+    if inspect.iscoroutinefunction(tool):
+        @functools.wraps(tool)
+        async def wrapper(*args, **kwargs):
+            start, failed = time.perf_counter(), True
+            try:
+                result = await tool(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(start, args, kwargs, failed)
+    else:
+        @functools.wraps(tool)
+        def wrapper(*args, **kwargs):
+            start, failed = time.perf_counter(), True
+            try:
+                result = tool(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                record(start, args, kwargs, failed)
+    return wrapper
+
+
+class AgentTracker:
+    """
+    ADK agent callbacks that time every agent run and count delegation hops,
+    e.g. bank_agent -> goodbye_agent, per invocation.
+    """
+
+    def __init__(self, max_invocations: int = 10_000):
+        self.max_invocations = max_invocations
+        self._last_agent: OrderedDict[str, str] = OrderedDict()
+        self._started: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def before_agent(self, callback_context) -> None:
+        invocation_id, agent = callback_context.invocation_id, callback_context.agent_name
+        with self._lock:
+            previous = self._last_agent.get(invocation_id)
+            self._last_agent[invocation_id] = agent
+            self._last_agent.move_to_end(invocation_id)
+            while len(self._last_agent) > self.max_invocations:
+                stale, _ = self._last_agent.popitem(last=False)
+                for key in [k for k in self._started if k[0] == stale]:
+                    del self._started[key]
+            self._started[(invocation_id, agent)] = time.perf_counter()
+        if previous is not None and previous != agent:
+            metrics.inc("bank_agent_hops_total", {"from": previous, "to": agent})
+        return None
+
+    def after_agent(self, callback_context) -> None:
+        with self._lock:
+            start = self._started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+        if start is not None:
+            metrics.observe("bank_agent_duration_seconds", {"agent": callback_context.agent_name}, time.perf_counter() - start)
+        return None
+
+
+agent_tracker = AgentTracker()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves the metrics at http://<host>:<port>/metrics from a daemon thread.
+
+    Only local clients can connect by default; pass e.g. host="0.0.0.0" to let a
+    scraper on another machine in.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def enable_opentelemetry(endpoint: Optional[str] = None, export_interval: float = 10.0) -> None:
+    """
+    Mirrors all metrics to OpenTelemetry and exports them over OTLP/gRPC, e.g. to a
+    local collector. Needs the `otel` extra: pip install bank-agent[otel]
+    """
+    try:
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    except ImportError as e:
+        raise ImportError("OpenTelemetry export needs the 'otel' extra: pip install bank-agent[otel]") from e
+
+    reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=endpoint), export_interval_millis=export_interval * 1000)
+    meter = MeterProvider(metric_readers=[reader]).get_meter("bank_agent")
+    instruments = {}
+
+    def sink(kind: str, name: str, value: float, labels: dict) -> None:
+        instrument_ = instruments.get(name)
+        if instrument_ is None:
+            create = meter.create_counter if kind == "counter" else meter.create_histogram
+            instrument_ = instruments[name] = create(name, description=metrics._help.get(name, ""))
+        if kind == "counter":
+            instrument_.add(value, labels)
+        else:
+            instrument_.record(value, labels)
+
+    metrics.add_sink(sink)
@@ -0,0 +1,462 @@
+# flake8: noqa: E501
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Iterator, Optional
+
+from .history import ENTRY, TransactionHistory
+from .ledger import ABORT, ADJUST, COMMIT, COMMITTED, DEPOSIT, OPEN, OPEN_CURRENCY, PREPARE, PREPARED, TRANSFER, WITHDRAW, Ledger
+
+SNAPSHOT_MAGIC = b"BNKSNAP3"
+SNAPSHOT_MAGIC_V2 = b"BNKSNAP2"  # without the transaction history
+SNAPSHOT_MAGIC_V1 = b"BNKSNAP1"  # without currencies: every account is in EUR
+SNAPSHOT_FILE = "snapshot.bin"
+LOCK_FILE = "LOCK"
+
+_SNAPSHOT_HEADER = struct.Struct("<8sQQQ")  # magic, first wal segment to replay, accounts, names size
+_HISTORY_HEADER = struct.Struct("<QQ")  # history entries, history account names size
+# history columns as stored in a snapshot, after the header
+_HISTORY_COLUMNS = ("d", "i", "q", "i", "b")  # time, account id, amount, counterparty id, kind
+_RECORD_HEADER = struct.Struct("<BI")  # record type, payload size
+_CRC = struct.Struct("<I")
+_SLOT_AMOUNT = struct.Struct("<Iq")
+_TRANSFER = struct.Struct("<IIq")
+_AMOUNT = struct.Struct("<q")
+_AMOUNT_CURRENCY = struct.Struct("<qB")
+_PREPARE = struct.Struct("<iB")  # decider, txid size; followed by the txid and the slot deltas
+_ENTRY = struct.Struct("<dqbBB")  # time, amount, kind, account and counterparty size; followed by both
+
+
+def encode_record(op: int, fields: tuple) -> bytes:
+    """
+    Encodes a ledger journal record as header, payload and CRC32 checksum.
+    """
+    if op == OPEN:
+        account_number, minor = fields
+        payload = _AMOUNT.pack(minor) + account_number.encode()
+    elif op == OPEN_CURRENCY:
+        account_number, minor, currency = fields
+        payload = _AMOUNT_CURRENCY.pack(minor, currency) + account_number.encode()
+    elif op in (DEPOSIT, WITHDRAW):
+        payload = _SLOT_AMOUNT.pack(*fields)
+    elif op == TRANSFER:
+        payload = _TRANSFER.pack(*fields)
+    elif op == ADJUST:
+        payload = b"".join(_SLOT_AMOUNT.pack(slot, delta) for slot, delta in fields)
+    elif op in (PREPARE, PREPARED):
+        txid, decider, deltas = fields
+        txid = txid.encode()
+        payload = _PREPARE.pack(decider, len(txid)) + txid + b"".join(_SLOT_AMOUNT.pack(slot, delta) for slot, delta in deltas)
+    elif op in (COMMIT, ABORT, COMMITTED):
+        payload = fields[0].encode()
+    elif op == ENTRY:
+        at, account_number, minor, kind, counterparty = fields
+        account_number, counterparty = account_number.encode(), (counterparty or "").encode()
+        payload = _ENTRY.pack(at, minor, kind, len(account_number), len(counterparty)) + account_number + counterparty
+    else:
+        raise ValueError(f"Unknown journal record type: {op}")
+
+    record = _RECORD_HEADER.pack(op, len(payload)) + payload
+    return record + _CRC.pack(zlib.crc32(record))
+
+
+def decode_record(op: int, payload: bytes) -> tuple:
+    if op == OPEN:
+        return payload[_AMOUNT.size:].decode(), _AMOUNT.unpack_from(payload)[0]
+    if op == OPEN_CURRENCY:
+        return (payload[_AMOUNT_CURRENCY.size:].decode(), *_AMOUNT_CURRENCY.unpack_from(payload))
+    if op in (DEPOSIT, WITHDRAW):
+        return _SLOT_AMOUNT.unpack(payload)
+    if op == TRANSFER:
+        return _TRANSFER.unpack(payload)
+    if op == ADJUST:
+        return tuple(_SLOT_AMOUNT.iter_unpack(payload))
+    if op in (PREPARE, PREPARED):
+        decider, size = _PREPARE.unpack_from(payload)
+        end = _PREPARE.size + size
+        return payload[_PREPARE.size:end].decode(), decider, tuple(_SLOT_AMOUNT.iter_unpack(payload[end:]))
+    if op in (COMMIT, ABORT, COMMITTED):
+        return (payload.decode(),)
+    if op == ENTRY:
+        at, minor, kind, account_size, counterparty_size = _ENTRY.unpack_from(payload)
+        account_end = _ENTRY.size + account_size
+        counterparty = payload[account_end:account_end + counterparty_size].decode()
+        return at, payload[_ENTRY.size:account_end].decode(), minor, kind, counterparty or None
+    raise ValueError(f"Unknown journal record type: {op}")
+
+
+def read_records(path: Path) -> Iterator[tuple[int, tuple, int]]:
+    """
+    Reads the records of a log file, each with the offset just past it.
+
+    Reading stops at the first torn or corrupt record, which can only be the tail
+    of a file that was being written when the process died.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        op, size = _RECORD_HEADER.unpack_from(data, offset)
+        end = offset + _RECORD_HEADER.size + size
+        if end + _CRC.size > len(data) or _CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end]):
+            break
+        offset = end + _CRC.size
+        yield op, decode_record(op, data[end - size:end]), offset
+
+
+def replay_segment(path: Path, ledger: Ledger, history: Optional[TransactionHistory] = None) -> int:
+    """
+    Re-applies the records of one write-ahead log segment to the ledger, and its
+    history entries to `history`.
+
+    Returns:
+        int: The number of records applied.
+    """
+    applied = 0
+    for op, fields, _ in read_records(path):
+        if op == ENTRY:
+            if history is not None:
+                history.redo(*fields)
+        else:
+            ledger.redo(op, fields)
+        applied += 1
+    return applied
+
+
+def write_snapshot(path: Path, numbers: list[str], balances: array, currencies: array, segment: int, history: Optional[tuple] = None) -> None:
+    """
+    Writes a compact binary snapshot: a header, the raw balance array, the raw
+    currency id array and the newline-separated account numbers, then the columns
+    of `TransactionHistory.snapshot` the same way. The file is replaced atomically.
+    """
+    history_numbers, *columns = history if history is not None else ([], *(array(code) for code in _HISTORY_COLUMNS))
+    if sys.byteorder != "little":
+        balances = array("q", balances)
+        balances.byteswap()
+        columns = [array(column.typecode, column) for column in columns]
+        for column in columns:
+            column.byteswap()
+    names = "\n".join(numbers).encode()
+    history_names = "\n".join(history_numbers).encode()
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, segment, len(balances), len(names)))
+        f.write(balances.tobytes())
+        f.write(currencies.tobytes())
+        f.write(names)
+        f.write(_HISTORY_HEADER.pack(len(columns[0]), len(history_names)))
+        for column in columns:
+            f.write(column.tobytes())
+        f.write(history_names)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+def load_snapshot(path: Path) -> tuple[list[str], array, array, int, TransactionHistory]:
+    """
+    Loads a snapshot through a memory map.
+
+    Returns:
+        tuple: Account numbers, minor-unit balances, currency ids, the first WAL
+        segment to replay and the transaction history (empty for older snapshots).
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        magic, segment, count, names_size = _SNAPSHOT_HEADER.unpack_from(mm, 0)
+        if magic not in (SNAPSHOT_MAGIC, SNAPSHOT_MAGIC_V2, SNAPSHOT_MAGIC_V1):
+            raise ValueError(f"{path} is not a ledger snapshot")
+
+        offset = _SNAPSHOT_HEADER.size
+        balances = array("q")
+        balances.frombytes(mm[offset:offset + count * balances.itemsize])
+        offset += count * balances.itemsize
+        currencies = array("B")
+        if magic != SNAPSHOT_MAGIC_V1:
+            currencies.frombytes(mm[offset:offset + count])
+            offset += count
+        else:
+            currencies.frombytes(bytes(count))
+        numbers = mm[offset:offset + names_size].decode().split("\n") if count else []
+        offset += names_size
+
+        columns = [array(code) for code in _HISTORY_COLUMNS]
+        history_numbers = []
+        if magic == SNAPSHOT_MAGIC:
+            entries, history_names_size = _HISTORY_HEADER.unpack_from(mm, offset)
+            offset += _HISTORY_HEADER.size
+            for column in columns:
+                column.frombytes(mm[offset:offset + entries * column.itemsize])
+                offset += entries * column.itemsize
+            history_numbers = mm[offset:offset + history_names_size].decode().split("\n") if history_names_size else []
+
+    if sys.byteorder != "little":
+        balances.byteswap()
+        for column in columns:
+            column.byteswap()
+    return numbers, balances, currencies, segment, TransactionHistory.restore(history_numbers, *columns)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of ledger mutations with group commit.
+
+    `append` only copies the encoded record into a buffer. A background thread
+    wakes up on the first pending record, waits `group_commit_interval` seconds for
+    more to arrive, then writes and fsyncs them all at once. Writers that need
+    durability block in `wait` until their record has been flushed.
+    """
+
+    def __init__(self, path: Path, group_commit_interval: float = 0.002):
+        self.group_commit_interval = group_commit_interval
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._buffer = bytearray()
+        self._appended = 0
+        self._durable = 0
+        self._closed = False
+        self._file = open(path, "ab")
+        self._flusher = threading.Thread(target=self._run, name="wal-flusher", daemon=True)
+        self._flusher.start()
+
+    def append(self, op: int, fields: tuple) -> int:
+        record = encode_record(op, fields)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Write-ahead log is closed")
+            self._buffer += record
+            self._appended += 1
+            self._cond.notify_all()
+            return self._appended
+
+    def is_durable(self, seq: int) -> bool:
+        return seq <= self._durable
+
+    def wait(self, seq: int) -> None:
+        with self._cond:
+            while self._durable < seq:
+                self._cond.wait()
+
+    def flush(self) -> None:
+        """
+        Writes and fsyncs everything appended so far.
+        """
+        with self._flush_lock:
+            with self._cond:
+                data, self._buffer = self._buffer, bytearray()
+                seq = self._appended
+            if data:
+                self._file.write(data)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            with self._cond:
+                self._durable = max(self._durable, seq)
+                self._cond.notify_all()
+
+    def rotate(self, path: Path) -> int:
+        """
+        Flushes the current segment and continues writing to a new one.
+
+        Returns:
+            int: The sequence number of the last record in the old segment.
+        """
+        self.flush()
+        with self._flush_lock:
+            self._file.close()
+            self._file = open(path, "ab")
+            _fsync_dir(path.parent)
+            return self._durable
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self.flush()
+        self._file.close()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            time.sleep(self.group_commit_interval)
+            self.flush()
+
+
+class DataDirLocked(RuntimeError):
+    """
+    Another process has the ledger directory open.
+    """
+
+
+def lock_directory(directory: Path) -> int:
+    """
+    Takes an exclusive lock on `LOCK_FILE` in a directory, without waiting.
+
+    The lock is held for as long as the returned descriptor is open and goes away
+    with the process, so a crashed owner never leaves a stale lock behind.
+
+    Raises:
+        DataDirLocked: The lock is held by another process.
+    """
+    fd = os.open(directory / LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError as e:
+        os.close(fd)
+        raise DataDirLocked(f"{directory} is in use by another process; give every ledger process its own data directory, or share balances through the sqlite or sharded backend") from e
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()}\n".encode())
+    return fd
+
+
+class LedgerPersistence:
+    """
+    Durable storage for a `Ledger` in a directory of WAL segments and one snapshot.
+
+    On `open` the snapshot is loaded and the segments written after it are replayed.
+    While running, every `snapshot_every` records a background thread writes a new
+    snapshot and drops the segments it covers, which keeps restarts short.
+
+    The ledger gets a `TransactionHistory` that journals its entries into the same
+    segments, right after the mutations they describe, and is snapshotted with the
+    balances, so a restart never has a balance change without its statement entry.
+
+    Only one process at a time may have a directory open: `open` locks it and
+    raises `DataDirLocked` if another process holds the lock.
+    """
+
+    def __init__(self, directory: str, snapshot_every: int = 100_000, group_commit_interval: float = 0.002):
+        self.directory = Path(directory)
+        self.snapshot_every = snapshot_every
+        self.group_commit_interval = group_commit_interval
+        self.ledger: Optional[Ledger] = None
+        self._wal: Optional[WriteAheadLog] = None
+        self._segment = 0
+        self._snapshot_seq = 0  # WAL sequence number the current segment starts after
+        self._snapshot_due = threading.Event()
+        self._snapshotter: Optional[threading.Thread] = None
+        self._snapshot_lock = threading.Lock()
+        self._closed = False
+        self._lock_fd: Optional[int] = None
+
+    def open(self) -> Ledger:
+        """
+        Recovers the ledger from disk and starts journaling into a fresh segment.
+
+        Raises:
+            DataDirLocked: Another process has the directory open.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._lock_fd is None:
+            self._lock_fd = lock_directory(self.directory)
+        snapshot = self.directory / SNAPSHOT_FILE
+        if snapshot.exists():
+            numbers, balances, currencies, first_segment, history = load_snapshot(snapshot)
+            ledger = Ledger.restore(numbers, balances, currencies)
+        else:
+            ledger, first_segment, history = Ledger(), 0, TransactionHistory()
+
+        segments = self._segments()
+        for segment in segments:
+            if segment >= first_segment:
+                replay_segment(self._segment_path(segment), ledger, history)
+
+        self._segment = max(segments, default=first_segment) + 1
+        self._wal = WriteAheadLog(self._segment_path(self._segment), self.group_commit_interval)
+        ledger.journal = history.journal = self
+        # attached after the replay, which must not record the entries a second time
+        ledger.history = history
+        self.ledger = ledger
+        self._snapshotter = threading.Thread(target=self._run, name="ledger-snapshots", daemon=True)
+        self._snapshotter.start()
+        return ledger
+
+    def append(self, op: int, fields: tuple) -> int:
+        seq = self._wal.append(op, fields)
+        if seq - self._snapshot_seq >= self.snapshot_every:
+            self._snapshot_due.set()
+        return seq
+
+    def wait(self, seq: int) -> None:
+        self._wal.wait(seq)
+
+    def is_durable(self, seq: int) -> bool:
+        return self._wal.is_durable(seq)
+
+    def snapshot(self) -> None:
+        """
+        Writes a snapshot of the ledger and removes the WAL segments it replaces.
+        """
+        with self._snapshot_lock:
+            numbers, balances, currencies, (segment, entries) = self.ledger.snapshot(on_freeze=self._rotate)
+            # history is append-only: its first `entries` rows are exactly the ones the old segments hold
+            history = self.ledger.history.snapshot(entries) if self.ledger.history is not None else None
+            write_snapshot(self.directory / SNAPSHOT_FILE, numbers, balances, currencies, segment, history)
+            # the open transactions carried over by _rotate must be durable before their PREPARE records go
+            self._wal.flush()
+            for old in self._segments():
+                if old < segment:
+                    self._segment_path(old).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self._closed = True
+        self._snapshot_due.set()
+        if self._snapshotter is not None:
+            # a snapshot in progress finishes before its WAL closes and the directory is unlocked
+            self._snapshotter.join()
+            self._snapshotter = None
+        if self._wal is not None:
+            self._wal.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _rotate(self) -> tuple[int, int]:
+        # runs with the ledger frozen: the new segment starts exactly at the snapshot,
+        # followed by the two-phase commit state the snapshot's balances don't hold
+        self._segment += 1
+        self._snapshot_seq = self._wal.rotate(self._segment_path(self._segment))
+        for op, fields in self.ledger.pending():
+            self._wal.append(op, fields)
+        return self._segment, len(self.ledger.history) if self.ledger.history is not None else 0
+
+    def _run(self) -> None:
+        while True:
+            self._snapshot_due.wait()
+            self._snapshot_due.clear()
+            if self._closed:
+                return
+            self.snapshot()
+
+    def _segments(self) -> list[int]:
+        return sorted(int(p.stem.split("-")[1]) for p in self.directory.glob("wal-*.log"))
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"wal-{segment:08d}.log"
+
+
+def _fsync_dir(directory: Path) -> None:
+    if os.name == "nt":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
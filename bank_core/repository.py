@@ -0,0 +1,280 @@
+# flake8: noqa: E501
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from typing import Callable, Optional, Protocol
+
+from .utils import Customer
+
+DEMO_CUSTOMERS = [
+    {
+        "customer_id": "123",
+        "customer_first_name": "Demir",
+        "customer_last_name": "Tonchev",
+        "customer_accounts": ['BG47CHAS6016', 'BG68RZBB1337', 'BG90CHAS0840'],
+        "credit_cards": [{
+            "type": "Visa",
+            "name": "Demir Tonchev",
+            "number": "4716351256837430",
+            "cvv": "486",
+            "expiry": "06/27",
+            "limit": 10_000,
+        },
+            {
+            "type": "Mastercard",
+            "name": "Demir Tonchev",
+            "number": "4716351256837430",
+            "cvv": "123",
+            "expiry": "03/28",
+            "limit": 1000
+        }]
+    },
+]
+
+# opening balances and currencies of the demo customer's accounts
+DEMO_ACCOUNTS = {"BG47CHAS6016": (100, "EUR"), "BG68RZBB1337": (100_000, "EUR"), "BG90CHAS0840": (2_500, "USD")}
+
+
+class CustomerBackend(Protocol):
+    """
+    Storage behind a `CustomerRepository`.
+    """
+
+    def load(self, customer_id: str) -> Optional[dict]:
+        """Returns the raw customer record, or None if there is no such customer."""
+
+    def save(self, record: dict) -> None:
+        """Inserts or replaces a customer record."""
+
+    def find_by_account(self, account_number: str) -> Optional[str]:
+        """Returns the ID of the customer owning an account."""
+
+    def find_by_card(self, card_number: str) -> Optional[str]:
+        """Returns the ID of the customer holding a card."""
+
+
+class SQLiteCustomerBackend:
+    """
+    Customer storage in SQLite, a stand-in for the bank's customer database.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS customers (customer_id TEXT PRIMARY KEY, record TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS customer_accounts (account_number TEXT PRIMARY KEY, customer_id TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS customer_cards (card_number TEXT NOT NULL, customer_id TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS customer_cards_number ON customer_cards (card_number);
+            """)
+
+    @classmethod
+    def demo(cls) -> "SQLiteCustomerBackend":
+        backend = cls()
+        for record in DEMO_CUSTOMERS:
+            backend.save(record)
+        return backend
+
+    def load(self, customer_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, record: dict) -> None:
+        customer_id = record["customer_id"]
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO customers VALUES (?, ?)", (customer_id, json.dumps(record)))
+            self._conn.execute("DELETE FROM customer_accounts WHERE customer_id = ?", (customer_id,))
+            self._conn.execute("DELETE FROM customer_cards WHERE customer_id = ?", (customer_id,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO customer_accounts VALUES (?, ?)",
+                [(n, customer_id) for n in record["customer_accounts"]],
+            )
+            self._conn.executemany(
+                "INSERT INTO customer_cards VALUES (?, ?)",
+                [(c["number"], customer_id) for c in record["credit_cards"] if "number" in c],
+            )
+
+    def find_by_account(self, account_number: str) -> Optional[str]:
+        return self._find("SELECT customer_id FROM customer_accounts WHERE account_number = ?", account_number)
+
+    def find_by_card(self, card_number: str) -> Optional[str]:
+        return self._find("SELECT customer_id FROM customer_cards WHERE card_number = ?", card_number)
+
+    def _find(self, query: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(query, (key,)).fetchone()
+        return row[0] if row else None
+
+
+@dataclass(frozen=True)
+class CustomerProfile:
+    """
+    Serialized views of one version of a customer record: the full record and the
+    compact projection sent to the model. Shared between callers, so the dicts
+    must be treated as read-only.
+    """
+    version: int
+    data: dict
+    json: bytes
+    compact: dict
+    compact_json: bytes
+
+
+class _Entry:
+    __slots__ = ("customer", "expires", "version", "profile")
+
+    def __init__(self, customer: Customer, expires: float, version: int):
+        self.customer = customer
+        self.expires = expires
+        self.version = version
+        self.profile: Optional[CustomerProfile] = None
+
+
+class CustomerRepository:
+    """
+    Validated `Customer` objects served from an LRU cache with a time-to-live.
+
+    Customers are validated once when loaded from the backend. Account number and
+    card number indexes are kept next to the cache, so repeated lookups by either
+    key are dict hits. Call `invalidate` (or use `save`) whenever a record changes
+    outside of the repository.
+
+    Every load gets a new version number, and `profile` serializes each version
+    only once, so repeated profile fetches don't re-run `model_dump`.
+    """
+
+    def __init__(self, backend: CustomerBackend, maxsize: int = 1024, ttl: float = 300.0):
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache: OrderedDict[str, _Entry] = OrderedDict()
+        self._versions = count(1)
+        self._by_account: dict[str, str] = {}
+        self._by_card: dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._listeners: list[Callable[[Optional[str]], None]] = []
+
+    def get(self, customer_id: str) -> Optional[Customer]:
+        """
+        Returns a customer by ID, or None if there is no such customer.
+        """
+        entry = self._entry(customer_id)
+        return entry.customer if entry else None
+
+    def cached(self, customer_id: str) -> Optional[Customer]:
+        """
+        Returns a customer only if it is in the cache and fresh, never touching the backend.
+        """
+        entry = self._cache.get(customer_id)
+        return entry.customer if entry is not None and entry.expires > time.monotonic() else None
+
+    def profile(self, customer_id: str) -> Optional[CustomerProfile]:
+        """
+        Returns the serialized views of a customer, or None if there is no such customer.
+        """
+        entry = self._entry(customer_id)
+        if entry is None:
+            return None
+        profile = entry.profile
+        if profile is None:
+            data = entry.customer.model_dump()
+            compact = entry.customer.compact_dump()
+            profile = CustomerProfile(
+                version=entry.version,
+                data=data,
+                json=json.dumps(data, separators=(",", ":")).encode(),
+                compact=compact,
+                compact_json=json.dumps(compact, separators=(",", ":")).encode(),
+            )
+            entry.profile = profile
+        return profile
+
+    def _entry(self, customer_id: str) -> Optional[_Entry]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(customer_id)
+            if entry is not None and entry.expires > now:
+                self._cache.move_to_end(customer_id)
+                return entry
+
+        record = self.backend.load(customer_id)
+        if record is None:
+            return None
+        return self._put(Customer.model_validate(record), now)
+
+    def by_account(self, account_number: str) -> Optional[Customer]:
+        """
+        Returns the customer owning an account.
+        """
+        customer_id = self._by_account.get(account_number) or self.backend.find_by_account(account_number)
+        return self.get(customer_id) if customer_id else None
+
+    def by_card(self, card_number: str) -> Optional[Customer]:
+        """
+        Returns the customer holding a credit card.
+        """
+        customer_id = self._by_card.get(card_number) or self.backend.find_by_card(card_number)
+        return self.get(customer_id) if customer_id else None
+
+    def save(self, customer: Customer) -> None:
+        """
+        Writes a customer through to the backend and drops the cached copy.
+        """
+        self.backend.save(customer.model_dump())
+        self.invalidate(customer.customer_id)
+
+    def subscribe(self, listener: Callable[[Optional[str]], None]) -> None:
+        """
+        Calls `listener(customer_id)` on every invalidation, with None for "everything".
+        """
+        self._listeners.append(listener)
+
+    def invalidate(self, customer_id: Optional[str] = None) -> None:
+        """
+        Drops one customer, or everything, from the cache and the indexes.
+        """
+        with self._lock:
+            if customer_id is None:
+                self._cache.clear()
+                self._by_account.clear()
+                self._by_card.clear()
+            else:
+                entry = self._cache.pop(customer_id, None)
+                if entry is not None:
+                    self._unindex(entry.customer)
+        for listener in self._listeners:
+            listener(customer_id)
+
+    def _put(self, customer: Customer, now: float) -> _Entry:
+        with self._lock:
+            old = self._cache.pop(customer.customer_id, None)
+            if old is not None:
+                self._unindex(old.customer)
+            entry = _Entry(customer, now + self.ttl, next(self._versions))
+            self._cache[customer.customer_id] = entry
+            for account_number in customer.customer_accounts:
+                self._by_account[account_number] = customer.customer_id
+            for card in customer.credit_cards:
+                if "number" in card:
+                    self._by_card[card["number"]] = customer.customer_id
+            while len(self._cache) > self.maxsize:
+                _, evicted = self._cache.popitem(last=False)
+                self._unindex(evicted.customer)
+            return entry
+
+    def _unindex(self, customer: Customer) -> None:
+        for account_number in customer.customer_accounts:
+            if self._by_account.get(account_number) == customer.customer_id:
+                del self._by_account[account_number]
+        for card in customer.credit_cards:
+            if self._by_card.get(card.get("number")) == customer.customer_id:
+                del self._by_card[card["number"]]
+
+
+customers = CustomerRepository(SQLiteCustomerBackend.demo())
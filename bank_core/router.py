@@ -0,0 +1,87 @@
+# flake8: noqa: E501
+"""
+Rule-based fast path in front of the model.
+
+Farewells and angry outbursts get a fixed reply from a tool, but going through
+the model costs a delegation call and a tool call before that reply arrives.
+`FastPathRouter` answers such turns itself when a short user message is fully
+explained by one intent's keywords, and leaves everything else to the model.
+"""
+import logging
+import re
+from typing import Callable, Iterable, NamedTuple, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("bank_router_turns_total", "User turns seen by the fast-path router, by route (an intent, or llm).")
+
+GOODBYE = r"bye|goodbye|bye bye|cya|see (?:you|ya)(?: later| soon)?|farewell|take care|have a (?:good|nice|great) (?:day|one|evening|weekend)|good ?night|that's all|thats all|i'm done|im done"
+ANGRY = r"angry|furious|mad|pissed(?: off)?|annoyed|upset|ridiculous|outrageous|unacceptable|terrible|awful|useless|worst|disgusting|pathetic|wtf|hate (?:you|this)"
+
+# words that don't change the meaning of a short farewell or complaint
+FILLER = frozenset("""
+    ok okay so well then now this that it is it's that's thats all for today thanks thank thx you
+    your very much i i'm im am are really just please the service bank so oh and
+""".split())
+
+WORD = re.compile(r"[a-z']+")
+
+
+class Intent(NamedTuple):
+    name: str
+    pattern: str  # alternatives of a regular expression, matched on whole words
+    reply: Callable[[], str]
+
+
+class FastPathRouter:
+    """
+    ADK before-model callback that answers trivial turns without calling the model.
+
+    A turn is routed when the newest content is the user's text, it has at most
+    `max_words` words, exactly one intent matches, and the share of words that are
+    either part of the match or filler is at least `min_confidence`. Anything
+    else, including every call after a tool response, goes to the model.
+    """
+
+    def __init__(self, intents: Iterable[Intent], min_confidence: float = 0.75, max_words: int = 12):
+        self.intents = [(intent, re.compile(rf"\b(?:{intent.pattern})\b")) for intent in intents]
+        self.min_confidence = min_confidence
+        self.max_words = max_words
+
+    def route(self, text: str) -> Optional[Intent]:
+        """
+        Returns the intent a user message is confidently about, or None.
+        """
+        text = text.lower().replace("’", "'")
+        words = WORD.findall(text)
+        if not words or len(words) > self.max_words:
+            return None
+
+        matched = [(intent, pattern) for intent, pattern in self.intents if pattern.search(text)]
+        if len(matched) != 1:
+            return None
+        intent, pattern = matched[0]
+
+        unexplained = [w for w in WORD.findall(pattern.sub(" ", text)) if w not in FILLER]
+        if 1 - len(unexplained) / len(words) < self.min_confidence:
+            return None
+        return intent
+
+    def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        last = llm_request.contents[-1] if llm_request.contents else None
+        if last is None or last.role != "user" or any(p.function_response for p in last.parts or []):
+            return None
+
+        intent = self.route(" ".join(p.text for p in last.parts or [] if p.text))
+        metrics.inc("bank_router_turns_total", {"agent": callback_context.agent_name, "route": intent.name if intent else "llm"})
+        if intent is None:
+            return None
+
+        logger.debug("Answered a %s turn without the model", intent.name)
+        return LlmResponse(content=types.Content(role="model", parts=[types.Part.from_text(text=intent.reply())]))
@@ -0,0 +1,287 @@
+# flake8: noqa: E501
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from itertools import count
+from pathlib import Path
+from threading import Lock
+from typing import Iterable, NamedTuple, Optional
+
+OPENING_HOUR = 9
+CLOSING_HOUR = 17
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = (CLOSING_HOUR - OPENING_HOUR) * 60 // SLOT_MINUTES
+WORKDAYS = 5  # Monday to Friday
+MAX_QUERY_DAYS = 31
+CALENDAR_FILE = "appointments.db"
+
+SLOT_TIMES = [f"{OPENING_HOUR + i * SLOT_MINUTES // 60:02d}:{i * SLOT_MINUTES % 60:02d}" for i in range(SLOTS_PER_DAY)]
+SLOT_INDEX = {t: i for i, t in enumerate(SLOT_TIMES)}
+
+
+class Representative(NamedTuple):
+    representative_id: str
+    name: str
+    branch: str
+
+
+DEMO_REPRESENTATIVES = [
+    Representative("R001", "Maria Ivanova", "Sofia Central"),
+    Representative("R002", "Georgi Petrov", "Sofia Central"),
+    Representative("R003", "Elena Dimitrova", "Sofia Central"),
+    Representative("R004", "Nikolay Stoyanov", "Plovdiv"),
+    Representative("R005", "Ivana Georgieva", "Plovdiv"),
+    Representative("R006", "Stefan Kolev", "Varna"),
+]
+
+
+@dataclass(frozen=True)
+class Appointment:
+    appointment_id: str
+    customer_id: str
+    representative: Representative
+    start: datetime
+    service: str
+
+    @property
+    def compact(self) -> dict:
+        return {
+            "appointment_id": self.appointment_id,
+            "date": self.start.date().isoformat(),
+            "time": self.start.strftime("%H:%M"),
+            "duration_minutes": SLOT_MINUTES,
+            "branch": self.representative.branch,
+            "representative": self.representative.name,
+            "service": self.service,
+        }
+
+
+class SlotCalendar:
+    """
+    Appointment slots of all representatives as bitsets.
+
+    Every day has `SLOTS_PER_DAY` slots, and every slot one integer whose bit `r` is
+    set while representative `r` is free then. Branches and single representatives
+    are masks over the same bits, so "is anyone at this branch free at 10:30" is one
+    AND, however many representatives there are, and a query over a date range is
+    one AND per slot.
+
+    Days nobody booked yet are not stored: they read as all representatives free on
+    workdays and closed at weekends. Booking takes the lock and clears one bit.
+
+    With a `path` the appointments are also kept in an SQLite table with one row
+    per representative and slot, so several processes can share the calendar: a
+    booking is an INSERT that fails if another process took the slot first, and
+    the bitsets are rebuilt from the table whenever another process changed it.
+    """
+
+    def __init__(self, representatives: Iterable[Representative] = (), path: Optional[str] = None):
+        self._representatives: list[Representative] = []
+        self._bits: dict[str, int] = {}
+        self._branches: dict[str, int] = {}
+        self._everyone = 0
+        self._days: dict[int, list[int]] = {}  # date ordinal -> free mask per slot
+        self._appointments: dict[str, Appointment] = {}
+        self._ids = count(1)
+        self._lock = Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._version = None
+        for representative in representatives:
+            self.add_representative(representative)
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+            self._db.executescript("""
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS appointments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id TEXT NOT NULL, representative_id TEXT NOT NULL,
+                    day INTEGER NOT NULL, slot INTEGER NOT NULL, service TEXT NOT NULL, UNIQUE (representative_id, day, slot));
+            """)
+            with self._lock:
+                self._sync()
+
+    @classmethod
+    def demo(cls, path: Optional[str] = None) -> "SlotCalendar":
+        return cls(DEMO_REPRESENTATIVES, path)
+
+    @property
+    def branches(self) -> list[str]:
+        return list(self._branches)
+
+    def add_representative(self, representative: Representative) -> None:
+        with self._lock:
+            if representative.representative_id in self._bits:
+                raise ValueError(f"Representative {representative.representative_id} already exists")
+            bit = 1 << len(self._representatives)
+            self._bits[representative.representative_id] = len(self._representatives)
+            self._representatives.append(representative)
+            self._branches[representative.branch] = self._branches.get(representative.branch, 0) | bit
+            self._everyone |= bit
+            for ordinal, slots in self._days.items():
+                if date.fromordinal(ordinal).weekday() < WORKDAYS:
+                    self._days[ordinal] = [free | bit for free in slots]
+
+    def mask(self, branch: Optional[str] = None, representative_id: Optional[str] = None) -> int:
+        """
+        Returns the bits of the representatives matching both filters; KeyError for unknown ones.
+        """
+        mask = self._everyone
+        if branch:
+            mask &= self._branches[branch]
+        if representative_id:
+            mask &= 1 << self._bits[representative_id]
+        return mask
+
+    def _free(self, ordinal: int) -> list[int]:
+        slots = self._days.get(ordinal)
+        if slots is not None:
+            return slots
+        return [self._everyone] * SLOTS_PER_DAY if date.fromordinal(ordinal).weekday() < WORKDAYS else [0] * SLOTS_PER_DAY
+
+    def free_slots(self, start: date, end: date, mask: int, not_before: Optional[datetime] = None) -> dict[str, list[str]]:
+        """
+        Lists the slots in which at least one representative of `mask` is free.
+
+        Args:
+            start: The first day.
+            end: The last day, included.
+            mask: The representatives to consider, from `mask()`.
+            not_before: Leaves out slots starting before this time.
+
+        Returns:
+            dict: ISO date -> free slot start times ("HH:MM"), only for days with free slots.
+        """
+        if self._db is not None:
+            with self._lock:
+                self._sync()
+        result = {}
+        for ordinal in range(start.toordinal(), end.toordinal() + 1):
+            first = 0
+            if not_before is not None:
+                day = date.fromordinal(ordinal)
+                if day < not_before.date():
+                    continue
+                if day == not_before.date():
+                    first = _first_slot_after(not_before.time())
+            free = self._free(ordinal)
+            times = [SLOT_TIMES[i] for i in range(first, SLOTS_PER_DAY) if free[i] & mask]
+            if times:
+                result[date.fromordinal(ordinal).isoformat()] = times
+        return result
+
+    def book(self, customer_id: str, day: date, slot: int, service: str, mask: int) -> Optional[Appointment]:
+        """
+        Books the first representative of `mask` who is free in the slot.
+
+        Returns:
+            Appointment: The booking, or None if nobody matching is free.
+        """
+        with self._lock:
+            self._sync()
+            ordinal = day.toordinal()
+            free = self._days.get(ordinal)
+            if free is None:
+                free = self._days[ordinal] = self._free(ordinal)
+            while True:
+                candidates = free[slot] & mask
+                if not candidates:
+                    return None
+                bit = candidates & -candidates
+                free[slot] &= ~bit
+                representative = self._representatives[bit.bit_length() - 1]
+                if self._db is None:
+                    appointment_id = f"A{next(self._ids):06d}"
+                    break
+                try:
+                    row = self._db.execute("INSERT INTO appointments (customer_id, representative_id, day, slot, service) VALUES (?, ?, ?, ?, ?)", (customer_id, representative.representative_id, ordinal, slot, service))
+                except sqlite3.IntegrityError:
+                    continue  # another process took this representative's slot; its bit stays cleared
+                appointment_id = f"A{row.lastrowid:06d}"
+                break
+            appointment = Appointment(appointment_id, customer_id, representative, slot_start(day, slot), service)
+            self._appointments[appointment.appointment_id] = appointment
+            return appointment
+
+    def cancel(self, appointment_id: str) -> Optional[Appointment]:
+        """
+        Cancels an appointment and frees its slot; returns it, or None if there is no such appointment.
+        """
+        with self._lock:
+            self._sync()
+            appointment = self._appointments.pop(appointment_id, None)
+            if appointment is not None and self._db is not None:
+                self._db.execute("DELETE FROM appointments WHERE id = ?", (int(appointment_id[1:]),))
+            if appointment is not None:
+                slot = SLOT_INDEX[appointment.start.strftime("%H:%M")]
+                self._days[appointment.start.date().toordinal()][slot] |= 1 << self._bits[appointment.representative.representative_id]
+            return appointment
+
+    def appointments(self, customer_id: str) -> list[Appointment]:
+        with self._lock:
+            self._sync()
+            return sorted((a for a in self._appointments.values() if a.customer_id == customer_id), key=lambda a: a.start)
+
+    def _sync(self) -> None:
+        # rebuilds the bitsets and appointments from the table after another
+        # connection committed to it; the caller holds the lock
+        if self._db is None:
+            return
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        self._version = version
+        self._days.clear()
+        self._appointments.clear()
+        for row_id, customer_id, representative_id, ordinal, slot, service in self._db.execute("SELECT id, customer_id, representative_id, day, slot, service FROM appointments"):
+            index = self._bits.get(representative_id)
+            if index is None:
+                continue
+            free = self._days.get(ordinal)
+            if free is None:
+                free = self._days[ordinal] = self._free(ordinal)
+            free[slot] &= ~(1 << index)
+            appointment = Appointment(f"A{row_id:06d}", customer_id, self._representatives[index], slot_start(date.fromordinal(ordinal), slot), service)
+            self._appointments[appointment.appointment_id] = appointment
+
+
+_calendars: dict[Optional[Path], SlotCalendar] = {}
+_calendars_lock = Lock()
+
+
+def open_calendar(data_dir: Optional[str] = None) -> SlotCalendar:
+    """
+    Returns the process-wide calendar of the demo representatives, created on first use.
+
+    Args:
+        data_dir: Where appointments.db goes (BANK_AGENT_DATA_DIR). Without it the
+            calendar lives in memory, shared by every agent in this process only.
+    """
+    data_dir = data_dir or os.getenv("BANK_AGENT_DATA_DIR")
+    directory = Path(data_dir).resolve() if data_dir else None
+    with _calendars_lock:
+        calendar = _calendars.get(directory)
+        if calendar is None:
+            if directory is not None:
+                directory.mkdir(parents=True, exist_ok=True)
+            calendar = _calendars[directory] = SlotCalendar.demo(str(directory / CALENDAR_FILE) if directory else None)
+        return calendar
+
+
+def _first_slot_after(moment: time) -> int:
+    minutes = moment.hour * 60 + moment.minute + (moment.second > 0 or moment.microsecond > 0)
+    return max(0, min(SLOTS_PER_DAY, -(-(minutes - OPENING_HOUR * 60) // SLOT_MINUTES)))
+
+
+def slot_start(day: date, slot: int) -> datetime:
+    return datetime.combine(day, time(OPENING_HOUR + slot * SLOT_MINUTES // 60, slot * SLOT_MINUTES % 60))
+
+
+def parse_slot(day: str, slot_time: str) -> tuple[date, int]:
+    """
+    Converts a YYYY-MM-DD date and an HH:MM slot start time; ValueError if either is invalid.
+    """
+    slot = SLOT_INDEX.get(slot_time.strip()[:5].rjust(5, "0"))
+    if slot is None:
+        raise ValueError(f"No slot starts at {slot_time}")
+    return date.fromisoformat(day), slot
@@ -0,0 +1,548 @@
+# flake8: noqa: E501
+"""
+Account store sharded across processes.
+
+Accounts are hashed onto shards by account number. Every shard is a process that
+owns one `Ledger` and serves it over a local socket, so any number of agent
+workers share one consistent set of balances. Start the shards with
+
+    python -m bank_core.sharding --shards 4 --port 7100 [--data-dir DIR]
+
+and point every worker at them:
+
+    BANK_AGENT_SHARDS=127.0.0.1:7100,127.0.0.1:7101,127.0.0.1:7102,127.0.0.1:7103
+
+Shards and workers authenticate each other with the secret in BANK_AGENT_SHARD_KEY,
+which both sides must set; there is no default.
+"""
+import argparse
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import defaultdict
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from typing import Iterable, Optional, Sequence
+
+from . import currency as fx
+from .currency import BASE_CURRENCY, RateTable, convert_minor, currency_id, total_in
+from .history import TransactionHistory
+from .ledger import Ledger, to_major, to_minor
+
+logger = logging.getLogger(__name__)
+
+IN_DOUBT_AFTER = 30.0  # seconds a transaction may stay prepared before another coordinator resolves it
+
+
+def authkey_from_env() -> bytes:
+    """
+    Returns the shard authentication key from BANK_AGENT_SHARD_KEY.
+
+    Raises:
+        ValueError: If the variable is not set or empty.
+    """
+    authkey = os.getenv("BANK_AGENT_SHARD_KEY")
+    if not authkey:
+        raise ValueError("Set BANK_AGENT_SHARD_KEY to a secret shared by the shards and the agent workers")
+    return authkey.encode()
+
+
+def shard_of(account_number: str, shards: int) -> int:
+    """
+    Returns the shard of an account; stable across processes, unlike `hash`.
+    """
+    return zlib.crc32(account_number.encode()) % shards
+
+
+class Shard:
+    """
+    Server side of one shard: a `Ledger` plus the participant half of two-phase commit.
+
+    `prepare` takes the debits of a cross-shard transaction out of the balances
+    right away, so they can't be spent twice, and holds the credits back until
+    `commit`. `abort` puts the debits back. The ledger journals all three, so a
+    restarted shard still knows which transactions wait for a decision.
+    """
+
+    def __init__(self, ledger: Ledger):
+        self.ledger = ledger
+
+    def contains(self, account_number: str) -> bool:
+        return account_number in self.ledger
+
+    def open(self, account_number: str, balance: float = 0.0, currency: str = BASE_CURRENCY) -> None:
+        self.ledger.open(account_number, balance, currency)
+
+    def assign(self, account_number: str, customer_id: str) -> None:
+        self.ledger.assign(account_number, customer_id)
+
+    def balance(self, account_number: str) -> float:
+        return self.ledger.balance(account_number)
+
+    def currency(self, account_number: str) -> str:
+        return self.ledger.currency(account_number)
+
+    def balances(self, account_numbers: list[str]) -> list[tuple[float, str]]:
+        return self.ledger.balances(account_numbers)
+
+    def customer_balances(self, customer_id: str) -> dict[str, float]:
+        return self.ledger.customer_balances(customer_id)
+
+    def withdraw(self, account_number: str, amount: float) -> bool:
+        return self.ledger.withdraw(account_number, amount)
+
+    def deposit(self, account_number: str, amount: float) -> bool:
+        return self.ledger.deposit(account_number, amount)
+
+    def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool:
+        return self.ledger.transfer(account_number_from, account_number_to, amount)
+
+    def transfer_many(self, transfers: list[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]:
+        return self.ledger.transfer_many(transfers, atomic)
+
+    def statement(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 20, cursor: Optional[int] = None) -> tuple[list[dict], Optional[int]]:
+        return self.ledger.history.statement(account_number, start, end, limit, cursor)
+
+    def spending(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, period: str = "month") -> dict[str, float]:
+        return self.ledger.history.spending(account_number, start, end, period)
+
+    def prepare(self, txid: str, deltas: list[tuple[str, float]], decider: int = -1, forget: Sequence[str] = ()) -> Optional[str]:
+        """
+        Votes on a transaction: None to commit, or the reason it can't be applied.
+
+        Args:
+            txid: The transaction id.
+            deltas: Signed amounts per account on this shard.
+            decider: Index of the shard whose commit decides the transaction, -1 for this one.
+            forget: Transactions this shard decided that are committed everywhere,
+                sent along so they cost no extra round trip.
+        """
+        if forget:
+            self.ledger.forget(forget)
+        if any(account_number not in self.ledger for account_number, _ in deltas):
+            return "Account not found"
+        if not self.ledger.prepare(txid, deltas, decider):
+            return "Not enough balance in the account"
+        return None
+
+    def commit(self, txid: str) -> bool:
+        return self.ledger.commit(txid)
+
+    def abort(self, txid: str) -> bool:
+        return self.ledger.abort(txid)
+
+    def outcome(self, txid: str) -> Optional[str]:
+        return self.ledger.outcome(txid)
+
+    def prepared(self, older_than: float = 0.0) -> list[tuple[str, int]]:
+        """
+        Returns the transactions waiting for a decision for at least `older_than`
+        seconds, with their decider: e.g. after a coordinator died, or all of them
+        right after this shard restarted.
+        """
+        return self.ledger.in_doubt(older_than)
+
+
+class ShardManager(BaseManager):
+    pass
+
+
+ShardManager.register("shard")
+
+
+def serve(address: tuple[str, int], authkey: bytes, data_dir: Optional[str] = None) -> None:
+    """
+    Serves one shard until the process is stopped. With `data_dir` the shard's
+    balances and prepared transactions are kept there across restarts.
+    """
+    if not authkey:
+        raise ValueError("A shard needs an authentication key")
+    if data_dir:
+        from .persistence import LedgerPersistence
+        persistence = LedgerPersistence(data_dir)
+        ledger = persistence.open()
+        atexit.register(persistence.close)
+    else:
+        ledger = Ledger(history=TransactionHistory())
+    ledger.rates = fx.from_env()
+
+    shard = Shard(ledger)
+    ShardManager.register("shard", callable=lambda: shard)
+    ShardManager(address=address, authkey=authkey).get_server().serve_forever()
+
+
+class ShardedAccount:
+    """
+    View of one account on a shard, with the same interface as `LedgerAccount`.
+    """
+    __slots__ = ("_ledger", "account_number")
+
+    def __init__(self, ledger: "ShardedLedger", account_number: str):
+        self._ledger = ledger
+        self.account_number = account_number
+
+    @property
+    def balance(self) -> float:
+        return self._ledger.balance(self.account_number)
+
+    def withdraw(self, amount: float) -> bool:
+        return self._ledger.shard(self.account_number).withdraw(self.account_number, amount)
+
+    def deposit(self, amount: float) -> bool:
+        return self._ledger.shard(self.account_number).deposit(self.account_number, amount)
+
+    def __repr__(self) -> str:
+        return f"ShardedAccount(account_number={self.account_number!r})"
+
+
+class ShardedHistory:
+    """
+    Transaction history of the shards, with the interface of `TransactionHistory`.
+    Every account's entries live on its shard, so a statement is one round trip.
+    Cross-shard transfers show up as adjustments, applied in two phases.
+    """
+
+    def __init__(self, ledger: "ShardedLedger"):
+        self._ledger = ledger
+
+    def statement(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 20, cursor: Optional[int] = None) -> tuple[list[dict], Optional[int]]:
+        return self._ledger.shard(account_number).statement(account_number, start, end, limit, cursor)
+
+    def spending(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, period: str = "month") -> dict[str, float]:
+        return self._ledger.shard(account_number).spending(account_number, start, end, period)
+
+
+class ShardedLedger:
+    """
+    Client side of the shards, with the blocking interface of `Ledger` that the
+    tools use. Every call is a round trip; wrap it in a `ThreadPoolStore` for
+    async tools.
+
+    A transfer within one shard is a single call that the shard applies under its
+    own locks. A transfer across shards runs two-phase commit: every involved
+    shard prepares its part and only when all of them agree are the parts
+    committed, otherwise the prepared ones are aborted.
+
+    The coordinator keeps no log of its own. The lowest involved shard is the
+    decider: it is prepared first and committed first, and its commit is the
+    decision, journaled on that shard. Commits that fail, e.g. because a shard went
+    away, are retried before the next cross-shard transfer. A transaction left
+    prepared for `in_doubt_after` seconds, e.g. because its coordinator died, or
+    recovered by a restarted shard, is resolved by any coordinator: committed if
+    its decider committed it, aborted otherwise.
+
+    A cross-shard transfer between currencies is converted here, with `rates`;
+    account currencies never change, so each is fetched from its shard only once.
+    """
+
+    def __init__(self, shards: Sequence, rates: Optional[RateTable] = None, in_doubt_after: float = IN_DOUBT_AFTER):
+        self.shards = list(shards)
+        self.rates = rates
+        self.in_doubt_after = in_doubt_after
+        self.history = ShardedHistory(self)
+        self._currencies: dict[str, int] = {}
+        self._undecided: list[tuple[str, int, list[int]]] = []  # txid, decider, shards still to commit
+        self._forget: dict[int, list[str]] = defaultdict(list)  # decider -> txids committed everywhere
+        self._next_recovery = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, addresses: str, authkey: bytes, rates: Optional[RateTable] = None) -> "ShardedLedger":
+        """
+        Connects to running shards, given as comma-separated host:port pairs in shard order.
+        """
+        if not authkey:
+            raise ValueError("Connecting to the shards needs their authentication key")
+        shards = []
+        for address in addresses.split(","):
+            host, port = address.strip().rsplit(":", 1)
+            manager = ShardManager(address=(host, int(port)), authkey=authkey)
+            manager.connect()
+            shards.append(manager.shard())
+        ledger = cls(shards, rates)
+        ledger.resolve()
+        return ledger
+
+    def shard(self, account_number: str):
+        return self.shards[shard_of(account_number, len(self.shards))]
+
+    def __contains__(self, account_number: str) -> bool:
+        return self.shard(account_number).contains(account_number)
+
+    def contains(self, account_number: str) -> bool:
+        return account_number in self
+
+    def open(self, account_number: str, balance: float = 0.0, currency: str = BASE_CURRENCY) -> ShardedAccount:
+        self.shard(account_number).open(account_number, balance, currency)
+        return ShardedAccount(self, account_number)
+
+    def assign(self, account_number: str, customer_id: str) -> None:
+        self.shard(account_number).assign(account_number, customer_id)
+
+    def account(self, account_number: str) -> ShardedAccount:
+        return ShardedAccount(self, account_number)
+
+    def balance(self, account_number: str) -> float:
+        return self.shard(account_number).balance(account_number)
+
+    def currency(self, account_number: str) -> str:
+        return self.shard(account_number).currency(account_number)
+
+    def _currency_id(self, account_number: str) -> int:
+        currency = self._currencies.get(account_number)
+        if currency is None:
+            currency = self._currencies[account_number] = currency_id(self.currency(account_number))
+        return currency
+
+    def balances(self, account_numbers: Iterable[str]) -> list[tuple[float, str]]:
+        """
+        Returns the balance and currency of each account, with one call per shard.
+        """
+        account_numbers = list(account_numbers)
+        parts: dict[int, list[int]] = defaultdict(list)
+        for i, account_number in enumerate(account_numbers):
+            parts[shard_of(account_number, len(self.shards))].append(i)
+        result: list[tuple[float, str]] = [(0.0, BASE_CURRENCY)] * len(account_numbers)
+        for index, positions in parts.items():
+            for i, balance in zip(positions, self.shards[index].balances([account_numbers[i] for i in positions])):
+                result[i] = balance
+        return result
+
+    def total(self, account_numbers: Iterable[str], currency: str = BASE_CURRENCY) -> float:
+        """
+        Sums the balances of the given accounts in one currency, with one call per shard.
+        """
+        sums: dict[str, int] = defaultdict(int)
+        for balance, code in self.balances(account_numbers):
+            sums[code] += to_minor(balance)
+        return total_in({code: to_major(minor) for code, minor in sums.items()}, currency, self.rates)
+
+    def customer_balances(self, customer_id: str) -> dict[str, float]:
+        totals: dict[str, int] = defaultdict(int)
+        for shard in self.shards:
+            for code, amount in shard.customer_balances(customer_id).items():
+                totals[code] += to_minor(amount)
+        return {code: to_major(minor) for code, minor in totals.items() if minor}
+
+    def customer_total(self, customer_id: str, currency: str = BASE_CURRENCY) -> float:
+        return total_in(self.customer_balances(customer_id), currency, self.rates)
+
+    def _credit(self, minor: int, account_number_from: str, account_number_to: str) -> int:
+        return convert_minor(minor, self._currency_id(account_number_from), self._currency_id(account_number_to), self.rates)
+
+    def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool:
+        """
+        Moves money between two existing accounts.
+
+        Returns:
+            bool: True if the transfer was applied, False if the balance is insufficient.
+
+        Raises:
+            KeyError: If one of the accounts does not exist.
+        """
+        shard = self.shard(account_number_from)
+        if shard is self.shard(account_number_to):
+            return shard.transfer(account_number_from, account_number_to, amount)
+
+        minor = to_minor(amount)
+        if minor <= 0:
+            raise ValueError("Transfer amount must be positive")
+        error = self._two_phase({account_number_from: -minor, account_number_to: self._credit(minor, account_number_from, account_number_to)})
+        if error == "Account not found":
+            raise KeyError(account_number_from if account_number_from not in self else account_number_to)
+        return error is None
+
+    def transfer_many(self, transfers: Iterable[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]:
+        """
+        Applies a batch of transfers, like `Ledger.transfer_many`. An atomic batch
+        within one shard is a single call; across shards it is one two-phase commit
+        of the netted amounts.
+        """
+        transfers = list(transfers)
+        involved = {shard_of(n, len(self.shards)) for t in transfers for n in t[:2] if n is not None}
+        if len(involved) <= 1:
+            return self.shards[involved.pop() if involved else 0].transfer_many(transfers, atomic)
+
+        if not atomic:
+            return [self._transfer_one(*t) for t in transfers]
+
+        errors: list[Optional[str]] = []
+        deltas: dict[str, int] = defaultdict(int)
+        for account_number_from, account_number_to, amount in transfers:
+            minor = to_minor(amount)
+            if account_number_from is None or account_number_to is None:
+                errors.append("Account not found")
+            elif minor <= 0:
+                errors.append("Transfer amount must be positive")
+            else:
+                try:
+                    credit = self._credit(minor, account_number_from, account_number_to)
+                except KeyError:
+                    errors.append("Account not found")
+                except ValueError as e:
+                    errors.append(str(e))
+                else:
+                    errors.append(None)
+                    deltas[account_number_from] -= minor
+                    deltas[account_number_to] += credit
+        if any(errors):
+            return [e or "Batch rejected" for e in errors]
+
+        error = self._two_phase(deltas)
+        return [error] * len(transfers) if error else errors
+
+    def _transfer_one(self, account_number_from: str, account_number_to: str, amount: float) -> Optional[str]:
+        try:
+            return None if self.transfer(account_number_from, account_number_to, amount) else "Not enough balance in the account"
+        except KeyError:
+            return "Account not found"
+        except ValueError as e:
+            return str(e)
+
+    def _two_phase(self, deltas: dict[str, int]) -> Optional[str]:
+        # None if committed, otherwise the first shard's reason to refuse
+        self.resolve()
+        parts: dict[int, list[tuple[str, float]]] = defaultdict(list)
+        for account_number, minor in deltas.items():
+            if minor:
+                parts[shard_of(account_number, len(self.shards))].append((account_number, to_major(minor)))
+        if not parts:
+            return None
+
+        txid = uuid.uuid4().hex
+        indexes = sorted(parts)
+        decider = indexes[0]
+        with self._lock:
+            forget = self._forget.pop(decider, [])
+        prepared = []
+        try:
+            for index in indexes:
+                error = self.shards[index].prepare(txid, parts[index], -1 if index == decider else decider, forget if index == decider else ())
+                if error is not None:
+                    break
+                prepared.append(index)
+        except BaseException:
+            self._abort(txid, prepared)
+            raise
+        if error is not None:
+            self._abort(txid, prepared)
+            return error
+
+        if not self._commit(txid, decider, prepared):
+            return "Transaction timed out"
+        return None
+
+    def _commit(self, txid: str, decider: int, shards: list[int]) -> bool:
+        # False if the decider had aborted the transaction, otherwise it is committed
+        # (or will be, once the failed commits are retried)
+        if decider in shards:
+            try:
+                committed = self.shards[decider].commit(txid)
+            except Exception as e:
+                with self._lock:
+                    self._undecided.append((txid, decider, shards))
+                raise ConnectionError(f"Transaction {txid} is undecided, its decider shard {decider} did not answer; it will be resolved later, check the balances before retrying") from e
+            if not committed:
+                # resolved as aborted by another coordinator while this one waited
+                self._abort(txid, [index for index in shards if index != decider])
+                return False
+
+        failed = []
+        for index in shards:
+            if index == decider:
+                continue
+            try:
+                self.shards[index].commit(txid)
+            except Exception:
+                logger.exception("Commit of %s failed on shard %d, will retry", txid, index)
+                failed.append(index)
+        with self._lock:
+            if failed:
+                self._undecided.append((txid, decider, failed))
+            else:
+                self._forget[decider].append(txid)
+        return True
+
+    def _abort(self, txid: str, shards: list[int]) -> None:
+        for index in shards:
+            try:
+                self.shards[index].abort(txid)
+            except Exception:
+                logger.exception("Abort of %s failed on shard %d; it stays prepared", txid, index)
+
+    def resolve(self) -> None:
+        """
+        Retries the commits that failed earlier and, every `in_doubt_after` seconds,
+        resolves the transactions the shards have had prepared for that long.
+        """
+        with self._lock:
+            undecided, self._undecided = self._undecided, []
+            recover = time.monotonic() >= self._next_recovery
+            if recover:
+                self._next_recovery = time.monotonic() + self.in_doubt_after
+        for txid, decider, shards in undecided:
+            try:
+                self._commit(txid, decider, shards)
+            except ConnectionError as e:
+                logger.warning("%s", e)
+        if recover:
+            self._recover()
+
+    def _recover(self) -> None:
+        # deciders first: the decider is the lowest involved shard
+        for index, shard in enumerate(self.shards):
+            try:
+                in_doubt = shard.prepared(self.in_doubt_after)
+            except Exception:
+                logger.exception("Listing the prepared transactions of shard %d failed", index)
+                continue
+            for txid, decider in in_doubt:
+                try:
+                    if decider < 0:
+                        # its coordinator never committed it: decide to abort
+                        shard.abort(txid)
+                    else:
+                        outcome = self.shards[decider].outcome(txid)
+                        if outcome == "committed":
+                            shard.commit(txid)
+                        elif outcome is None:
+                            shard.abort(txid)
+                except Exception:
+                    logger.exception("Resolving %s on shard %d failed", txid, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7100, help="port of the first shard; the others follow")
+    parser.add_argument("--data-dir", help="keep every shard's balances under DIR/shard-N")
+    args = parser.parse_args()
+
+    try:
+        authkey = authkey_from_env()
+    except ValueError as e:
+        parser.error(str(e))
+    processes = []
+    for i in range(args.shards):
+        data_dir = str(Path(args.data_dir) / f"shard-{i}") if args.data_dir else None
+        process = multiprocessing.Process(target=serve, args=((args.host, args.port + i), authkey, data_dir), name=f"shard-{i}")
+        process.start()
+        processes.append(process)
+
+    print("BANK_AGENT_SHARDS=" + ",".join(f"{args.host}:{args.port + i}" for i in range(args.shards)), flush=True)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
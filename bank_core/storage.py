@@ -0,0 +1,157 @@
+# flake8: noqa: E501
+import asyncio
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Iterable, Optional, Protocol
+
+from .history import TransactionHistory
+from .ledger import Ledger
+from .repository import CustomerProfile, CustomerRepository
+from .utils import Customer
+
+
+class AccountStore(Protocol):
+    """
+    Async interface to account balances.
+    """
+
+    async def contains(self, account_number: str) -> bool: ...
+
+    async def open(self, account_number: str) -> None: ...
+
+    async def balance(self, account_number: str) -> float: ...
+
+    async def currency(self, account_number: str) -> str: ...
+
+    async def balances(self, account_numbers: list[str]) -> list[tuple[float, str]]: ...
+
+    async def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool: ...
+
+    async def transfer_many(self, transfers: Iterable[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]: ...
+
+    async def customer_balances(self, customer_id: str) -> dict[str, float]: ...
+
+    async def customer_total(self, customer_id: str) -> float: ...
+
+
+class HistoryStore(Protocol):
+    """
+    Async interface to the transaction history.
+    """
+
+    async def statement(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 20, cursor: Optional[int] = None) -> tuple[list[dict], Optional[int]]: ...
+
+    async def spending(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, period: str = "month") -> dict[str, float]: ...
+
+
+class CustomerStore(Protocol):
+    """
+    Async interface to customer records.
+    """
+
+    async def get(self, customer_id: str) -> Optional[Customer]: ...
+
+    async def profile(self, customer_id: str) -> Optional[CustomerProfile]: ...
+
+
+class LedgerStore:
+    """
+    `AccountStore` over an in-memory `Ledger`. Reads never block; writes wait for
+    contended account locks and journal flushes without blocking the event loop.
+    """
+
+    def __init__(self, ledger: Ledger):
+        self.ledger = ledger
+
+    async def contains(self, account_number: str) -> bool:
+        return account_number in self.ledger
+
+    async def open(self, account_number: str) -> None:
+        if account_number not in self.ledger:
+            await asyncio.to_thread(self.ledger.open, account_number)
+
+    async def balance(self, account_number: str) -> float:
+        return self.ledger.balance(account_number)
+
+    async def currency(self, account_number: str) -> str:
+        return self.ledger.currency(account_number)
+
+    async def balances(self, account_numbers: list[str]) -> list[tuple[float, str]]:
+        return self.ledger.balances(account_numbers)
+
+    async def transfer(self, account_number_from: str, account_number_to: str, amount: float) -> bool:
+        return await self.ledger.atransfer(account_number_from, account_number_to, amount)
+
+    async def transfer_many(self, transfers: Iterable[tuple[str, str, float]], atomic: bool = True) -> list[Optional[str]]:
+        return await self.ledger.atransfer_many(transfers, atomic)
+
+    async def customer_balances(self, customer_id: str) -> dict[str, float]:
+        return self.ledger.customer_balances(customer_id)
+
+    async def customer_total(self, customer_id: str) -> float:
+        return self.ledger.customer_total(customer_id)
+
+
+class LocalHistoryStore:
+    """
+    `HistoryStore` over an in-memory `TransactionHistory`, answered on the event loop.
+    """
+
+    def __init__(self, history: TransactionHistory):
+        self.history = history
+
+    async def statement(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, limit: int = 20, cursor: Optional[int] = None) -> tuple[list[dict], Optional[int]]:
+        return self.history.statement(account_number, start, end, limit, cursor)
+
+    async def spending(self, account_number: str, start: Optional[float] = None, end: Optional[float] = None, period: str = "month") -> dict[str, float]:
+        return self.history.spending(account_number, start, end, period)
+
+
+class ThreadPoolStore:
+    """
+    Async facade over a blocking backend: every method call runs on a thread pool.
+
+    Example:
+        customers = ThreadPoolStore(CustomerRepository(SQLiteCustomerBackend("bank.db")))
+        customer = await customers.get("123")
+    """
+
+    def __init__(self, backend: object, executor: Optional[Executor] = None):
+        self.backend = backend
+        self.executor = executor or _default_executor()
+
+    def __getattr__(self, name: str):
+        method = getattr(self.backend, name)
+
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+        call.__name__ = name
+        return call
+
+
+class CachedCustomerStore(ThreadPoolStore):
+    """
+    `CustomerStore` over a `CustomerRepository`: cache hits are answered on the
+    event loop, only misses go to the thread pool to load from the backend.
+    """
+
+    def __init__(self, repository: CustomerRepository, executor: Optional[Executor] = None):
+        super().__init__(repository, executor)
+
+    async def get(self, customer_id: str) -> Optional[Customer]:
+        customer = self.backend.cached(customer_id)
+        if customer is None:
+            customer = await self.__getattr__("get")(customer_id)
+        return customer
+
+    async def profile(self, customer_id: str) -> Optional[CustomerProfile]:
+        if self.backend.cached(customer_id) is not None:
+            return self.backend.profile(customer_id)
+        return await self.__getattr__("profile")(customer_id)
+
+
+@functools.cache
+def _default_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(thread_name_prefix="bank-storage")
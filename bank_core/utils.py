@@ -1,5 +1,5 @@
 # flake8: noqa: E501
-from typing import Self
+from typing import Optional, Self
 from pydantic import BaseModel, Field
 
 
@@ -9,6 +9,7 @@ class Account(BaseModel):
     """
     account_number: str
     balance: float = Field(ge=0)  # Ensures balance is never negative
+    currency: str = "EUR"
 
     def withdraw(self, amount: float) -> bool:
         """
@@ -66,10 +67,31 @@ class Customer(BaseModel):
         """
         return self.model_dump_json(indent=4)
 
+    def compact_dump(self) -> dict:
+        """
+        Returns a compact projection of the customer for the model's context:
+        credit cards without CVV, holder name and with all but the last 4 digits
+        of the number masked.
+
+        Returns:
+            A dictionary with the projected customer data.
+        """
+        data = self.model_dump()
+        data["credit_cards"] = [
+            {
+                "type": card.get("type"),
+                "number": f"*{str(card.get('number', ''))[-4:]}",
+                "expiry": card.get("expiry"),
+                "limit": card.get("limit"),
+            }
+            for card in data["credit_cards"]
+        ]
+        return data
+
     @staticmethod
-    def get_customer(current_customer_id: str) -> Self:
+    def get_customer(current_customer_id: str) -> Optional[Self]:
         """
-        Retrieves a customer based on their ID.
+        Retrieves a customer based on their ID from the cached customer repository.
 
         Args:
             customer_id: The ID of the customer to retrieve.
@@ -77,36 +99,19 @@ class Customer(BaseModel):
         Returns:
             The Customer object if found, None otherwise.
         """
-        # In a real application, this would involve a database lookup.
-        # For this example, we'll just return a dummy customer.
-        return Customer(
-            customer_id=current_customer_id,
-            customer_first_name="Demir",
-            customer_last_name="Tonchev",
-            customer_accounts=['BG47CHAS6016', 'BG68RZBB1337'],
-            credit_cards=[{
-                "type": "Visa",
-                "name": "Demir Tonchev",
-                "number": "4716351256837430",
-                "cvv": "486",
-                "expiry": "06/27",
-                "limit": 10_000,
-            },
-                {
-                "type": "Mastercard",
-                "name": "Demir Tonchev",
-                "number": "4716351256837430",
-                "cvv": "123",
-                "expiry": "03/28",
-                "limit": 1000
-            }]
-        )
+        from .repository import customers
+        return customers.get(current_customer_id)
+
+
+# same as google.adk.sessions.State.USER_PREFIX, spelled out so importing the tools doesn't import ADK's session services
+USER_PREFIX = "user:"
 
 
 def create_global_instruction():
+    from .repository import customers
 
     return f"""
-    The profile of the current customer is:  {Customer.get_customer("123").to_json()}
+    The profile of the current customer is:  {customers.profile("123").compact_json.decode()}
     """
 
 
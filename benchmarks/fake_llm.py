@@ -0,0 +1,68 @@
+# flake8: noqa: E501
+from contextlib import contextmanager
+from typing import AsyncGenerator
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+
+def call(name: str, **args) -> types.Part:
+    return types.Part.from_function_call(name=name, args=args)
+
+
+def text(value: str) -> types.Part:
+    return types.Part.from_text(text=value)
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    Deterministic local stand-in for the Gemini model.
+
+    The script is the sequence of parts the model answers with. The step is derived
+    from the request alone: after the function response for step `i` the model
+    answers with step `i + 1`, otherwise it starts from the top. That makes every
+    conversation replay the same tool calls, no matter how many run at once.
+    """
+    model: str = "scripted"
+    script: list[types.Part]
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"scripted.*"]
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(content=types.Content(role="model", parts=[self._next(llm_request)]))
+
+    def _next(self, llm_request: LlmRequest) -> types.Part:
+        last = llm_request.contents[-1] if llm_request.contents else None
+        responded = [p.function_response.name for p in (last.parts or []) if p.function_response] if last else []
+
+        step = 0
+        if responded:
+            names = [p.function_call.name if p.function_call else None for p in self.script]
+            step = names.index(responded[-1]) + 1 if responded[-1] in names else len(self.script) - 1
+        # ADK stamps ids on the returned parts, so never hand out the script's own objects
+        return self.script[min(step, len(self.script) - 1)].model_copy(deep=True)
+
+
+@contextmanager
+def scripted(agent, scripts: dict[str, list[types.Part]]):
+    """
+    Swaps the model of every agent in the tree that has a script, and restores it afterwards.
+    """
+    originals = {}
+
+    def walk(a):
+        yield a
+        for sub in a.sub_agents:
+            yield from walk(sub)
+
+    for a in walk(agent):
+        if a.name in scripts:
+            originals[a.name] = (a, a.model)
+            a.model = ScriptedLlm(script=scripts[a.name])
+    try:
+        yield agent
+    finally:
+        for a, model in originals.values():
+            a.model = model
@@ -0,0 +1,119 @@
+# flake8: noqa: E501
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@dataclass
+class BenchResult:
+    name: str
+    iterations: int
+    throughput: float  # operations per second
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+
+    def row(self) -> str:
+        return f"{self.name:<40} {self.iterations:>8} {self.throughput:>12.1f}/s {self.p50_ms:>10.4f} {self.p95_ms:>10.4f} {self.p99_ms:>10.4f}"
+
+
+HEADER = f"{'benchmark':<40} {'n':>8} {'throughput':>14} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"
+
+
+def _summarize(name: str, samples: list[float], elapsed: float) -> BenchResult:
+    q = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    return BenchResult(
+        name=name,
+        iterations=len(samples),
+        throughput=len(samples) / elapsed if elapsed else float("inf"),
+        p50_ms=q[49] * 1000,
+        p95_ms=q[94] * 1000,
+        p99_ms=q[98] * 1000,
+    )
+
+
+def bench(name: str, fn: Callable[[], object], iterations: int = 10_000, warmup: int = 100) -> BenchResult:
+    """
+    Times a sync callable call by call.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(iterations):
+        t0 = clock()
+        fn()
+        samples.append(clock() - t0)
+    return _summarize(name, samples, clock() - start)
+
+
+async def abench(name: str, fn: Callable[[], Awaitable[object]], iterations: int = 1_000, concurrency: int = 1, warmup: int = 10) -> BenchResult:
+    """
+    Times an async callable, with `concurrency` callers running at once.
+    """
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    remaining = iterations
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            await fn()
+            samples.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summarize(name, samples, time.perf_counter() - start)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(results: list[BenchResult], path: Optional[Path] = None) -> Path:
+    """
+    Stores results as JSON, by default under benchmarks/results/<git revision>.json.
+    """
+    revision = git_revision()
+    path = path or RESULTS_DIR / f"{revision}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "revision": revision,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": [asdict(r) for r in results],
+    }, indent=2))
+    return path
+
+
+def compare(baseline: Path, current: Path) -> str:
+    """
+    Renders a table of p50 latency and throughput changes between two result files.
+    """
+    before = {r["name"]: r for r in json.loads(baseline.read_text())["results"]}
+    after = {r["name"]: r for r in json.loads(current.read_text())["results"]}
+    lines = [f"{'benchmark':<40} {'p50 before':>12} {'p50 after':>12} {'change':>8} {'throughput':>12}"]
+    for name, r in after.items():
+        if name not in before:
+            continue
+        b = before[name]
+        change = (r["p50_ms"] - b["p50_ms"]) / b["p50_ms"] * 100 if b["p50_ms"] else 0.0
+        speedup = r["throughput"] / b["throughput"] if b["throughput"] else float("inf")
+        lines.append(f"{name:<40} {b['p50_ms']:>12.4f} {r['p50_ms']:>12.4f} {change:>+7.1f}% {speedup:>11.2f}x")
+    return "\n".join(lines)
@@ -0,0 +1,233 @@
+# flake8: noqa: E501
+"""
+Load generation and latency benchmarks.
+
+    python -m benchmarks.run                      # everything, results saved under benchmarks/results/
+    python -m benchmarks.run --only micro agents  # pick suites: micro, agents, mcp, startup
+    python -m benchmarks.run --compare benchmarks/results/abc123.json benchmarks/results/def456.json
+
+Agents run through ADK runners against a scripted local model, so no network or
+API key is needed. The MCP suite starts mcp_server.py on a free local port. The
+startup suite times fresh interpreters; `python -m benchmarks.startup` breaks
+that time down by module.
+"""
+import argparse
+import asyncio
+import contextlib
+import inspect
+import itertools
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from .harness import HEADER, BenchResult, abench, bench, compare, save
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def micro() -> list[BenchResult]:
+    from bank_core import aio
+    from bank_core.backends import InMemoryAccounts, SQLiteAccounts, account_store, open_demo_accounts
+    from bank_core.currency import CURRENCIES, RateTable
+    from bank_core.ledger import Ledger
+    from bank_core.repository import customers
+    from bank_core.scheduling import Representative, SlotCalendar
+    from bank_core.storage import CachedCustomerStore
+    from bank_core.utils import Account, Customer
+
+    results = []
+    account = Account(account_number="BENCH0001", balance=1e12)
+    results.append(bench("Account.withdraw+deposit", lambda: account.withdraw(1) and account.deposit(1)))
+
+    ledger = Ledger()
+    view = ledger.open("BENCH0001", 1e12)
+    ledger.open("BENCH0002")
+    results.append(bench("LedgerAccount.withdraw+deposit", lambda: view.withdraw(1) and view.deposit(1)))
+    batch = [("BENCH0001", "BENCH0002", 1)] * 100
+
+    async def concurrent_transfers():
+        return await abench("Ledger.atransfer x10 concurrent", lambda: ledger.atransfer("BENCH0001", "BENCH0002", 1), iterations=10_000, concurrency=10)
+    results.append(asyncio.run(concurrent_transfers()))
+
+    for backend in (Ledger(), InMemoryAccounts(), SQLiteAccounts()):
+        name = type(backend).__name__
+        backend.open("BENCH0001", 1e12)
+        backend.open("BENCH0002")
+        results.append(bench(f"{name}.transfer", lambda b=backend: b.transfer("BENCH0001", "BENCH0002", 1)))
+        results.append(bench(f"{name}.transfer_many (100)", lambda b=backend: b.transfer_many(batch), iterations=1_000))
+
+    async def transfer_tool():
+        backend = Ledger()
+        tools = {t.__name__: t for t in aio.async_tools(account_store(backend), CachedCustomerStore(customers), open_demo_accounts(backend, customers))}
+        return await abench("transfer_money tool", lambda: tools["transfer_money"]("BG68RZBB1337", "BG47CHAS6016", 0.01, "EUR"), iterations=10_000)
+    results.append(asyncio.run(transfer_tool()))
+    results.append(bench("Customer.get_customer", lambda: Customer.get_customer("123")))
+
+    rates = RateTable()
+    fx = Ledger(rates=rates)
+    fx.open("BENCH0001", 1e12, "EUR")
+    fx.open("BENCH0003", 0, "USD")
+    results.append(bench("Ledger.transfer EUR->USD", lambda: fx.transfer("BENCH0001", "BENCH0003", 1)))
+    amounts, currencies = [float(i) for i in range(1_000)], [CURRENCIES[i % len(CURRENCIES)] for i in range(1_000)]
+    results.append(bench("RateMatrix.convert_many (1000)", lambda: rates.matrix.convert_many(amounts, currencies, "EUR"), iterations=1_000))
+
+    # 5000 representatives over 50 branches
+    calendar = SlotCalendar(Representative(f"R{i:04d}", f"Representative {i}", f"Branch {i % 50}") for i in range(5_000))
+    monday = date.today() + timedelta(days=7 - date.today().weekday())
+    results.append(bench("SlotCalendar.free_slots (14 days)", lambda: calendar.free_slots(monday, monday + timedelta(days=13), calendar.mask("Branch 7")), iterations=1_000))
+    slots = itertools.cycle([(monday + timedelta(days=d), s) for d in range(5) for s in range(16)])
+    results.append(bench("SlotCalendar.book", lambda: calendar.book("123", *next(slots), "advice", calendar.mask())))
+    return results
+
+
+def startup(iterations: int = 10) -> list[BenchResult]:
+    def cold(code: str):
+        return lambda: subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, capture_output=True)
+
+    return [
+        bench("cold import bank_agent.agent", cold("import bank_agent.agent"), iterations=iterations, warmup=1),
+        bench("cold import + build root_agent", cold("from bank_agent.agent import root_agent"), iterations=iterations, warmup=1),
+        bench("cold import bank_agent_mcp.agent", cold("import bank_agent_mcp.agent"), iterations=iterations, warmup=1),
+    ]
+
+
+async def _run_turns(name: str, agent, message: str, iterations: int, concurrency: int) -> BenchResult:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name="bench", session_service=session_service)
+    content = types.Content(role="user", parts=[types.Part.from_text(text=message)])
+
+    async def turn():
+        session = session_service.create_session(app_name="bench", user_id="bench")
+        if inspect.isawaitable(session):
+            session = await session
+        async for _ in runner.run_async(user_id="bench", session_id=session.id, new_message=content):
+            pass
+
+    return await abench(name, turn, iterations=iterations, concurrency=concurrency)
+
+
+TRANSFER_SCRIPT = {
+    "bank_agent": lambda call, text: [
+        call("get_current_customer"),
+        call("get_account_balance", account_number="BG68RZBB1337"),
+        call("transfer_money", account_number_from="BG68RZBB1337", account_number_to="BG47CHAS6016", amount=0.01, currency="EUR"),
+        text("The transfer is done."),
+    ],
+}
+
+GOODBYE_SCRIPT = {
+    "bank_agent": lambda call, text: [call("transfer_to_agent", agent_name="goodbye_agent")],
+    "goodbye_agent": lambda call, text: [call("say_goodbye"), text("Goodbye!")],
+}
+
+
+def _scripts(template: dict) -> dict:
+    from .fake_llm import call, text
+    return {name: build(call, text) for name, build in template.items()}
+
+
+async def agents(iterations: int = 200, concurrency: int = 10) -> list[BenchResult]:
+    from bank_agent.agent import root_agent
+
+    from .fake_llm import scripted
+
+    results = []
+    with scripted(root_agent, _scripts(TRANSFER_SCRIPT)):
+        results.append(await _run_turns("bank_agent transfer turn", root_agent, "Send 0.01 EUR to my other account", iterations, 1))
+        results.append(await _run_turns(f"bank_agent transfer turn x{concurrency}", root_agent, "Send 0.01 EUR to my other account", iterations, concurrency))
+    with scripted(root_agent, _scripts(GOODBYE_SCRIPT)):
+        # "thanks, bye" is answered by the fast-path router; the second message goes through the model
+        results.append(await _run_turns("bank_agent goodbye turn", root_agent, "thanks, bye", iterations, 1))
+        results.append(await _run_turns("bank_agent goodbye turn via model", root_agent, "I think we're finished here, thanks for your help", iterations, 1))
+    return results
+
+
+@contextlib.contextmanager
+def mcp_server():
+    """
+    Runs mcp_server.py on a free port and yields its streamable HTTP URL.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "mcp_server.py", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("mcp_server.py did not start")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}/mcp"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def mcp(url: str, iterations: int = 500, concurrency: int = 10) -> list[BenchResult]:
+    from bank_agent_mcp import agent as mcp_agent
+    from bank_agent_mcp.toolsets import toolsets
+    from client import MCPClientPool
+
+    from .fake_llm import scripted
+
+    results = []
+    async with MCPClientPool(url, size=4) as pool:
+        await pool.list_tools()
+        results.append(await abench("MCP say_goodbye round trip", lambda: pool.call_tool("say_goodbye"), iterations=iterations))
+        results.append(await abench(f"MCP say_goodbye round trip x{concurrency}", lambda: pool.call_tool("say_goodbye"), iterations=iterations, concurrency=concurrency))
+
+    mcp_agent.GOODBYE_SERVER_URL = url
+    root_agent, _ = mcp_agent.build_agents()
+    try:
+        with scripted(root_agent, _scripts(GOODBYE_SCRIPT)):
+            results.append(await _run_turns("bank_agent_mcp goodbye turn", root_agent, "thanks, bye", iterations // 5, 1))
+    finally:
+        await toolsets.close_all()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=["micro", "agents", "mcp", "startup"], default=["micro", "agents", "mcp", "startup"])
+    parser.add_argument("--no-save", action="store_true", help="only print the results")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BASELINE", "CURRENT"), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare(*args.compare))
+        return
+
+    results = []
+    if "micro" in args.only:
+        results += micro()
+    if "agents" in args.only:
+        results += asyncio.run(agents())
+    if "mcp" in args.only:
+        with mcp_server() as url:
+            results += asyncio.run(mcp(url))
+    if "startup" in args.only:
+        results += startup()
+
+    print(HEADER)
+    for result in results:
+        print(result.row())
+    if not args.no_save:
+        print(f"\nSaved to {save(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# flake8: noqa: E501
+"""
+Cold-start report: where the time goes when a fresh worker imports an agent.
+
+    python -m benchmarks.startup                           # bank_agent.agent, import and graph build
+    python -m benchmarks.startup bank_agent_mcp.agent --no-build --top 40
+
+Runs the import in a fresh interpreter under `python -X importtime` and breaks
+the time down by top-level package and by module.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SNIPPET = """
+import importlib, json, time
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter()
+if {build!r}:
+    getattr(module, "root_agent")
+built = time.perf_counter()
+print(json.dumps({{"import_s": imported - start, "build_s": built - imported}}))
+"""
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> list[ImportRecord]:
+    """
+    Parses the `import time: self [us] | cumulative | imported package` lines of -X importtime.
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        stripped = name.lstrip()
+        records.append(ImportRecord(stripped.strip(), int(self_us), int(cumulative_us), (len(name) - len(stripped) - 1) // 2))
+    return records
+
+
+def measure(module: str, build: bool = True) -> tuple[dict, list[ImportRecord]]:
+    """
+    Imports `module` (and builds its `root_agent`) in a fresh interpreter.
+
+    Returns:
+        tuple: The wall times in seconds and the per-module import records.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET.format(module=module, build=build)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1]), parse_importtime(process.stderr)
+
+
+def report(module: str, build: bool = True, top: int = 20) -> str:
+    timings, records = measure(module, build)
+    by_package: dict[str, int] = {}
+    for record in records:
+        package = record.module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + record.self_us
+    total_us = sum(by_package.values()) or 1
+
+    lines = [
+        f"{module}: import {timings['import_s'] * 1000:.1f} ms" + (f", root_agent build {timings['build_s'] * 1000:.1f} ms" if build else ""),
+        f"{len(records)} modules imported",
+        "",
+        f"{'package':<40} {'self ms':>10} {'share':>7}",
+    ]
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"{package:<40} {self_us / 1000:>10.1f} {self_us / total_us:>7.1%}")
+
+    lines += ["", f"{'module':<60} {'self ms':>10} {'cumul. ms':>10}"]
+    for record in sorted(records, key=lambda r: -r.self_us)[:top]:
+        lines.append(f"{record.module:<60} {record.self_us / 1000:>10.1f} {record.cumulative_us / 1000:>10.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="bank_agent.agent")
+    parser.add_argument("--no-build", action="store_true", help="only import the module, don't touch root_agent")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+    print(report(args.module, build=not args.no_build, top=args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
 from contextlib import AsyncExitStack
+import asyncio
+import logging
+
+import anyio
 import httpx
 
-from mcp import ClientSession
+from mcp import ClientSession, types
 from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamable_http_client
+
+logger = logging.getLogger(__name__)
+
+# errors raised before a request reached the server: the connection could not be
+# opened, or the session's write stream was already closed when the call was made
+NOT_SENT_ERRORS = (httpx.ConnectError, ConnectionRefusedError, anyio.ClosedResourceError, anyio.BrokenResourceError)
+# errors after which the server may or may not have run the call
+TRANSPORT_ERRORS = (OSError, httpx.TransportError, anyio.ClosedResourceError, anyio.BrokenResourceError)
 
 # 
 class MCPSSEClient:
@@ -38,3 +51,143 @@ class MCPSSEClient:
     async def cleanup(self):
         """Clean up resources"""
         await self.exit_stack.aclose()
+
+
+class _PooledSession:
+    def __init__(self):
+        self.session = None
+        self.inflight = 0
+        self.broken = asyncio.Event()
+        self.task = None
+
+
+class MCPClientPool:
+    """
+    Pool of warm MCP sessions to one server, over SSE or streamable HTTP.
+
+    Each session lives in its own task that connects, runs `initialize` once and
+    reconnects with exponential backoff when a call finds the connection broken.
+    Concurrent `call_tool` requests are multiplexed over the least busy session,
+    and the tool list is fetched once and cached until the server sends a
+    tools/list_changed notification.
+
+    A call that fails on a broken connection is retried on another session only
+    if it never reached the server, or if the tool is in `idempotent_tools`:
+    otherwise the first attempt may already have run and the error is raised.
+    The transport defaults to SSE for URLs ending in /sse, streamable HTTP otherwise.
+    """
+
+    def __init__(self, url, size=4, max_retries=3, backoff=0.5, max_backoff=10.0, connect_timeout=10.0, idempotent_tools=(), transport=None, **kwargs):
+        self.url = url
+        self.transport = transport or ("sse" if url.rstrip("/").endswith("/sse") else "streamable-http")
+        if self.transport not in ("sse", "streamable-http"):
+            raise ValueError(f"Unknown MCP transport: {self.transport}")
+        self.idempotent_tools = frozenset(idempotent_tools)
+        self.size = size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.kwargs = kwargs
+        self._slots = [_PooledSession() for _ in range(size)]
+        self._ready = asyncio.Condition()
+        self._tools = None
+        self._closed = False
+
+    async def start(self):
+        """Starts the sessions and waits until at least one of them is connected."""
+        for slot in self._slots:
+            slot.task = asyncio.create_task(self._run(slot))
+        await self._acquire()
+        return self
+
+    async def list_tools(self, refresh=False):
+        if self._tools is None or refresh:
+            slot = await self._acquire()
+            self._tools = (await slot.session.list_tools()).tools
+        return self._tools
+
+    @property
+    def available_tools(self):
+        return [tool.name for tool in self._tools] if self._tools is not None else None
+
+    async def call_tool(self, name, arguments=None):
+        error = None
+        for _ in range(self.max_retries + 1):
+            slot = await self._acquire()
+            slot.inflight += 1
+            session = slot.session
+            try:
+                return await session.call_tool(name, arguments)
+            except TRANSPORT_ERRORS as e:
+                # drop the connection right away, so the retry can't pick it again, and let its task reconnect
+                error = e
+                if slot.session is session:
+                    slot.session = None
+                slot.broken.set()
+                if not isinstance(e, NOT_SENT_ERRORS) and name not in self.idempotent_tools:
+                    raise ConnectionError(f"Calling {name} on {self.url} failed and it may have run; not retrying: {e}") from e
+            finally:
+                slot.inflight -= 1
+        raise ConnectionError(f"Calling {name} on {self.url} failed: {error}") from error
+
+    async def cleanup(self):
+        """Closes every session."""
+        self._closed = True
+        for slot in self._slots:
+            slot.broken.set()
+        tasks = [slot.task for slot in self._slots if slot.task]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.connect_timeout)
+            for task in pending:  # still connecting or backing off
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.cleanup()
+
+    async def _acquire(self):
+        async def ready():
+            async with self._ready:
+                await self._ready.wait_for(lambda: any(s.session for s in self._slots))
+                return min((s for s in self._slots if s.session), key=lambda s: s.inflight)
+
+        try:
+            return await asyncio.wait_for(ready(), self.connect_timeout)
+        except asyncio.TimeoutError as e:
+            raise ConnectionError(f"Failed to connect to server at {self.url}") from e
+
+    async def _run(self, slot):
+        delay = self.backoff
+        while not self._closed:
+            try:
+                async with self._connect() as streams, \
+                        ClientSession(*streams, message_handler=self._on_message) as session:
+                    await session.initialize()
+                    async with self._ready:
+                        slot.session = session
+                        self._ready.notify_all()
+                    delay = self.backoff
+                    await slot.broken.wait()
+            except Exception as e:
+                logger.warning("MCP session to %s failed: %s", self.url, e)
+            finally:
+                slot.session = None
+                slot.broken.clear()
+
+            if not self._closed:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def _connect(self):
+        if self.transport == "sse":
+            return sse_client(self.url, **self.kwargs)
+        return streamable_http_client(self.url, **self.kwargs)
+
+    async def _on_message(self, message):
+        # older mcp versions wrap notifications in a ServerNotification root model
+        if isinstance(getattr(message, "root", message), types.ToolListChangedNotification):
+            self._tools = None
@@ -1,6 +1,15 @@
 # server.py
+import argparse
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
 from fastmcp import FastMCP
-import asyncio
+
+logger = logging.getLogger("mcp_server")
 
 mcp = FastMCP("FastMCP Demo Server")
 
@@ -8,10 +17,79 @@ mcp = FastMCP("FastMCP Demo Server")
 @mcp.tool()
 def say_goodbye() -> str:
     """Provides a farewell message to conclude the conversation and shows customer current new products."""
-    print("GOODBYE USED!!!!")
+    logger.info("tool called", extra={"tool": "say_goodbye"})
     return "Goodbye! Have a great day. Currently we have a special offer for you: credit card with 0% interest rate!"
 
 
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        if hasattr(record, "tool"):
+            entry["tool"] = record.tool
+        return json.dumps(entry)
+
+
+def setup_logging(level=logging.INFO):
+    """
+    Logs JSON lines to stderr from a background thread: request handlers only put
+    records on a queue, so a slow terminal or pipe never blocks them.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def create_app():
+    """
+    ASGI app for uvicorn workers. Each worker process builds its own app, the
+    transport comes from MCP_TRANSPORT. Streamable HTTP runs stateless, so any
+    worker can serve any request.
+    """
+    setup_logging()
+    transport = os.getenv("MCP_TRANSPORT", "streamable-http")
+    if transport == "sse":
+        return mcp.http_app(transport="sse")
+    return mcp.http_app(transport="streamable-http", stateless_http=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Goodbye and offers MCP server.")
+    parser.add_argument("--transport", choices=["sse", "streamable-http"], default="streamable-http")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes sharing the port")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds to drain in-flight requests on shutdown")
+    args = parser.parse_args()
+
+    if args.transport == "sse" and args.workers > 1:
+        # SSE sessions live in the process that opened them
+        parser.error("--workers > 1 needs --transport streamable-http")
+
+    import uvicorn
+
+    os.environ["MCP_TRANSPORT"] = args.transport
+    uvicorn.run(
+        "mcp_server:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=False,
+    )
+
+
 if __name__ == "__main__":
-    asyncio.run(mcp.run(transport='sse', host="0.0.0.0", port=8080))
-    # asyncio.run(mcp.run(transport='streamable-http', host="0.0.0.0", port=8080))
+    main()
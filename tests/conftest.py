@@ -0,0 +1,17 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def tool_context():
+    """
+    Builds the parts of an ADK ToolContext the tool decorators read.
+    """
+    def make(session_id: str = "s1", invocation_id: str = "i1", state: dict = None):
+        return SimpleNamespace(
+            session=SimpleNamespace(id=session_id),
+            invocation_id=invocation_id,
+            state=state if state is not None else {},
+        )
+    return make
@@ -0,0 +1,19 @@
+import asyncio
+
+from mcp import types
+
+from client import MCPClientPool
+
+
+def test_tool_list_changed_notification_drops_the_cached_tools():
+    pool = MCPClientPool("http://127.0.0.1:8000/mcp")
+    pool._tools = [types.Tool(name="get_balance", inputSchema={"type": "object"})]
+
+    async def main():
+        await pool._on_message(types.LoggingMessageNotification(method="notifications/message", params=types.LoggingMessageNotificationParams(level="info", data="hi")))
+        await pool._on_message(RuntimeError("stream error"))
+        assert pool.available_tools == ["get_balance"]
+        await pool._on_message(types.ToolListChangedNotification(method="notifications/tools/list_changed"))
+
+    asyncio.run(main())
+    assert pool.available_tools is None
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+from bank_core.ledger import Ledger
+from bank_core.locking import AccountLocks
+from bank_core.persistence import LedgerPersistence
+
+ACCOUNTS = [f"A{i}" for i in range(8)]
+
+
+def test_concurrent_transfers_keep_the_total(tmp_path):
+    persistence = LedgerPersistence(str(tmp_path), snapshot_every=500)
+    ledger = persistence.open()
+    for account in ACCOUNTS:
+        ledger.open(account, 100)
+
+    def worker(offset):
+        for i in range(300):
+            ledger.transfer(ACCOUNTS[(i + offset) % 8], ACCOUNTS[(i * 3 + offset + 1) % 8], 7)
+            ledger.transfer_many([(ACCOUNTS[offset], ACCOUNTS[(offset + 5) % 8], 1), (ACCOUNTS[(offset + 2) % 8], ACCOUNTS[offset], 1)])
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert ledger.total(ACCOUNTS) == 800.0
+    assert all(balance >= 0 for balance, _ in ledger.balances(ACCOUNTS))
+    expected = ledger.balances(ACCOUNTS)
+    persistence.close()
+
+    persistence = LedgerPersistence(str(tmp_path))
+    assert persistence.open().balances(ACCOUNTS) == expected
+    persistence.close()
+
+
+def test_async_and_thread_transfers_share_the_locks():
+    ledger = Ledger()
+    for account in ACCOUNTS:
+        ledger.open(account, 1000)  # enough for any order the transfers finish in
+    stop = threading.Event()
+
+    def blocking():
+        while not stop.is_set():
+            ledger.transfer("A0", "A1", 1)
+            ledger.transfer("A1", "A0", 1)
+
+    async def main():
+        results = await asyncio.gather(*(
+            ledger.atransfer(ACCOUNTS[i % 8], ACCOUNTS[(i + 1) % 8], 3) for i in range(400)
+        ))
+        assert all(results)
+
+    thread = threading.Thread(target=blocking)
+    thread.start()
+    try:
+        asyncio.run(main())
+    finally:
+        stop.set()
+        thread.join()
+    assert ledger.balances(ACCOUNTS) == [(1000.0, "EUR")] * 8
+
+
+def test_ahold_waits_without_blocking_the_loop():
+    locks = AccountLocks()
+    held = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with locks.hold("A", "B"):
+            held.set()
+            release.wait()
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        async def transfer():
+            async with locks.ahold("B", "A"):
+                return ticks
+
+        ticker = asyncio.create_task(tick())
+        waiter = asyncio.create_task(transfer())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        release.set()
+        assert await waiter > 5  # the loop kept running while the thread held the locks
+        ticker.cancel()
+        assert not locks.lock("A").locked() and not locks.lock("B").locked()
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait()
+    asyncio.run(main())
+    thread.join()
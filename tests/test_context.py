@@ -0,0 +1,64 @@
+import json
+from types import SimpleNamespace
+
+from google.adk.events import Event
+from google.adk.models import LlmRequest
+from google.adk.sessions import Session
+from google.genai import types
+
+from bank_core.context import HistoryCompactor
+
+
+def user(text):
+    return Event(author="user", content=types.Content(role="user", parts=[types.Part(text=text)]))
+
+
+def tool_result(response):
+    return Event(author="bank_agent", content=types.Content(role="user", parts=[
+        types.Part(function_response=types.FunctionResponse(name="get_statement", response=response))]))
+
+
+def conversation(turns):
+    events = []
+    for turn in range(turns):
+        events.append(user(f"statement page {turn}"))
+        events.append(tool_result({"status": "success", "transactions": [{"amount": i} for i in range(100)]}))
+    return Session(id="s1", app_name="bank", user_id="u1", events=events)
+
+
+def test_stored_session_is_summarized_and_old_turns_forgotten():
+    compactor = HistoryCompactor(keep_turns=2, max_session_turns=5)
+    session = conversation(20)
+
+    assert compactor.compact_session(session) == 30
+    assert len(session.events) == 40  # events are replaced, never removed
+    assert all(event.content is None for event in session.events[:30])
+
+    summarized = session.events[31].content.parts[0].function_response.response
+    assert summarized == {"status": "success", "transactions": "[100 items omitted]"}
+    assert len(session.events[-1].content.parts[0].function_response.response["transactions"]) == 100
+
+    # already compacted events stay as they are
+    assert compactor.compact_session(session) == 0
+
+
+def test_session_memory_stays_bounded():
+    compactor = HistoryCompactor(keep_turns=2, max_session_turns=5)
+    size = {}
+    for turns in (10, 100):
+        session = conversation(turns)
+        compactor.compact_session(session)
+        size[turns] = len(json.dumps([event.content.parts[0].function_response.response for event in session.events if event.content and event.author != "user"]))
+    assert size[100] == size[10]
+
+
+def test_callback_compacts_the_session_and_the_request():
+    compactor = HistoryCompactor(keep_turns=2, max_session_turns=3)
+    session = conversation(6)
+    request = LlmRequest(contents=[event.content for event in session.events])
+
+    compactor(SimpleNamespace(session=session, agent_name="bank_agent"), request)
+
+    assert sum(event.content is not None for event in session.events) == 6
+    assert len(request.contents) == 12
+    assert request.contents[1].parts[0].function_response.response["transactions"] == "[100 items omitted]"
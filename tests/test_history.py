@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+
+from bank_core.history import ENTRY, TransactionHistory, parse_range
+from bank_core.ledger import Ledger
+from bank_core.persistence import LedgerPersistence
+
+
+class RecordingJournal:
+    """
+    In-memory journal that remembers what was appended and which sequence numbers were waited on.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.waited = []
+
+    def append(self, op, fields):
+        self.records.append((op, fields))
+        return len(self.records)
+
+    def wait(self, seq):
+        self.waited.append(seq)
+
+    def is_durable(self, seq):
+        return False
+
+
+def reopen(directory, **kwargs):
+    persistence = LedgerPersistence(str(directory), **kwargs)
+    return persistence, persistence.open()
+
+
+def test_statement_pages_and_spending():
+    history = TransactionHistory()
+    for minor in (-100, 250, -300, -50):
+        history.record("A", minor, 2)
+    history.record_transfer("A", "B", 1000)
+
+    page, cursor = history.statement("A", limit=3)
+    assert [e["amount"] for e in page] == [-10.0, -0.5, -3.0]
+    assert page[0]["counterparty"] == "B"
+    page, cursor = history.statement("A", limit=3, cursor=cursor)
+    assert [e["amount"] for e in page] == [2.5, -1.0] and cursor is None
+
+    month = datetime.now(timezone.utc).strftime("%Y-%m")
+    assert history.spending("A") == {month: 14.5}
+    assert history.spending("B") == {}
+    start, end = parse_range("2000-01-01", "2000-01-31")
+    assert history.statement("A", start, end) == ([], None)
+
+
+def test_calls_wait_for_their_history_entries():
+    journal = RecordingJournal()
+    ledger = Ledger(journal=journal, history=TransactionHistory(journal=journal))
+    ledger.open("A", 100)
+    ledger.open("B")
+    calls = [
+        lambda: ledger.withdraw("A", 1),
+        lambda: ledger.deposit("B", 1),
+        lambda: ledger.transfer("A", "B", 2),
+        lambda: ledger.transfer_many([("A", "B", 1), ("B", "A", 1)]),
+        lambda: ledger.adjust([("A", -1), ("B", 1)]),
+    ]
+    for call in calls:
+        call()
+        # the entry is journaled after the mutation, and the wait covers both
+        assert journal.records[-1][0] == ENTRY
+        assert journal.waited[-1] == len(journal.records)
+
+
+def test_history_survives_snapshots_and_restarts(tmp_path):
+    persistence, ledger = reopen(tmp_path)
+    ledger.open("A", 100)
+    ledger.open("B")
+    ledger.transfer("A", "B", 5)
+    persistence.snapshot()
+    ledger.withdraw("A", 1)
+    expected = ledger.history.statement("A")
+    persistence.close()
+
+    persistence, ledger = reopen(tmp_path)
+    assert ledger.history.statement("A") == expected
+    ledger.deposit("A", 1)
+    persistence.snapshot()
+    persistence.close()
+
+    # the snapshot holds the whole history, so the segments before it are gone
+    assert len(list(tmp_path.glob("wal-*.log"))) == 1
+    persistence, ledger = reopen(tmp_path)
+    assert len(ledger.history) == 5
+    assert ledger.history.statement("B")[0][0]["counterparty"] == "A"
+    persistence.close()
+
+
+def test_torn_entry_is_dropped_with_its_segment_tail(tmp_path):
+    persistence, ledger = reopen(tmp_path)
+    ledger.open("A", 100)
+    ledger.withdraw("A", 1)
+    persistence.close()
+
+    segment = sorted(tmp_path.glob("wal-*.log"))[-1]
+    with open(segment, "ab") as f:
+        f.write(b"\x40\x10")  # an ENTRY cut off mid-record
+
+    persistence, ledger = reopen(tmp_path)
+    assert [e["amount"] for e in ledger.history.statement("A")[0]] == [-1.0, 100.0]
+    persistence.close()
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from bank_core.idempotency import IdempotencyIndex
+
+
+def test_same_key_runs_once():
+    index = IdempotencyIndex()
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        result = len(calls)
+        await asyncio.sleep(0.01)
+        return result
+
+    async def main():
+        return await asyncio.gather(*(index.run("k", operation) for _ in range(5)), index.run("other", operation))
+
+    results = asyncio.run(main())
+    assert results[:5] == [(1, False)] + [(1, True)] * 4
+    assert results[5] == (2, False)
+    assert len(calls) == 2
+
+
+def test_failed_operation_is_forgotten():
+    index = IdempotencyIndex()
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def succeed():
+        return "ok"
+
+    async def main():
+        with pytest.raises(ValueError):
+            await index.run("k", fail)
+        assert len(index) == 0
+        return await index.run("k", succeed)
+
+    assert asyncio.run(main()) == ("ok", False)
+
+
+def test_waiters_see_the_failure():
+    index = IdempotencyIndex()
+
+    async def main():
+        event = asyncio.Event()
+
+        async def fail():
+            event.set()
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        first = asyncio.create_task(index.run("k", fail))
+        await event.wait()
+        with pytest.raises(ValueError):
+            await index.run("k", fail)
+        with pytest.raises(ValueError):
+            await first
+
+    asyncio.run(main())
+
+
+def test_keys_expire_and_are_bounded():
+    async def value():
+        return 1
+
+    async def main():
+        index = IdempotencyIndex(max_keys=2)
+        for key in "abc":
+            await index.run(key, value)
+        assert len(index) == 2
+        assert (await index.run("a", value))[1] is False
+
+        index = IdempotencyIndex(ttl=0.0)
+        await index.run("a", value)
+        assert (await index.run("a", value))[1] is False
+
+    asyncio.run(main())
+
+
+def test_idempotent_tool(tool_context):
+    index = IdempotencyIndex()
+    transfers = []
+
+    async def transfer_money(account_from: str, account_to: str, amount: float) -> str:
+        transfers.append(amount)
+        return f"Transferred {amount}"
+
+    tool = index.idempotent(transfer_money)
+
+    async def main():
+        context = tool_context("s1", "i1")
+        assert await tool("A", "B", 5.0, tool_context=context) == "Transferred 5.0"
+        await tool("A", "B", 5.0, tool_context=context)  # the model retried within the turn
+        await tool("A", "B", 5.0, tool_context=tool_context("s1", "i2"))  # a new turn
+        await tool("A", "B", 7.0, tool_context=context, idempotency_key="x")
+        await tool("A", "B", 7.0, tool_context=tool_context("s1", "i3"), idempotency_key="x")
+        await tool("A", "B", 7.0, tool_context=tool_context("s2", "i3"), idempotency_key="x")
+
+    asyncio.run(main())
+    assert transfers == [5.0, 5.0, 7.0, 7.0]
+    assert "idempotency_key" in str(tool.__signature__)
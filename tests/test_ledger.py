@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from bank_core.ledger import Ledger, to_minor
+from bank_core.locking import AccountLocks
+
+
+def test_views_share_the_ledger_balances():
+    ledger = Ledger()
+    view = ledger.open("A", 10)
+    assert view.withdraw(2.5) and view.deposit(1)
+    assert not view.withdraw(100)
+    assert ledger.account("A").balance == view.balance == 8.5
+    with pytest.raises(ValueError):
+        view.withdraw(0.001)
+    assert view.to_model().balance == 8.5
+
+
+@pytest.mark.parametrize("amount", [1, 1.25, 0.005, 0.015, 2.675, 1e9 + 0.01, -3.333])
+def test_to_minor_rounds_like_round(amount):
+    assert to_minor(amount) == round(amount * 100)
+
+
+@pytest.mark.parametrize("stripes", [1, 1000])
+def test_transfer_between_accounts_on_one_stripe(stripes):
+    locks = AccountLocks(stripes)
+    numbers = iter(str(n) for n in range(100_000))
+    first = next(n for n in numbers if locks.stripe(n) > 256 or stripes == 1)
+    second = next(n for n in numbers if locks.stripe(n) == locks.stripe(first))
+    ledger = Ledger(locks)
+    ledger.open(first, 10)
+    ledger.open(second)
+    assert ledger.transfer(first, second, 4)
+    assert ledger.balances([first, second]) == [(6.0, "EUR"), (4.0, "EUR")]
+
+
+def test_transfer_waits_for_locks_held_elsewhere():
+    ledger = Ledger()
+    ledger.open("A", 10)
+    ledger.open("B")
+    done = threading.Event()
+    with ledger.locks.hold("B"):
+        thread = threading.Thread(target=lambda: ledger.transfer("A", "B", 1) and done.set())
+        thread.start()
+        assert not done.wait(0.05)
+    thread.join()
+    assert done.is_set()
+    assert ledger.balance("B") == 1.0
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from bank_core.llm_cache import CacheMiss, ResponseCache, request_key
+
+
+def request(text: str, call_id: str = "call-1") -> LlmRequest:
+    return LlmRequest(model="gemini-2.0-flash", contents=[
+        types.Content(role="user", parts=[types.Part.from_text(text=text)]),
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(id=call_id, name="get_balance", args={}))]),
+    ])
+
+
+def response(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part.from_text(text=text)]))
+
+
+def context(invocation_id: str = "i1"):
+    return SimpleNamespace(agent_name="bank_agent", invocation_id=invocation_id)
+
+
+def test_key_ignores_call_ids():
+    assert request_key(request("hi", "a")) == request_key(request("hi", "b"))
+    assert request_key(request("hi")) != request_key(request("hello"))
+
+
+def test_records_and_replays(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.before_model(context(), request("hi")) is None
+    cache.after_model(context(), response("Hello!"))
+    assert cache.before_model(context("i2"), request("hi")).content.parts[0].text == "Hello!"
+
+    # a new process finds the entry on disk
+    assert len(ResponseCache(str(tmp_path))) == 1
+
+
+def test_partial_and_failed_responses_are_not_stored(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.before_model(context(), request("hi"))
+    cache.after_model(context(), LlmResponse(content=response("Hel").content, partial=True))
+    cache.after_model(context(), LlmResponse(error_code="RESOURCE_EXHAUSTED"))
+    assert len(cache) == 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_entries=2)
+    cache.put("aa1", response("1"))
+    cache.put("bb2", response("2"))
+    cache.get("aa1")
+    cache.put("cc3", response("3"))
+    assert cache.get("bb2") is None
+    assert cache.get("aa1").content.parts[0].text == "1"
+    assert len(list(tmp_path.glob("*/*.json"))) == 2
+
+
+def test_offline_miss_raises(tmp_path):
+    with pytest.raises(CacheMiss):
+        ResponseCache(str(tmp_path), offline=True).before_model(context(), request("hi"))
+
+
+def test_failed_and_cancelled_calls_are_forgotten(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_pending=2)
+    cache.before_model(context(), request("hi"))
+    cache.on_model_error(context(), request("hi"), RuntimeError("model unavailable"))
+    assert len(cache._pending) == 0
+
+    # cancelled turns never reach after_model
+    for invocation in ("i1", "i2", "i3"):
+        cache.before_model(context(invocation), request(invocation))
+    assert list(cache._pending) == [("i2", "bank_agent"), ("i3", "bank_agent")]
+    cache.after_model(context("i3"), response("Hello!"))
+    assert len(cache) == 1
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from bank_core.aio import async_tools
+from bank_core.ledger import Ledger
+from bank_core.loans import LoanApplication, LoanScorer
+from bank_core.storage import LedgerStore
+
+
+@pytest.fixture
+def ledger():
+    ledger = Ledger()
+    ledger.open("A1", 1000)
+    ledger.assign("A1", "c1")
+    return ledger
+
+
+def test_scores_float_terms(ledger):
+    decisions = LoanScorer(ledger).evaluate_many([LoanApplication("c1", 500, 36.0), LoanApplication("c1", 5000, 12)])
+    assert [d.approved for d in decisions] == [True, False]
+
+
+def test_tool_rejects_invalid_terms(ledger, tool_context):
+    tools = {t.__name__: t for t in async_tools(LedgerStore(ledger), None, {"A1"}, loan_scorer=LoanScorer(ledger))}
+    context = tool_context(state={"user:current_user_id": "c1"})
+
+    async def apply(amount, term):
+        return await tools["apply_for_loan"](amount, term, context)
+
+    assert asyncio.run(apply(500, 36.0)) == "Loan application for 500 over 36 months has been approved."
+    assert asyncio.run(apply(5000, 12)) == "Loan not approved!"
+    for term in (36.5, 0, -12, float("nan"), "36"):
+        assert "error" in asyncio.run(apply(500, term))
+    assert "error" in asyncio.run(apply(-500, 12))
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from bank_core.memo import ToolMemo
+
+
+def test_invalidate_drops_dependent_results():
+    memo = ToolMemo()
+    memo.put("s1", "balance", 10, ["account:A"], memo.stamp())
+    memo.put("s1", "customer", "c1", ["customer:c1"], memo.stamp())
+    memo.invalidate(["account:A"])
+    with pytest.raises(KeyError):
+        memo.get("s1", "balance")
+    assert memo.get("s1", "customer") == "c1"
+
+
+def test_result_computed_during_a_write_is_stale():
+    memo = ToolMemo()
+    stamp = memo.stamp()  # the read started before the write finished
+    memo.invalidate(["account:A"])
+    memo.put("s1", "balance", 10, ["account:A"], stamp)
+    with pytest.raises(KeyError):
+        memo.get("s1", "balance")
+
+
+def test_entries_are_bounded():
+    memo = ToolMemo(max_sessions=2, max_entries=2)
+    for key in "abc":
+        memo.put("s1", key, key, [], memo.stamp())
+    with pytest.raises(KeyError):
+        memo.get("s1", "a")
+    assert memo.get("s1", "c") == "c"
+    for session in ("s2", "s3"):
+        memo.put(session, "a", 1, [], memo.stamp())
+    with pytest.raises(KeyError):
+        memo.get("s1", "c")  # the least recent session went
+    assert memo.get("s3", "a") == 1
+
+
+def test_decorated_tools(tool_context):
+    memo = ToolMemo()
+    balances = {"A": 10.0}
+    calls = []
+
+    async def get_balance(account_number: str) -> float:
+        calls.append(account_number)
+        return balances[account_number]
+
+    def transfer(account_number: str, amount: float) -> bool:
+        balances[account_number] -= amount
+        return True
+
+    get_balance = memo.memoized(lambda arguments, _: [f"account:{arguments['account_number']}"])(get_balance)
+    transfer = memo.invalidates(lambda arguments, _: [f"account:{arguments['account_number']}"])(transfer)
+
+    async def session():
+        assert await get_balance("A", tool_context=tool_context("s1")) == 10.0
+        assert await get_balance(account_number="A", tool_context=tool_context("s1")) == 10.0
+        assert calls == ["A"]
+        # a transfer in another session invalidates this one's result
+        assert await transfer("A", 4.0, tool_context=tool_context("s2"))
+        assert await get_balance("A", tool_context=tool_context("s1")) == 6.0
+        assert calls == ["A", "A"]
+
+    asyncio.run(session())
+    assert "tool_context" in str(get_balance.__signature__)
+
+
+def test_stamps_are_bounded():
+    memo = ToolMemo(max_tags=4)
+    memo.put("s1", "old", 1, ["account:A"], memo.stamp())
+    for account in "BCDEF":
+        memo.invalidate([f"account:{account}"])
+    assert len(memo._invalidated) <= 4
+    new = memo.stamp()
+    memo.invalidate(["account:G"])
+    memo.put("s1", "new", 2, ["account:B"], new)
+
+    with pytest.raises(KeyError):
+        memo.get("s1", "old")  # older than the forgotten stamps
+    assert memo.get("s1", "new") == 2
+
+    stale = memo.stamp()
+    for account in "HIJK":
+        memo.invalidate([f"account:{account}"])
+    memo.put("s1", "late", 3, ["account:H"], stale)  # a read that started before the prune
+    with pytest.raises(KeyError):
+        memo.get("s1", "late")
@@ -0,0 +1,16 @@
+from urllib.request import urlopen
+
+from bank_core.metrics import metrics, start_http_server
+
+
+def test_endpoint_listens_on_localhost_by_default():
+    metrics.inc("bank_test_requests_total", {"tool": "get_account_balance"})
+    server = start_http_server(0)
+    try:
+        host, port = server.server_address
+        assert host == "127.0.0.1"
+        body = urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert 'bank_test_requests_total{tool="get_account_balance"}' in body
+    finally:
+        server.shutdown()
+        server.server_close()
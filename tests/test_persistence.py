@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+from bank_core.ledger import Ledger
+from bank_core.persistence import SNAPSHOT_FILE, DataDirLocked, LedgerPersistence
+
+
+def reopen(directory, **kwargs):
+    persistence = LedgerPersistence(str(directory), **kwargs)
+    return persistence, persistence.open()
+
+
+def test_replay_restores_balances(tmp_path):
+    persistence, ledger = reopen(tmp_path)
+    ledger.open("A", 100)
+    ledger.open("B", 0, "USD")
+    ledger.open("C")
+    ledger.assign("A", "c1")
+    ledger.withdraw("A", 1)
+    ledger.deposit("C", 2.5)
+    ledger.transfer("A", "C", 10)
+    ledger.transfer_many([("A", "C", 1), ("C", "A", 0.5)])
+    expected = ledger.balances(["A", "B", "C"])
+    persistence.close()
+
+    persistence, ledger = reopen(tmp_path)
+    assert ledger.balances(["A", "B", "C"]) == expected
+    assert ledger.currency("B") == "USD"
+    persistence.close()
+
+
+def test_snapshot_rotates_segments(tmp_path):
+    persistence, ledger = reopen(tmp_path)
+    ledger.open("A", 100)
+    ledger.open("B")
+    ledger.transfer("A", "B", 1)
+    persistence.snapshot()
+    ledger.transfer("A", "B", 2)
+    persistence.close()
+
+    # only the segment started by the snapshot is left
+    assert len(list(tmp_path.glob("wal-*.log"))) == 1
+    persistence, ledger = reopen(tmp_path)
+    assert ledger.balances(["A", "B"]) == [(97.0, "EUR"), (3.0, "EUR")]
+    persistence.close()
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    persistence, ledger = reopen(tmp_path)
+    ledger.open("A", 100)
+    ledger.withdraw("A", 1)
+    persistence.close()
+
+    segment = sorted(tmp_path.glob("wal-*.log"))[-1]
+    with open(segment, "ab") as f:
+        f.write(b"\x03\x0c\x00\x00\x00\x00")  # a WITHDRAW cut off mid-record, as a crash leaves it
+
+    persistence, ledger = reopen(tmp_path)
+    assert ledger.balance("A") == 99.0
+    persistence.close()
+
+
+def test_data_dir_is_locked(tmp_path):
+    persistence, _ = reopen(tmp_path)
+    with pytest.raises(DataDirLocked):
+        LedgerPersistence(str(tmp_path)).open()
+    persistence.close()
+
+    persistence, _ = reopen(tmp_path)
+    persistence.close()
+
+
+def test_recovered_ledger_keeps_journaling(tmp_path):
+    persistence, ledger = reopen(tmp_path, snapshot_every=3)
+    ledger.open("A", 10)
+    for _ in range(10):
+        ledger.withdraw("A", 0.5)
+    persistence.close()
+
+    persistence, ledger = reopen(tmp_path)
+    assert isinstance(ledger, Ledger)
+    assert ledger.balance("A") == 5.0
+    persistence.close()
+
+
+def test_concurrent_appends_trigger_snapshots(tmp_path):
+    persistence, ledger = reopen(tmp_path, snapshot_every=100)
+    accounts = [str(n) for n in range(4)]
+    for account in accounts:
+        ledger.open(account)
+
+    def worker(account):
+        for _ in range(200):
+            ledger.deposit(account, 1)
+
+    threads = [threading.Thread(target=worker, args=(account,)) for account in accounts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    deadline = time.monotonic() + 5
+    while not (tmp_path / SNAPSHOT_FILE).exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    persistence.close()
+
+    assert (tmp_path / SNAPSHOT_FILE).exists()
+    assert not any(t.name == "ledger-snapshots" for t in threading.enumerate())
+    persistence, ledger = reopen(tmp_path)
+    assert ledger.balances(accounts) == [(200.0, "EUR")] * 4
+    persistence.close()
@@ -0,0 +1,28 @@
+import pytest
+
+from bank_core.router import ANGRY, GOODBYE, FastPathRouter, Intent
+
+router = FastPathRouter([Intent("goodbye", GOODBYE, lambda: "bye"), Intent("angry", ANGRY, lambda: "sorry")])
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("Bye!", "goodbye"),
+    ("ok thanks, see you later", "goodbye"),
+    ("That’s all for today, thank you", "goodbye"),
+    ("This is ridiculous", "angry"),
+    ("I am really annoyed", "angry"),
+])
+def test_routes_short_turns(text, intent):
+    assert router.route(text).name == intent
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "What is my balance?",
+    "Transfer 100 EUR to my savings account and then bye",
+    "This is ridiculous, bye",  # two intents
+    "Bye " * 13,  # too long
+    "maddening fees",  # not a whole word
+])
+def test_leaves_the_rest_to_the_model(text):
+    assert router.route(text) is None
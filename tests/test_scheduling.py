@@ -0,0 +1,48 @@
+from datetime import date, datetime
+
+from bank_core.scheduling import SLOTS_PER_DAY, SlotCalendar, parse_slot
+
+MONDAY = date(2026, 10, 19)
+SATURDAY = date(2026, 10, 24)
+
+
+def test_book_and_cancel():
+    calendar = SlotCalendar.demo()
+    mask = calendar.mask("Plovdiv")
+    assert calendar.free_slots(SATURDAY, SATURDAY, mask) == {}
+    assert len(calendar.free_slots(MONDAY, MONDAY, mask)[MONDAY.isoformat()]) == SLOTS_PER_DAY
+
+    day, slot = parse_slot(MONDAY.isoformat(), "10:30")
+    first = calendar.book("c1", day, slot, "loan", mask)
+    second = calendar.book("c2", day, slot, "loan", mask)
+    assert {first.representative.name, second.representative.name} == {"Nikolay Stoyanov", "Ivana Georgieva"}
+    assert calendar.book("c3", day, slot, "loan", mask) is None
+    assert "10:30" not in calendar.free_slots(MONDAY, MONDAY, mask)[MONDAY.isoformat()]
+
+    assert calendar.cancel(first.appointment_id) == first
+    assert calendar.cancel(first.appointment_id) is None
+    assert calendar.book("c3", day, slot, "loan", mask).representative == first.representative
+    assert calendar.appointments("c2") == [second]
+
+
+def test_not_before_hides_past_slots():
+    calendar = SlotCalendar.demo()
+    free = calendar.free_slots(MONDAY, MONDAY, calendar.mask(), not_before=datetime(2026, 10, 19, 16, 10))
+    assert free == {MONDAY.isoformat(): ["16:30"]}
+
+
+def test_shared_calendar_never_double_books(tmp_path):
+    path = str(tmp_path / "appointments.db")
+    first, second = SlotCalendar.demo(path), SlotCalendar.demo(path)
+    mask = first.mask(representative_id="R006")
+    day, slot = parse_slot(MONDAY.isoformat(), "09:00")
+
+    # the second instance hasn't seen the first one's booking yet
+    assert second.free_slots(MONDAY, MONDAY, mask)[MONDAY.isoformat()][0] == "09:00"
+    appointment = first.book("c1", day, slot, "card", mask)
+    assert second.book("c2", day, slot, "card", mask) is None
+    assert second.appointments("c1") == [appointment]
+
+    second.cancel(appointment.appointment_id)
+    assert first.appointments("c1") == []
+    assert first.book("c2", day, slot, "card", mask) is not None
@@ -0,0 +1,101 @@
+import pytest
+
+from bank_core.history import TransactionHistory
+from bank_core.ledger import Ledger
+from bank_core.persistence import LedgerPersistence
+from bank_core.sharding import Shard, ShardedLedger, authkey_from_env, serve, shard_of
+
+A = next(n for n in map(str, range(100)) if shard_of(n, 2) == 0)
+B = next(n for n in map(str, range(100)) if shard_of(n, 2) == 1)
+
+
+@pytest.fixture
+def shards():
+    shards = [Shard(Ledger(history=TransactionHistory())) for _ in range(2)]
+    shards[0].open(A, 100)
+    shards[1].open(B, 0)
+    return shards
+
+
+def test_cross_shard_transfer_commits(shards):
+    ledger = ShardedLedger(shards)
+    assert ledger.transfer(A, B, 30)
+    assert ledger.balances([A, B]) == [(70.0, "EUR"), (30.0, "EUR")]
+    assert shards[0].prepared() == shards[1].prepared() == []
+    assert ledger.history.statement(B)[0][0]["amount"] == 30.0
+
+
+def test_short_balance_aborts(shards):
+    ledger = ShardedLedger(shards)
+    assert not ledger.transfer(B, A, 1)
+    assert ledger.transfer_many([(A, B, 60), (A, B, 60)]) == ["Not enough balance in the account"] * 2
+    assert ledger.balances([A, B]) == [(100.0, "EUR"), (0.0, "EUR")]
+
+
+def test_prepare_holds_debits_until_decided(shards):
+    assert shards[0].prepare("t1", [(A, -40)]) is None
+    assert shards[0].balance(A) == 60.0
+    assert shards[0].prepare("t2", [(A, -70)]) == "Not enough balance in the account"
+    assert shards[0].abort("t1")
+    assert shards[0].balance(A) == 100.0
+    # a decided transaction can't be decided the other way
+    assert shards[0].prepare("t3", [(A, -10)]) is None
+    assert shards[0].commit("t3")
+    assert not shards[0].abort("t3")
+    assert shards[0].prepare("t4", [(A, -10)]) is None
+    assert shards[0].abort("t4")
+    assert not shards[0].commit("t4")
+
+
+def test_in_doubt_transactions_survive_restart_and_resolve(tmp_path):
+    directories = [tmp_path / "shard-0", tmp_path / "shard-1"]
+
+    def start():
+        persistences = [LedgerPersistence(str(d)) for d in directories]
+        return persistences, [Shard(p.open()) for p in persistences]
+
+    persistences, shards = start()
+    shards[0].open(A, 100)
+    shards[1].open(B, 0)
+    # coordinator died after the decision of t1, and before any decision of t2
+    shards[0].prepare("t1", [(A, -5)], -1)
+    shards[1].prepare("t1", [(B, 5)], 0)
+    shards[0].commit("t1")
+    shards[0].prepare("t2", [(A, -7)], -1)
+    shards[1].prepare("t2", [(B, 7)], 0)
+    persistences[1].snapshot()  # the prepared state must outlive the compaction
+    for persistence in persistences:
+        persistence.close()
+
+    persistences, shards = start()
+    assert shards[0].prepared() == [("t2", -1)]
+    assert sorted(shards[1].prepared()) == [("t1", 0), ("t2", 0)]
+    assert shards[0].outcome("t1") == "committed"
+
+    ShardedLedger(shards).resolve()
+    assert shards[0].prepared() == shards[1].prepared() == []
+    assert shards[0].balance(A) == 95.0
+    assert shards[1].balance(B) == 5.0
+    for persistence in persistences:
+        persistence.close()
+
+
+def test_coordinator_gives_up_when_decider_was_aborted(shards):
+    ledger = ShardedLedger(shards, in_doubt_after=0.0)
+    shards[0].prepare("t1", [(A, -5)], -1)
+    shards[1].prepare("t1", [(B, 5)], 0)
+    ledger.resolve()  # another coordinator finds t1 in doubt and aborts it
+    assert not ledger._commit("t1", 0, [0, 1])
+    assert ledger.balances([A, B]) == [(100.0, "EUR"), (0.0, "EUR")]
+
+
+def test_shards_need_a_key(monkeypatch):
+    monkeypatch.delenv("BANK_AGENT_SHARD_KEY", raising=False)
+    with pytest.raises(ValueError):
+        authkey_from_env()
+    with pytest.raises(ValueError):
+        serve(("127.0.0.1", 0), b"")
+    with pytest.raises(ValueError):
+        ShardedLedger.connect("127.0.0.1:1", b"")
+    monkeypatch.setenv("BANK_AGENT_SHARD_KEY", "s3cret")
+    assert authkey_from_env() == b"s3cret"